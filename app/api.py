@@ -1,14 +1,34 @@
-from datetime import datetime
-from fastapi import APIRouter, Depends, HTTPException, Header
-from sqlalchemy.orm import Session
-from sqlalchemy import select
+import base64
+import csv
+import io
+import itertools
+import json
+import math
+import zlib
+from datetime import datetime, timedelta
+from typing import Any, AsyncIterator, Iterator, Literal
+from fastapi import APIRouter, Body, Depends, HTTPException, Header, Query, Request, Response
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from starlette.concurrency import run_in_threadpool
+from pydantic import TypeAdapter, ValidationError
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import Select, delete, select, text, tuple_, update
 import logging
 
-from app.db import get_db
-from app.models import Task, Execution
-from app.schemas import TaskCreate, TaskUpdate, TaskOut, ExecutionOut
+from app.db import ApiSessionLocal, get_api_db
+from app.events import notify_schedule_change, to_naive_utc
+from app.metrics import RESPONSE_CACHE
+from app.models import Task, Execution, ExecutionRollup
+from app.schemas import (
+    TaskCreate, TaskUpdate, TaskOut, ExecutionOut, ExecutionFilters, ExecutionRollupOut,
+    TaskBulkUpdate, BulkDelete, BulkItemResult, BulkResult, IntervalSpread, ScheduleLoad,
+)
 from app.config import settings
-from croniter import croniter
+from app.cron import cron_cache
+from app.response_cache import etag_matches, response_cache
+from app.projection import bucket_counts, merged_occurrences
+from app.schedule import initial_interval_run
 
 def require_api_key(x_api_key: str | None = Header(default=None)):
     if settings.api_key and x_api_key != settings.api_key:
@@ -19,9 +39,7 @@ log = logging.getLogger("api")
 
 # table creation happens at app startup (see app.main)
 
-@router.post("/tasks", response_model=TaskOut)
-def create_task(payload: TaskCreate, db: Session = Depends(get_db)):
-    log.info("create_task name=%s type=%s schedule=%s", payload.name, payload.type, payload.schedule_type)
+def _validate_create(payload: TaskCreate) -> None:
     if payload.schedule_type == "interval" and not payload.interval_seconds:
         raise HTTPException(status_code=400, detail="interval_seconds is required for interval schedule")
     if payload.schedule_type == "once" and not payload.next_run_at:
@@ -31,107 +49,499 @@ def create_task(payload: TaskCreate, db: Session = Depends(get_db)):
             raise HTTPException(status_code=400, detail="cron_expression is required for cron schedule")
         # validate cron expression
         try:
-            _ = croniter(payload.cron_expression, datetime.utcnow())
+            cron_cache.validate(payload.cron_expression)
         except Exception:
             raise HTTPException(status_code=400, detail="invalid cron_expression")
 
-    task = Task(
+def _task_values(payload: TaskCreate) -> dict[str, Any]:
+    return dict(
         name=payload.name,
         type=payload.type,
         schedule_type=payload.schedule_type,
         interval_seconds=payload.interval_seconds,
         cron_expression=payload.cron_expression,
         next_run_at=(
-            payload.next_run_at
+            to_naive_utc(payload.next_run_at)
             or (
-                datetime.utcnow()
+                initial_interval_run(payload.name, payload.interval_seconds, payload.jitter_seconds, datetime.utcnow())
                 if payload.schedule_type == "interval"
-                else (croniter(payload.cron_expression, datetime.utcnow()).get_next(datetime) if payload.schedule_type == "cron" else None)
+                else (cron_cache.next_fire_time(payload.cron_expression, datetime.utcnow()) if payload.schedule_type == "cron" else None)
             )
         ),
         params=payload.params or {},
         timeout_seconds=payload.timeout_seconds,
+        retention_days=payload.retention_days,
+        priority=payload.priority,
+        jitter_seconds=payload.jitter_seconds,
+        misfire_policy=payload.misfire_policy,
+        misfire_limit=payload.misfire_limit,
         running=False,
     )
+
+def _validate_update(payload: TaskUpdate) -> None:
+    # validate if provided
+    if payload.cron_expression:
+        try:
+            cron_cache.validate(payload.cron_expression)
+        except Exception:
+            raise HTTPException(status_code=400, detail="invalid cron_expression")
+
+def _update_values(payload: TaskUpdate) -> dict[str, Any]:
+    # fields left as None are unchanged
+    values = payload.model_dump(exclude_none=True, exclude={"id"})
+    if "next_run_at" in values:
+        values["next_run_at"] = to_naive_utc(values["next_run_at"])
+    return values
+
+@router.post("/tasks", response_model=TaskOut)
+async def create_task(payload: TaskCreate, db: AsyncSession = Depends(get_api_db)):
+    log.info("create_task name=%s type=%s schedule=%s", payload.name, payload.type, payload.schedule_type)
+    _validate_create(payload)
+    task = Task(**_task_values(payload))
     db.add(task)
-    db.commit()
-    db.refresh(task)
+    await db.run_sync(notify_schedule_change, task.next_run_at)
+    await db.commit()
+    response_cache.bump()
+    await db.refresh(task)
     log.info("task_created id=%s next_run_at=%s", task.id, task.next_run_at)
     return task
 
+def _chunks(items: list, size: int) -> Iterator[list]:
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+def _bulk_result(results: list[BulkItemResult]) -> BulkResult:
+    results.sort(key=lambda r: r.index)
+    succeeded = sum(r.ok for r in results)
+    return BulkResult(succeeded=succeeded, failed=len(results) - succeeded, results=results)
+
+@router.post("/tasks/bulk", response_model=BulkResult)
+async def bulk_create_tasks(items: list[dict[str, Any]] = Body(..., max_length=settings.bulk_max_items), db: AsyncSession = Depends(get_api_db)):
+    """Create many tasks in one transaction; each item succeeds or fails on its own."""
+    results: list[BulkItemResult] = []
+    rows: list[dict[str, Any]] = []
+    row_index: dict[str, int] = {}
+    for i, item in enumerate(items):
+        try:
+            payload = TaskCreate.model_validate(item)
+            _validate_create(payload)
+        except ValidationError as e:
+            results.append(BulkItemResult(index=i, ok=False, error=str(e.errors()[0]["msg"])))
+            continue
+        except HTTPException as e:
+            results.append(BulkItemResult(index=i, ok=False, error=e.detail))
+            continue
+        if payload.name in row_index:
+            results.append(BulkItemResult(index=i, ok=False, error="duplicate name in request"))
+            continue
+        row_index[payload.name] = i
+        rows.append(_task_values(payload))
+
+    created: dict[str, int] = {}
+    for chunk in _chunks(rows, settings.bulk_chunk_size):
+        stmt = pg_insert(Task).values(chunk).on_conflict_do_nothing(index_elements=[Task.name])
+        created.update((await db.execute(stmt.returning(Task.name, Task.id))).tuples().all())
+    for name, i in row_index.items():
+        if name in created:
+            results.append(BulkItemResult(index=i, id=created[name], ok=True))
+        else:
+            results.append(BulkItemResult(index=i, ok=False, error="name already exists"))
+    if created:
+        next_runs = [r["next_run_at"] for r in rows if r["name"] in created and r["next_run_at"]]
+        await db.run_sync(notify_schedule_change, min(next_runs, key=to_naive_utc) if next_runs else None)
+    await db.commit()
+    response_cache.bump()
+    log.info("bulk_create_tasks requested=%d created=%d", len(items), len(created))
+    return _bulk_result(results)
+
+@router.patch("/tasks/bulk", response_model=BulkResult)
+async def bulk_update_tasks(items: list[dict[str, Any]] = Body(..., max_length=settings.bulk_max_items), db: AsyncSession = Depends(get_api_db)):
+    """Apply many partial updates in one transaction; unknown ids fail per item."""
+    results: list[BulkItemResult] = []
+    updates: dict[int, tuple[int, dict[str, Any]]] = {}
+    for i, item in enumerate(items):
+        try:
+            payload = TaskBulkUpdate.model_validate(item)
+            _validate_update(payload)
+        except ValidationError as e:
+            results.append(BulkItemResult(index=i, ok=False, error=str(e.errors()[0]["msg"])))
+            continue
+        except HTTPException as e:
+            results.append(BulkItemResult(index=i, id=item.get("id"), ok=False, error=e.detail))
+            continue
+        if payload.id in updates:
+            results.append(BulkItemResult(index=i, id=payload.id, ok=False, error="duplicate id in request"))
+            continue
+        updates[payload.id] = (i, _update_values(payload))
+
+    existing: set[int] = set()
+    for chunk in _chunks(list(updates), settings.bulk_chunk_size):
+        existing.update((await db.execute(select(Task.id).where(Task.id.in_(chunk)))).scalars())
+    rows = [{"id": task_id, **values} for task_id, (_, values) in updates.items() if task_id in existing and values]
+    for chunk in _chunks(rows, settings.bulk_chunk_size):
+        await db.execute(update(Task), chunk)
+    for task_id, (i, _) in updates.items():
+        if task_id in existing:
+            results.append(BulkItemResult(index=i, id=task_id, ok=True))
+        else:
+            results.append(BulkItemResult(index=i, id=task_id, ok=False, error="Task not found"))
+    if rows:
+        await db.run_sync(notify_schedule_change)
+    await db.commit()
+    response_cache.bump()
+    log.info("bulk_update_tasks requested=%d updated=%d", len(items), len(existing))
+    return _bulk_result(results)
+
+@router.post("/tasks/bulk-delete", response_model=BulkResult)
+async def bulk_delete_tasks(payload: BulkDelete, db: AsyncSession = Depends(get_api_db)):
+    """Delete many tasks; executions go with them through the FK cascade."""
+    deleted: set[int] = set()
+    for chunk in _chunks(list(dict.fromkeys(payload.ids)), settings.bulk_chunk_size):
+        deleted.update((await db.execute(delete(Task).where(Task.id.in_(chunk)).returning(Task.id))).scalars())
+    if deleted:
+        await db.run_sync(notify_schedule_change)
+    await db.commit()
+    response_cache.bump()
+    results = [
+        BulkItemResult(index=i, id=task_id, ok=task_id in deleted, error=None if task_id in deleted else "Task not found")
+        for i, task_id in enumerate(payload.ids)
+    ]
+    log.info("bulk_delete_tasks requested=%d deleted=%d", len(payload.ids), len(deleted))
+    return _bulk_result(results)
+
 @router.patch("/tasks/{task_id}", response_model=TaskOut)
-def update_task(task_id: int, payload: TaskUpdate, db: Session = Depends(get_db)):
-    task = db.get(Task, task_id)
+async def update_task(task_id: int, payload: TaskUpdate, db: AsyncSession = Depends(get_api_db)):
+    task = await db.get(Task, task_id)
     if not task:
         raise HTTPException(status_code=404, detail="Task not found")
     log.info("update_task id=%s", task_id)
-
-    if payload.schedule_type:
-        task.schedule_type = payload.schedule_type
-    if payload.interval_seconds is not None:
-        task.interval_seconds = payload.interval_seconds
-    if payload.next_run_at is not None:
-        task.next_run_at = payload.next_run_at
-    if payload.cron_expression is not None:
-        # validate if provided
-        if payload.cron_expression:
-            try:
-                _ = croniter(payload.cron_expression, datetime.utcnow())
-            except Exception:
-                raise HTTPException(status_code=400, detail="invalid cron_expression")
-        task.cron_expression = payload.cron_expression
-    if payload.params is not None:
-        task.params = payload.params
-    if payload.timeout_seconds is not None:
-        task.timeout_seconds = payload.timeout_seconds
+    _validate_update(payload)
+    for key, value in _update_values(payload).items():
+        setattr(task, key, value)
 
     db.add(task)
-    db.commit()
-    db.refresh(task)
+    await db.run_sync(notify_schedule_change, task.next_run_at)
+    await db.commit()
+    response_cache.bump()
+    await db.refresh(task)
     return task
 
 @router.get("/tasks/{task_id}", response_model=TaskOut)
-def get_task(task_id: int, db: Session = Depends(get_db)):
-    task = db.get(Task, task_id)
+async def get_task(task_id: int, db: AsyncSession = Depends(get_api_db)):
+    task = await db.get(Task, task_id)
     if not task:
         raise HTTPException(status_code=404, detail="Task not found")
     log.debug("get_task id=%s", task_id)
     return task
 
+_task_list = TypeAdapter(list[TaskOut])
+
+async def _cached_task_list(request: Request, db: AsyncSession, endpoint: str, stmt: Select) -> Response:
+    """Serve a task listing from the response cache, with ETag revalidation.
+
+    Hits never touch the database: the session only checks out a connection
+    when the query runs on a miss.
+    """
+    entry = response_cache.get(endpoint) if settings.response_cache_enable else None
+    result = "hit"
+    if entry is None:
+        result = "miss"
+        version = response_cache.version
+        tasks = (await db.execute(stmt)).scalars().all()
+        body = _task_list.dump_json(_task_list.validate_python(tasks, from_attributes=True))
+        entry = response_cache.put(endpoint, version, body)
+        log.debug("%s count=%s", endpoint, len(tasks))
+    # checked on misses too: the client may hold an identical body, e.g. from another replica
+    if etag_matches(request.headers.get("if-none-match"), entry.etag):
+        RESPONSE_CACHE.labels(endpoint, "not_modified").inc()
+        return Response(status_code=304, headers={"ETag": entry.etag})
+    RESPONSE_CACHE.labels(endpoint, result).inc()
+    return Response(entry.body, media_type="application/json", headers={"ETag": entry.etag, "Cache-Control": "no-cache"})
+
 @router.get("/tasks", response_model=list[TaskOut])
-def list_tasks(db: Session = Depends(get_db)):
-    items = db.query(Task).order_by(Task.id.asc()).all()
-    log.debug("list_tasks count=%s", len(items))
-    return items
+async def list_tasks(request: Request, db: AsyncSession = Depends(get_api_db)):
+    return await _cached_task_list(request, db, "list_tasks", select(Task).order_by(Task.id.asc()))
+
+def _encode_cursor(e: Execution) -> str:
+    return base64.urlsafe_b64encode(f"{e.started_at.isoformat()}|{e.id}".encode()).decode()
+
+def _decode_cursor(cursor: str) -> tuple[datetime, int]:
+    try:
+        started_at, exec_id = base64.urlsafe_b64decode(cursor.encode()).decode().split("|")
+        return datetime.fromisoformat(started_at), int(exec_id)
+    except Exception:
+        raise HTTPException(status_code=400, detail="invalid cursor")
+
+def _filter_executions(stmt: Select, filters: ExecutionFilters) -> Select:
+    if filters.status:
+        stmt = stmt.where(Execution.status == filters.status)
+    if filters.task_type:
+        stmt = stmt.join(Task, Task.id == Execution.task_id).where(Task.type == filters.task_type)
+    if filters.started_after:
+        stmt = stmt.where(Execution.started_at >= to_naive_utc(filters.started_after))
+    if filters.started_before:
+        stmt = stmt.where(Execution.started_at < to_naive_utc(filters.started_before))
+    return stmt
+
+async def _execution_page(
+    db: AsyncSession, response: Response, stmt: Select, limit: int, cursor: str | None, ascending: bool
+) -> list[Execution]:
+    """Fetch one keyset page ordered by (started_at, id).
+
+    The next page's cursor is returned in the ``X-Next-Cursor`` header, so
+    the body stays a plain list of executions.
+    """
+    key = tuple_(Execution.started_at, Execution.id)
+    if cursor:
+        after = tuple_(*_decode_cursor(cursor))
+        stmt = stmt.where(key > after if ascending else key < after)
+    if ascending:
+        stmt = stmt.order_by(Execution.started_at.asc(), Execution.id.asc())
+    else:
+        stmt = stmt.order_by(Execution.started_at.desc(), Execution.id.desc())
+    execs = (await db.execute(stmt.limit(limit))).scalars().all()
+    if len(execs) == limit:
+        response.headers["X-Next-Cursor"] = _encode_cursor(execs[-1])
+    return execs
 
 @router.get("/tasks/{task_id}/executions", response_model=list[ExecutionOut])
-def get_task_executions(task_id: int, db: Session = Depends(get_db)):
-    task = db.get(Task, task_id)
+async def get_task_executions(
+    task_id: int,
+    response: Response,
+    limit: int = Query(default=100, ge=1, le=1000),
+    cursor: str | None = None,
+    filters: ExecutionFilters = Depends(),
+    db: AsyncSession = Depends(get_api_db),
+):
+    task = await db.get(Task, task_id)
     if not task:
         raise HTTPException(status_code=404, detail="Task not found")
-    execs = db.execute(select(Execution).where(Execution.task_id == task_id).order_by(Execution.started_at.asc())).scalars().all()
+    stmt = _filter_executions(select(Execution).where(Execution.task_id == task_id), filters)
+    execs = await _execution_page(db, response, stmt, limit, cursor, ascending=True)
     log.debug("get_task_executions task_id=%s count=%s", task_id, len(execs))
     return execs
 
 @router.get("/executions", response_model=list[ExecutionOut])
-def list_executions(db: Session = Depends(get_db)):
-    execs = db.execute(select(Execution).order_by(Execution.started_at.desc())).scalars().all()
+async def list_executions(
+    response: Response,
+    limit: int = Query(default=100, ge=1, le=1000),
+    cursor: str | None = None,
+    filters: ExecutionFilters = Depends(),
+    db: AsyncSession = Depends(get_api_db),
+):
+    stmt = _filter_executions(select(Execution), filters)
+    execs = await _execution_page(db, response, stmt, limit, cursor, ascending=False)
     log.debug("list_executions count=%s", len(execs))
     return execs
 
+@router.get("/executions/{execution_id}/profile", response_class=PlainTextResponse)
+async def get_execution_profile(execution_id: int, db: AsyncSession = Depends(get_api_db)):
+    """cProfile report of a sampled execution (PROFILE_SAMPLE_EVERY)."""
+    found = (await db.execute(select(Execution.id, Execution.profile).where(Execution.id == execution_id))).first()
+    if not found:
+        raise HTTPException(status_code=404, detail="Execution not found")
+    if found.profile is None:
+        raise HTTPException(status_code=404, detail="Execution was not profiled")
+    return found.profile
+
+@router.get("/tasks/{task_id}/rollups", response_model=list[ExecutionRollupOut])
+async def get_task_rollups(
+    task_id: int,
+    since: datetime | None = None,
+    until: datetime | None = None,
+    db: AsyncSession = Depends(get_api_db),
+):
+    task = await db.get(Task, task_id)
+    if not task:
+        raise HTTPException(status_code=404, detail="Task not found")
+    stmt = select(ExecutionRollup).where(ExecutionRollup.task_id == task_id)
+    if since:
+        stmt = stmt.where(ExecutionRollup.hour >= to_naive_utc(since))
+    if until:
+        stmt = stmt.where(ExecutionRollup.hour < to_naive_utc(until))
+    rollups = (await db.execute(stmt.order_by(ExecutionRollup.hour.asc()))).scalars().all()
+    log.debug("get_task_rollups task_id=%s count=%s", task_id, len(rollups))
+    return rollups
+
+EXPORT_COLUMNS = ["id", "task_id", "started_at", "finished_at", "status", "detail", "result", "timings"]
+
+# JSON documents; each is kept as one CSV cell
+EXPORT_JSON_COLUMNS = {"result", "timings"}
+
+def _csv_value(column: str, value: Any) -> Any:
+    if column in EXPORT_JSON_COLUMNS:
+        return json.dumps(value) if value is not None else ""
+    return value.isoformat() if isinstance(value, datetime) else value
+
+async def _export_chunks(stmt: Select, fmt: str) -> AsyncIterator[str]:
+    """Serialize rows one server-side-cursor batch at a time.
+
+    Runs in its own session: the request's session is closed before a
+    streaming body is consumed.
+    """
+    batch_size = settings.export_batch_size
+    async with ApiSessionLocal() as db:
+        result = (await db.stream(stmt.execution_options(yield_per=batch_size))).mappings()
+        if fmt == "csv":
+            buf = io.StringIO()
+            writer = csv.writer(buf)
+            writer.writerow(EXPORT_COLUMNS)
+            # the header goes out on its own so an empty export is still a valid CSV
+            yield buf.getvalue()
+            buf.seek(0)
+            buf.truncate()
+            async for batch in result.partitions():
+                for row in batch:
+                    writer.writerow([_csv_value(c, row[c]) for c in EXPORT_COLUMNS])
+                yield buf.getvalue()
+                buf.seek(0)
+                buf.truncate()
+        else:
+            async for batch in result.partitions():
+                yield "".join(json.dumps({c: row[c] for c in EXPORT_COLUMNS}, default=datetime.isoformat) + "\n" for row in batch)
+
+async def _gzip_chunks(chunks: AsyncIterator[str]) -> AsyncIterator[bytes]:
+    compressor = zlib.compressobj(wbits=31)  # gzip container
+    async for chunk in chunks:
+        data = compressor.compress(chunk.encode())
+        if data:
+            yield data
+    yield compressor.flush()
+
+@router.get("/executions/export")
+async def export_executions(
+    format: Literal["ndjson", "csv"] = "ndjson",
+    gzip: bool = False,
+    filters: ExecutionFilters = Depends(),
+):
+    stmt = _filter_executions(select(*(Execution.__table__.c[c] for c in EXPORT_COLUMNS)), filters).order_by(
+        Execution.started_at.asc(), Execution.id.asc()
+    )
+    log.info("export_executions format=%s gzip=%s", format, gzip)
+    filename = f"executions.{format}"
+    media_type = "text/csv" if format == "csv" else "application/x-ndjson"
+    body = _export_chunks(stmt, format)
+    if gzip:
+        body = _gzip_chunks(body)
+        filename += ".gz"
+        media_type = "application/gzip"
+    return StreamingResponse(
+        body, media_type=media_type, headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
+
 @router.get("/upcoming", response_model=list[TaskOut])
-def list_upcoming(db: Session = Depends(get_db)):
-    tasks = db.query(Task).filter(Task.next_run_at != None).order_by(Task.next_run_at.asc()).all()
-    log.debug("list_upcoming count=%s", len(tasks))
-    return tasks
+async def list_upcoming(request: Request, db: AsyncSession = Depends(get_api_db)):
+    stmt = select(Task).where(Task.next_run_at.is_not(None)).order_by(Task.next_run_at.asc())
+    return await _cached_task_list(request, db, "list_upcoming", stmt)
+
+@router.get("/schedule/spread", response_model=list[IntervalSpread])
+async def schedule_spread(buckets: int = Query(default=10, ge=1, le=1000), db: AsyncSession = Depends(get_api_db)):
+    """How evenly idle interval tasks' next runs fall across their interval window.
+
+    Each interval is cut into ``buckets`` equal slices and tasks are counted by
+    the phase of ``next_run_at`` within it; ``peak_to_mean`` near 1 and a low
+    ``cv`` mean the load is spread out rather than firing in one burst.
+    """
+    rows = (await db.execute(
+        text(
+            """
+            SELECT interval_seconds,
+                   width_bucket(
+                       mod(CAST(EXTRACT(EPOCH FROM next_run_at) AS numeric), interval_seconds),
+                       0, interval_seconds, :buckets
+                   ) AS bucket,
+                   count(*)
+            FROM tasks
+            WHERE schedule_type = 'interval' AND interval_seconds > 0 AND next_run_at IS NOT NULL
+            GROUP BY 1, 2
+            """
+        ),
+        {"buckets": buckets},
+    )).all()
+    counts: dict[int, list[int]] = {}
+    for interval_seconds, bucket, n in rows:
+        counts.setdefault(interval_seconds, [0] * buckets)[bucket - 1] += n
+    report = []
+    for interval_seconds, hist in sorted(counts.items()):
+        total = sum(hist)
+        mean = total / buckets
+        std = (sum((c - mean) ** 2 for c in hist) / buckets) ** 0.5
+        report.append(
+            IntervalSpread(
+                interval_seconds=interval_seconds,
+                tasks=total,
+                buckets=hist,
+                peak_to_mean=round(max(hist) / mean, 3),
+                cv=round(std / mean, 3),
+            )
+        )
+    return report
+
+async def _projection_window(db: AsyncSession, start: datetime | None, minutes: int) -> tuple[datetime, datetime, list]:
+    """The window and the scheduled tasks with a run inside it, by id."""
+    start = to_naive_utc(start) or datetime.utcnow()
+    end = start + timedelta(minutes=minutes)
+    stmt = (
+        select(Task.id, Task.name, Task.type, Task.schedule_type, Task.interval_seconds, Task.cron_expression, Task.next_run_at)
+        .where(Task.next_run_at.is_not(None), Task.next_run_at < end)
+        .order_by(Task.id.asc())
+    )
+    return start, end, (await db.execute(stmt)).all()
+
+def _projection_lines(tasks: list, start: datetime, end: datetime, limit: int) -> Iterator[str]:
+    for run_at, task in itertools.islice(merged_occurrences(tasks, start, end), limit):
+        yield json.dumps({"run_at": run_at.isoformat(), "task_id": task.id, "name": task.name, "type": task.type}) + "\n"
+
+@router.get("/schedule/projection")
+async def schedule_projection(
+    start: datetime | None = None,
+    minutes: int = Query(default=60, ge=1, le=settings.projection_max_window_minutes),
+    limit: int = Query(default=1000, ge=1, le=settings.projection_max_items),
+    db: AsyncSession = Depends(get_api_db),
+):
+    """Every projected run in [start, start + minutes) in time order, as NDJSON, up to ``limit``.
+
+    Interval and cron schedules are expanded per task and merged lazily, so
+    only the streamed runs are ever generated.
+    """
+    start, end, tasks = await _projection_window(db, start, minutes)
+    log.debug("schedule_projection tasks=%s minutes=%s limit=%s", len(tasks), minutes, limit)
+    # a sync generator: StreamingResponse iterates it in the threadpool, off the event loop
+    return StreamingResponse(_projection_lines(tasks, start, end, limit), media_type="application/x-ndjson")
+
+@router.get("/schedule/load", response_model=ScheduleLoad)
+async def schedule_load(
+    start: datetime | None = None,
+    minutes: int = Query(default=60, ge=1, le=settings.projection_max_window_minutes),
+    bucket_seconds: int = Query(default=60, ge=1),
+    db: AsyncSession = Depends(get_api_db),
+):
+    """Projected runs per ``bucket_seconds`` over [start, start + minutes), by task type."""
+    if minutes * 60 / bucket_seconds > settings.projection_max_buckets:
+        raise HTTPException(status_code=400, detail=f"more than {settings.projection_max_buckets} buckets; widen bucket_seconds")
+    start, end, tasks = await _projection_window(db, start, minutes)
+    by_type = await run_in_threadpool(bucket_counts, tasks, start, end, bucket_seconds)
+    total = [sum(col) for col in zip(*by_type.values())] if by_type else [0] * math.ceil(minutes * 60 / bucket_seconds)
+    peak = max(total)
+    return ScheduleLoad(
+        start=start,
+        end=end,
+        bucket_seconds=bucket_seconds,
+        by_type=by_type,
+        total=total,
+        peak=peak,
+        peak_at=start + timedelta(seconds=total.index(peak) * bucket_seconds) if peak else None,
+    )
 
 @router.delete("/tasks/{task_id}")
-def delete_task(task_id: int, db: Session = Depends(get_db)):
-    task = db.get(Task, task_id)
-    if not task:
+async def delete_task(task_id: int, db: AsyncSession = Depends(get_api_db)):
+    # executions go with the task through the FK cascade, without loading them
+    deleted = (await db.execute(delete(Task).where(Task.id == task_id).returning(Task.id))).scalar()
+    if deleted is None:
         raise HTTPException(status_code=404, detail="Task not found")
     log.info("delete_task id=%s", task_id)
-    db.delete(task)
-    db.commit()
+    await db.run_sync(notify_schedule_change)
+    await db.commit()
+    response_cache.bump()
     return {"deleted": True}
 
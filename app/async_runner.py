@@ -0,0 +1,160 @@
+import asyncio
+import logging
+import threading
+import time
+from concurrent.futures import Future
+from datetime import datetime
+from typing import Callable
+
+from sqlalchemy import update
+from sqlalchemy.ext.asyncio import AsyncEngine, async_sessionmaker
+
+from app.config import settings
+from app.db import create_async_db_engine
+from app.http_pool import http_pool
+from app.leases import REPLICA_ID
+from app.metrics import observe_execution
+from app.models import Execution, Task
+from app.profiling import PhaseTimer
+from app.schedule import next_run_after_finish
+from app.task_types import async_runner_for
+from app.writer import UNCHANGED, ExecutionWriter
+
+
+class AsyncRunner:
+    """Runs I/O-bound task types as coroutines on one event loop thread.
+
+    Each execution only holds a DB connection for its two short write phases
+    (start and finish), so thousands of sleeping or waiting tasks share a small
+    pool. ``on_finished`` is called with the task's new ``next_run_at`` once its
+    ``running`` flag has been cleared. With a write-behind ``writer`` both
+    write phases are handed to it instead and the writer reports the release.
+    """
+
+    def __init__(self, on_finished: Callable[[datetime | None], None], writer: ExecutionWriter | None = None):
+        self._on_finished = on_finished
+        self._writer = writer
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._thread: threading.Thread | None = None
+        self._sem: asyncio.Semaphore | None = None
+        self._engine: AsyncEngine | None = None
+        self._session: async_sessionmaker | None = None
+        self._pending: set[Future] = set()
+        self._log = logging.getLogger("async_runner")
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._loop = asyncio.new_event_loop()
+        self._engine = create_async_db_engine(settings.async_db_pool_size, name="executor")
+        self._session = async_sessionmaker(self._engine, expire_on_commit=False)
+        ready = threading.Event()
+
+        def run_loop():
+            asyncio.set_event_loop(self._loop)
+            self._sem = asyncio.Semaphore(settings.async_max_concurrency)
+            self._loop.call_soon(ready.set)
+            self._loop.run_forever()
+
+        self._thread = threading.Thread(target=run_loop, name="async-runner", daemon=True)
+        self._thread.start()
+        ready.wait()
+        self._log.info("Async runner started max_concurrency=%s", settings.async_max_concurrency)
+
+    def stop(self):
+        if not self._loop:
+            return
+        # let in-flight executions finish, mirroring ThreadPoolExecutor.shutdown(wait=True)
+        for fut in list(self._pending):
+            try:
+                fut.result()
+            except Exception:
+                pass
+        asyncio.run_coroutine_threadsafe(http_pool.aclose(), self._loop).result(timeout=5)
+        asyncio.run_coroutine_threadsafe(self._engine.dispose(), self._loop).result(timeout=5)
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        if self._thread:
+            self._thread.join(timeout=5)
+        self._loop.close()
+        self._loop = None
+        self._thread = None
+
+    def submit(self, task_id: int) -> Future:
+        # coroutines interleave on one thread, so they get phase timings but no cProfile sampling
+        phases = PhaseTimer()
+        fut = asyncio.run_coroutine_threadsafe(self._run_task_safe(task_id, phases), self._loop)
+        self._pending.add(fut)
+        fut.add_done_callback(self._pending.discard)
+        return fut
+
+    async def _run_task_safe(self, task_id: int, phases: PhaseTimer):
+        async with self._sem:
+            phases.mark("dequeued")
+            task = None
+            exec_rec = None
+            try:
+                async with self._session() as db:
+                    task = await db.get(Task, task_id)
+                    if not task:
+                        return
+                    exec_rec = Execution(task_id=task.id, status="running", started_at=datetime.utcnow())
+                    if self._writer:
+                        key = self._writer.record_start(task.id, exec_rec.started_at)
+                    else:
+                        db.add(exec_rec)
+                        await db.commit()
+                start = time.perf_counter()
+                timeout = task.timeout_seconds or settings.default_task_timeout_seconds
+                self._log.info("start task_id=%s type=%s", task.id, task.type)
+                phases.mark("body_start")
+                try:
+                    # hard timeout: the coroutine is cancelled and its slot freed
+                    exec_rec.result = await asyncio.wait_for(async_runner_for(task.type)(task), timeout)
+                    exec_rec.status = "success"
+                except asyncio.TimeoutError:
+                    self._log.warning("task timed out task_id=%s type=%s", task.id, task.type)
+                    exec_rec.status = "timeout"
+                    exec_rec.detail = f"Exceeded timeout of {timeout}s"
+                except Exception as e:
+                    self._log.exception("task execution error task_id=%s type=%s", task.id, task.type)
+                    exec_rec.status = "failed"
+                    exec_rec.detail = str(e)
+                phases.mark("body_end")
+                exec_rec.finished_at = datetime.utcnow()
+                duration = time.perf_counter() - start
+                observe_execution(task.type, exec_rec.status, duration)
+                self._log.info("finish task_id=%s status=%s duration_s=%.3f", task.id, exec_rec.status, duration)
+            finally:
+                if task is not None and self._writer:
+                    next_run_at = next_run_after_finish(task, datetime.utcnow()) or UNCHANGED
+                    self._writer.record_finish(
+                        key, task.id, exec_rec.status, exec_rec.detail, exec_rec.result,
+                        exec_rec.finished_at or datetime.utcnow(), next_run_at, phases=phases,
+                    )
+                elif task is not None:
+                    await self._finish(task, exec_rec, phases)
+
+    async def _finish(self, task: Task, exec_rec: Execution | None, phases: PhaseTimer):
+        # mark not running; only interval tasks get a new next_run_at here
+        values = {"running": False, "claimed_by": None, "lease_expires_at": None}
+        next_run_at = next_run_after_finish(task, datetime.utcnow())
+        if next_run_at is not None:
+            values["next_run_at"] = next_run_at
+        async with self._session() as db:
+            if exec_rec is not None and exec_rec.id is not None:
+                phases.mark("persisted")
+                await db.execute(
+                    update(Execution)
+                    .where(Execution.id == exec_rec.id)
+                    .values(
+                        status=exec_rec.status,
+                        detail=exec_rec.detail,
+                        result=exec_rec.result,
+                        finished_at=exec_rec.finished_at or datetime.utcnow(),
+                        timings=phases.as_dict(),
+                    )
+                )
+            # skipped if the lease was swept and another replica claimed the task since
+            await db.execute(update(Task).where(Task.id == task.id, Task.claimed_by == REPLICA_ID).values(**values))
+            await db.commit()
+        self._on_finished(values.get("next_run_at", task.next_run_at))
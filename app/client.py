@@ -1,3 +1,4 @@
+import json
 import os
 import typer
 import requests
@@ -24,7 +25,7 @@ def list_tasks():
 @app.command()
 def create(
     name: str = typer.Argument(...),
-    task_type: str = typer.Option("sleep", help="sleep|counter|http"),
+    task_type: str = typer.Option("sleep", help="sleep|counter|http|noop|hash|report"),
     schedule: str = typer.Option("interval", help="interval|once|cron"),
     interval_seconds: Optional[int] = typer.Option(None),
     next_run_at: Optional[str] = typer.Option(None, help="ISO datetime for once"),
@@ -54,11 +55,80 @@ def create(
         raise typer.Exit(1)
     typer.echo(r.json())
 
+@app.command("import")
+def import_tasks(
+    path: str = typer.Argument(..., help="JSON or YAML file with a list of tasks (or {'tasks': [...]})"),
+    chunk_size: int = typer.Option(1000, help="tasks per bulk request"),
+):
+    with open(path) as f:
+        if path.endswith((".yaml", ".yml")):
+            try:
+                import yaml
+            except ImportError:
+                typer.secho("PyYAML is required to import YAML files", fg=typer.colors.RED)
+                raise typer.Exit(1)
+            data = yaml.safe_load(f)
+        else:
+            data = json.load(f)
+    items = data["tasks"] if isinstance(data, dict) else data
+    succeeded = failed = 0
+    for start in range(0, len(items), chunk_size):
+        r = requests.post(f"{API_URL}/tasks/bulk", json=items[start:start + chunk_size], headers=headers())
+        if r.status_code >= 400:
+            typer.secho(r.text, fg=typer.colors.RED)
+            raise typer.Exit(1)
+        body = r.json()
+        succeeded += body["succeeded"]
+        failed += body["failed"]
+        for res in body["results"]:
+            if not res["ok"]:
+                typer.secho(f"item {start + res['index']}: {res['error']}", fg=typer.colors.YELLOW)
+    typer.echo(f"imported {succeeded} tasks, {failed} failed")
+    if failed:
+        raise typer.Exit(1)
+
 @app.command()
-def executions(task_id: int):
-    r = requests.get(f"{API_URL}/tasks/{task_id}/executions", headers=headers())
+def executions(
+    task_id: int,
+    limit: int = typer.Option(100, help="page size"),
+    cursor: Optional[str] = typer.Option(None, help="cursor from a previous page"),
+    status: Optional[str] = typer.Option(None, help="success|failed|timeout|running"),
+):
+    params = {"limit": limit, "cursor": cursor, "status": status}
+    r = requests.get(f"{API_URL}/tasks/{task_id}/executions", params=params, headers=headers())
     r.raise_for_status()
     typer.echo(r.json())
+    if r.headers.get("x-next-cursor"):
+        typer.echo(f"next cursor: {r.headers['x-next-cursor']}")
+
+@app.command()
+def export(
+    output: str = typer.Argument(..., help="file to write"),
+    fmt: str = typer.Option("ndjson", "--format", help="ndjson|csv"),
+    gzip: bool = typer.Option(False, help="gzip-compress the stream"),
+    status: Optional[str] = typer.Option(None, help="success|failed|timeout|running"),
+    task_type: Optional[str] = typer.Option(None, help="sleep|counter|http|noop|hash|report"),
+    started_after: Optional[str] = typer.Option(None, help="ISO datetime"),
+    started_before: Optional[str] = typer.Option(None, help="ISO datetime"),
+):
+    params = {
+        "format": fmt,
+        "gzip": gzip,
+        "status": status,
+        "task_type": task_type,
+        "started_after": started_after,
+        "started_before": started_before,
+    }
+    written = 0
+    with requests.get(f"{API_URL}/executions/export", params=params, headers=headers(), stream=True) as r:
+        if r.status_code >= 400:
+            typer.secho(r.text, fg=typer.colors.RED)
+            raise typer.Exit(1)
+        with open(output, "wb") as f:
+            for chunk in r.iter_content(chunk_size=64 * 1024):
+                f.write(chunk)
+                written += len(chunk)
+    typer.echo(f"wrote {written} bytes to {output}")
 
 @app.command()
 def delete(task_id: int):
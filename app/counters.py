@@ -0,0 +1,123 @@
+import logging
+import threading
+from collections import defaultdict
+
+from sqlalchemy import select, text
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.db import SessionLocal
+from app.models import TaskCounter
+
+log = logging.getLogger("counters")
+
+
+def increment_counter(db: Session, task_id: int, delta: int = 1) -> int:
+    """Atomically add ``delta`` to a task's counter and return the new value."""
+    stmt = (
+        insert(TaskCounter)
+        .values(task_id=task_id, count=delta)
+        .on_conflict_do_update(index_elements=[TaskCounter.task_id], set_={"count": TaskCounter.count + delta})
+        .returning(TaskCounter.count)
+    )
+    count = db.execute(stmt).scalar_one()
+    db.commit()
+    return count
+
+
+class CounterAccumulator:
+    """Buffers counter increments in memory and flushes the deltas periodically.
+
+    Meant for very high-frequency counters: each execution costs a dict update
+    instead of a row update. Returned values are the last flushed count plus
+    the local pending delta, so other replicas' increments show up after the
+    next flush. Pending deltas are lost if the process dies before a flush.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pending: dict[int, int] = defaultdict(int)
+        self._flushed: dict[int, int] = {}
+        # deltas taken by a flush that hasn't committed yet
+        self._inflight: dict[int, int] = {}
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        if self.running:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="counter-flush", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=5)
+        self._thread = None
+        try:
+            self.flush()
+        except Exception:
+            log.exception("Counter flush error on stop")
+
+    def increment(self, db: Session, task_id: int) -> int:
+        if task_id not in self._flushed:
+            current = db.execute(select(TaskCounter.count).where(TaskCounter.task_id == task_id)).scalar()
+            with self._lock:
+                self._flushed.setdefault(task_id, current or 0)
+        with self._lock:
+            self._pending[task_id] += 1
+            return self._flushed[task_id] + self._inflight.get(task_id, 0) + self._pending[task_id]
+
+    def flush(self):
+        with self._lock:
+            deltas, self._pending = self._pending, defaultdict(int)
+            self._inflight = deltas
+        if not deltas:
+            return
+        try:
+            with SessionLocal() as db:
+                rows = db.execute(
+                    text(
+                        """
+                        INSERT INTO task_counters (task_id, count)
+                        SELECT v.task_id, v.delta
+                        FROM unnest(CAST(:ids AS integer[]), CAST(:deltas AS bigint[])) AS v(task_id, delta)
+                        JOIN tasks t ON t.id = v.task_id
+                        ON CONFLICT (task_id) DO UPDATE SET count = task_counters.count + EXCLUDED.count
+                        RETURNING task_id, count
+                        """
+                    ),
+                    {"ids": list(deltas), "deltas": list(deltas.values())},
+                ).all()
+                db.commit()
+        except Exception:
+            # put the deltas back so the next flush retries them
+            with self._lock:
+                for task_id, delta in deltas.items():
+                    self._pending[task_id] += delta
+                self._inflight = {}
+            raise
+        with self._lock:
+            self._inflight = {}
+            for task_id, count in rows:
+                self._flushed[task_id] = count
+            # deleted tasks
+            for task_id in deltas.keys() - {r[0] for r in rows}:
+                self._flushed.pop(task_id, None)
+        log.debug("counter flush tasks=%d", len(rows))
+
+    def _run(self):
+        while not self._stop.wait(settings.counter_flush_interval_seconds):
+            try:
+                self.flush()
+            except Exception:
+                log.exception("Counter flush error")
+
+
+counter_accumulator = CounterAccumulator()
@@ -0,0 +1,46 @@
+import hashlib
+import random
+import statistics
+import time
+from typing import Any
+
+# CPU-bound runners for the process backend. They run in pool children and
+# get only the task id and params, so nothing here may touch the DB.
+
+
+def run_hash_task(task_id: int, params: dict[str, Any]) -> dict[str, Any]:
+    """Iterated hashing: ``rounds`` passes of ``algorithm`` over ``data``."""
+    algorithm = params.get("algorithm", "sha256")
+    rounds = int(params.get("rounds", 100_000))
+    digest = str(params.get("data", f"task-{task_id}")).encode()
+    start = time.perf_counter()
+    for _ in range(rounds):
+        digest = hashlib.new(algorithm, digest).digest()
+    return {
+        "algorithm": algorithm,
+        "rounds": rounds,
+        "digest": digest.hex(),
+        "elapsed_seconds": time.perf_counter() - start,
+    }
+
+
+def run_report_task(task_id: int, params: dict[str, Any]) -> dict[str, Any]:
+    """Aggregate ``rows`` synthetic measurements into a summary report."""
+    rows = int(params.get("rows", 100_000))
+    buckets = int(params.get("buckets", 10))
+    rng = random.Random(params.get("seed", task_id))
+    start = time.perf_counter()
+    values = sorted(rng.lognormvariate(0, 1) for _ in range(rows))
+    counts = [0] * buckets
+    top = values[-1] if values else 0.0
+    for v in values:
+        counts[min(int(v / top * buckets), buckets - 1) if top else 0] += 1
+    return {
+        "rows": rows,
+        "mean": statistics.fmean(values) if values else None,
+        "p50": values[rows // 2] if values else None,
+        "p95": values[int(rows * 0.95)] if values else None,
+        "max": top,
+        "histogram": counts,
+        "elapsed_seconds": time.perf_counter() - start,
+    }
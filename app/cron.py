@@ -0,0 +1,77 @@
+import copy
+import threading
+from collections import OrderedDict
+from datetime import datetime
+from typing import Sequence
+
+from croniter import croniter
+
+from app.config import settings
+from app.metrics import CRON_CACHE_LOOKUPS, CRON_CACHE_SIZE
+
+# parse-time anchor for templates; every use moves the copy to its own start
+_EPOCH = datetime(2000, 1, 1)
+
+
+class CronCache:
+    """Bounded LRU of parsed cron expressions.
+
+    Parsing dominates the cost of a croniter, and thousands of tasks tend to
+    share a handful of expressions. Each entry is a croniter parsed once;
+    callers get a shallow copy moved to their start time, so the expanded
+    fields are shared and never re-parsed while the iteration state is the
+    caller's own. Invalid expressions raise and are not cached.
+    """
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self._entries: OrderedDict[str, croniter] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _template(self, expression: str) -> croniter:
+        with self._lock:
+            template = self._entries.get(expression)
+            if template is not None:
+                self._entries.move_to_end(expression)
+                CRON_CACHE_LOOKUPS.labels("hit").inc()
+                return template
+        CRON_CACHE_LOOKUPS.labels("miss").inc()
+        # parsed outside the lock; a concurrent miss on the same expression just parses twice
+        template = croniter(expression, _EPOCH)
+        with self._lock:
+            self._entries[expression] = template
+            self._entries.move_to_end(expression)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+            CRON_CACHE_SIZE.set(len(self._entries))
+        return template
+
+    def iterator(self, expression: str, start: datetime) -> croniter:
+        """A croniter for ``expression`` positioned at ``start``, as ``croniter(expression, start)``."""
+        it = copy.copy(self._template(expression))
+        it.set_current(start, force=True)
+        return it
+
+    def validate(self, expression: str) -> None:
+        """Raise if ``expression`` doesn't parse."""
+        self._template(expression)
+
+    def next_fire_time(self, expression: str, after: datetime) -> datetime:
+        return self.iterator(expression, after).get_next(datetime)
+
+    def next_fire_times(self, expression: str, afters: Sequence[datetime]) -> list[datetime]:
+        """Next fire time after each of ``afters``, for many tasks sharing ``expression``.
+
+        One cache lookup for the whole batch, and one computation per distinct
+        start time: tasks claimed in the same tick all share ``now``.
+        """
+        it = copy.copy(self._template(expression))
+        found: dict[datetime, datetime] = {}
+        for after in afters:
+            if after not in found:
+                it.set_current(after, force=True)
+                found[after] = it.get_next(datetime)
+        return [found[after] for after in afters]
+
+
+cron_cache = CronCache(settings.cron_cache_size)
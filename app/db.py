@@ -1,17 +1,114 @@
-from sqlalchemy import create_engine
+import time
+
+from sqlalchemy import create_engine, event
+from sqlalchemy import exc as sa_exc
+from sqlalchemy.engine import Engine, make_url
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker, DeclarativeBase
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
 from app.config import settings
+from app.metrics import DB_POOL_IN_USE, DB_POOL_TIMEOUTS, DB_POOL_WAIT
+
+
+def _timed_pool(base: type[QueuePool], name: str) -> type[QueuePool]:
+    """``base`` recording checkout wait time under pool label ``name``.
+
+    Wrapping the pool class, not the engine, keeps the timing on pools the
+    engine recreates after ``dispose()``.
+    """
+
+    class TimedPool(base):
+        def _do_get(self):
+            started = time.perf_counter()
+            try:
+                return super()._do_get()
+            except sa_exc.TimeoutError:
+                DB_POOL_TIMEOUTS.labels(name).inc()
+                raise
+            finally:
+                DB_POOL_WAIT.labels(name).observe(time.perf_counter() - started)
+
+    TimedPool.__name__ = f"Timed{base.__name__}"
+    return TimedPool
+
+
+def _track_in_use(engine: Engine, name: str) -> None:
+    gauge = DB_POOL_IN_USE.labels(name)
+    event.listen(engine, "checkout", lambda *_: gauge.inc())
+    event.listen(engine, "checkin", lambda *_: gauge.dec())
+
 
-engine = create_engine(settings.database_url, pool_pre_ping=True, echo=settings.sqlalchemy_echo)
+# Scheduler, executor and background-job traffic. The API has its own pool
+# (see open_api_engine), so a burst of slow ticks or task writes can't leave
+# requests waiting for a connection, nor the other way round.
+# values_plus_batch: executemany UPDATE/DELETE go out in pages (psycopg2 execute_batch), not row by row
+engine = create_engine(
+    settings.database_url,
+    pool_pre_ping=True,
+    echo=settings.sqlalchemy_echo,
+    executemany_mode="values_plus_batch",
+    poolclass=_timed_pool(QueuePool, "scheduler"),
+    pool_size=settings.db_pool_size,
+    max_overflow=settings.db_max_overflow,
+    pool_timeout=settings.db_pool_timeout_seconds,
+)
+_track_in_use(engine, "scheduler")
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# bound to the API engine by open_api_engine at app startup
+ApiSessionLocal = async_sessionmaker(class_=AsyncSession, autoflush=False, expire_on_commit=False)
+_api_engine: AsyncEngine | None = None
+
 class Base(DeclarativeBase):
     pass
 
 
-def get_db():
-    db = SessionLocal()
-    try:
+async def get_api_db():
+    async with ApiSessionLocal() as db:
         yield db
-    finally:
-        db.close()
+
+
+def create_async_db_engine(
+    pool_size: int, name: str = "async", max_overflow: int = 10, pool_timeout: float = 30.0
+) -> AsyncEngine:
+    """Build an asyncpg-backed engine for the same database.
+
+    Created on demand so deployments that never use it don't open its pool.
+    ``name`` labels its pool metrics.
+    """
+    url = make_url(settings.database_url).set(drivername="postgresql+asyncpg")
+    async_engine = create_async_engine(
+        url,
+        pool_pre_ping=True,
+        echo=settings.sqlalchemy_echo,
+        poolclass=_timed_pool(AsyncAdaptedQueuePool, name),
+        pool_size=pool_size,
+        max_overflow=max_overflow,
+        pool_timeout=pool_timeout,
+    )
+    _track_in_use(async_engine.sync_engine, name)
+    return async_engine
+
+
+async def open_api_engine() -> AsyncEngine:
+    """Create the API's engine and bind ``ApiSessionLocal`` to it.
+
+    asyncpg connections belong to the event loop that opened them, so this
+    runs on the serving loop at startup rather than at import.
+    """
+    global _api_engine
+    _api_engine = create_async_db_engine(
+        settings.api_db_pool_size,
+        name="api",
+        max_overflow=settings.api_db_max_overflow,
+        pool_timeout=settings.api_db_pool_timeout_seconds,
+    )
+    ApiSessionLocal.configure(bind=_api_engine)
+    return _api_engine
+
+
+async def close_api_engine() -> None:
+    global _api_engine
+    if _api_engine is not None:
+        await _api_engine.dispose()
+        _api_engine = None
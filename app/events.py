@@ -0,0 +1,125 @@
+import logging
+import select
+import threading
+from datetime import datetime, timezone
+from typing import Callable
+
+import psycopg2
+import psycopg2.extensions
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from app.db import engine
+
+SCHEDULE_CHANNEL = "trustle_schedule"
+# leader mode: the leader announces new rows in task_queue
+WORK_CHANNEL = "trustle_work"
+# sent by a trigger on tasks (see app/migrations.py) whenever listed task fields change
+TASKS_CHANNEL = "trustle_tasks"
+
+log = logging.getLogger("events")
+
+
+def to_naive_utc(value: datetime | None) -> datetime | None:
+    # timestamps are stored as naive UTC; clients may send offset-aware values
+    if value is not None and value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
+def notify(db: Session, channel: str, payload: str = "") -> None:
+    """Queue a NOTIFY on the caller's transaction; Postgres delivers it on commit."""
+    db.execute(text("SELECT pg_notify(:channel, :payload)"), {"channel": channel, "payload": payload})
+
+
+def notify_schedule_change(db: Session, next_run_at: datetime | None = None) -> None:
+    """Tell schedulers that a task's schedule changed.
+
+    The payload is the new ``next_run_at`` (naive UTC ISO format), or empty when
+    there is no single new deadline and listeners should resync instead.
+    """
+    next_run_at = to_naive_utc(next_run_at)
+    notify(db, SCHEDULE_CHANNEL, next_run_at.isoformat() if next_run_at else "")
+
+
+def notify_schedule_changes(db: Session, deadlines: list[datetime]) -> None:
+    """One ``notify_schedule_change`` per deadline, sent in a single statement."""
+    db.execute(
+        text("SELECT pg_notify(:channel, d) FROM unnest(CAST(:deadlines AS text[])) AS d"),
+        {"channel": SCHEDULE_CHANNEL, "deadlines": [to_naive_utc(d).isoformat() for d in deadlines]},
+    )
+
+
+def connect_autocommit():
+    """A raw psycopg2 connection outside the pool, for session-scoped state (LISTEN, advisory locks)."""
+    dsn = engine.url.set(drivername="postgresql").render_as_string(hide_password=False)
+    conn = psycopg2.connect(dsn)
+    conn.set_isolation_level(psycopg2.extensions.ISOLATION_LEVEL_AUTOCOMMIT)
+    return conn
+
+
+class Listener:
+    """LISTENs on Postgres channels from a dedicated connection and thread.
+
+    Callbacks receive the notification payload, or ``None`` right after every
+    (re)connect since notifications sent while disconnected are lost.
+    """
+
+    def __init__(self, reconnect_delay_seconds: float = 1.0):
+        self._handlers: dict[str, list[Callable[[str | None], None]]] = {}
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+        self._reconnect_delay = reconnect_delay_seconds
+
+    def subscribe(self, channel: str, callback: Callable[[str | None], None]) -> None:
+        self._handlers.setdefault(channel, []).append(callback)
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="pg-listener", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=5)
+        self._thread = None
+
+    def _connect(self):
+        conn = connect_autocommit()
+        with conn.cursor() as cur:
+            for channel in self._handlers:
+                cur.execute(f'LISTEN "{channel}"')
+        return conn
+
+    def _dispatch(self, channel: str, payload: str | None):
+        for callback in self._handlers.get(channel, ()):
+            try:
+                callback(payload)
+            except Exception:
+                log.exception("listener callback error channel=%s", channel)
+
+    def _run(self):
+        while not self._stop.is_set():
+            conn = None
+            try:
+                conn = self._connect()
+                log.info("listening channels=%s", ",".join(self._handlers))
+                for channel in self._handlers:
+                    self._dispatch(channel, None)
+                while not self._stop.is_set():
+                    # wake up periodically to notice stop()
+                    if select.select([conn], [], [], 1.0) == ([], [], []):
+                        continue
+                    conn.poll()
+                    while conn.notifies:
+                        n = conn.notifies.pop(0)
+                        self._dispatch(n.channel, n.payload)
+            except Exception:
+                log.exception("listener connection error; reconnecting")
+                self._stop.wait(self._reconnect_delay)
+            finally:
+                if conn is not None:
+                    conn.close()
@@ -0,0 +1,116 @@
+import logging
+import threading
+from typing import Any
+
+import httpx
+
+from app.config import settings
+
+log = logging.getLogger("http_pool")
+
+HostKey = tuple[str, str, int | None]
+
+
+class HttpClientPool:
+    """Long-lived keep-alive HTTP clients shared by every http task in the process.
+
+    One client per (scheme, host, port) so ``http_max_connections_per_host``
+    caps each host separately. Sync clients serve the thread engine and async
+    clients the asyncio engine; the scheduler closes both on ``stop()``.
+    """
+
+    def __init__(self):
+        self._clients: dict[HostKey, httpx.Client] = {}
+        self._async_clients: dict[HostKey, httpx.AsyncClient] = {}
+        self._lock = threading.Lock()
+        self._http2 = settings.http_http2
+        self.requests = 0
+        self.hits = 0
+        self.connections_reused = 0
+
+    def _client_kwargs(self) -> dict[str, Any]:
+        cap = settings.http_max_connections_per_host
+        return {
+            "timeout": httpx.Timeout(settings.http_timeout_seconds, connect=settings.http_connect_timeout_seconds),
+            "limits": httpx.Limits(
+                max_connections=cap,
+                max_keepalive_connections=cap,
+                keepalive_expiry=settings.http_keepalive_expiry_seconds,
+            ),
+            "http2": self._http2,
+        }
+
+    def _build(self, factory):
+        try:
+            return factory(**self._client_kwargs())
+        except ImportError:
+            # http2 needs the optional 'h2' package
+            log.warning("HTTP/2 requested but h2 is not installed; falling back to HTTP/1.1")
+            self._http2 = False
+            return factory(**self._client_kwargs())
+
+    def _lookup(self, clients: dict, url: str, factory) -> tuple[Any, bool]:
+        u = httpx.URL(url)
+        key = (u.scheme, u.host, u.port)
+        with self._lock:
+            client = clients.get(key)
+            hit = client is not None
+            if not hit:
+                client = clients[key] = self._build(factory)
+            self.requests += 1
+            self.hits += hit
+        return client, hit
+
+    def _record(self, hit: bool, reused: bool) -> dict[str, Any]:
+        with self._lock:
+            self.connections_reused += reused
+            return {
+                "client_hit": hit,
+                "connection_reused": reused,
+                "hit_rate": round(self.hits / self.requests, 4),
+                "reuse_rate": round(self.connections_reused / self.requests, 4),
+            }
+
+    def _request_timeout(self, timeout: float | None):
+        """Per-request timeout capped at ``timeout`` seconds; the client default when None."""
+        if timeout is None:
+            return httpx.USE_CLIENT_DEFAULT
+        total = min(timeout, settings.http_timeout_seconds)
+        return httpx.Timeout(total, connect=min(total, settings.http_connect_timeout_seconds))
+
+    def get(self, url: str, timeout: float | None = None) -> tuple[httpx.Response, dict[str, Any]]:
+        client, hit = self._lookup(self._clients, url, httpx.Client)
+        connected = []
+
+        def trace(event: str, info: dict):
+            if event == "connection.connect_tcp.started":
+                connected.append(True)
+
+        resp = client.get(url, extensions={"trace": trace}, timeout=self._request_timeout(timeout))
+        return resp, self._record(hit, not connected)
+
+    async def get_async(self, url: str) -> tuple[httpx.Response, dict[str, Any]]:
+        client, hit = self._lookup(self._async_clients, url, httpx.AsyncClient)
+        connected = []
+
+        async def trace(event: str, info: dict):
+            if event == "connection.connect_tcp.started":
+                connected.append(True)
+
+        resp = await client.get(url, extensions={"trace": trace})
+        return resp, self._record(hit, not connected)
+
+    def close(self):
+        with self._lock:
+            clients, self._clients = self._clients, {}
+        for client in clients.values():
+            client.close()
+
+    async def aclose(self):
+        with self._lock:
+            clients, self._async_clients = self._async_clients, {}
+        for client in clients.values():
+            await client.aclose()
+
+
+http_pool = HttpClientPool()
@@ -0,0 +1,55 @@
+import logging
+import time
+
+import psycopg2
+
+from app.config import settings
+from app.events import connect_autocommit
+from app.locks import LEADER_LOCK_KEY
+
+log = logging.getLogger("leader")
+
+
+class LeaderElector:
+    """Holds the dispatcher leadership through a session-level advisory lock.
+
+    The lock lives on a dedicated connection, so it is released by Postgres as
+    soon as the leader's process or connection dies and another replica's next
+    ``poll()`` takes over. Only the scheduler thread calls ``poll()``.
+    """
+
+    def __init__(self):
+        self._conn = None
+        self._next_check = 0.0
+        self.is_leader = False
+
+    def poll(self) -> bool:
+        """Try to become leader, or confirm the lock is still held; rate-limited."""
+        now = time.monotonic()
+        if now < self._next_check:
+            return self.is_leader
+        self._next_check = now + settings.leader_retry_seconds
+        try:
+            if self._conn is None or self._conn.closed:
+                self._conn = connect_autocommit()
+            with self._conn.cursor() as cur:
+                if self.is_leader:
+                    # the lock lasts as long as this connection does
+                    cur.execute("SELECT 1")
+                else:
+                    cur.execute("SELECT pg_try_advisory_lock(%s)", (LEADER_LOCK_KEY,))
+                    self.is_leader = cur.fetchone()[0]
+                    if self.is_leader:
+                        log.info("acquired dispatcher leadership")
+        except psycopg2.Error:
+            log.exception("leader connection error")
+            if self.is_leader:
+                log.warning("lost dispatcher leadership")
+            self.release()
+        return self.is_leader
+
+    def release(self):
+        if self._conn is not None and not self._conn.closed:
+            self._conn.close()
+        self._conn = None
+        self.is_leader = False
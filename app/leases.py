@@ -0,0 +1,178 @@
+import logging
+import socket
+import threading
+import time
+import uuid
+from datetime import datetime
+
+from sqlalchemy import text, update
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.db import SessionLocal
+from app.events import notify_schedule_change
+from app.locks import SWEEP_LOCK_KEY
+from app.models import Task
+
+log = logging.getLogger("leases")
+
+# written to tasks.claimed_by for every task this process claims
+REPLICA_ID = settings.replica_id or f"{socket.gethostname()}-{uuid.uuid4().hex[:8]}"
+
+# claimed_by of tasks the leader has put in task_queue but no replica has taken yet
+QUEUED = "queue"
+
+# Release tasks whose lease ran out (their replica died or lost the DB) and
+# close the executions they left in 'running'. Interval and cron tasks already
+# had next_run_at advanced at claim time, so they simply run on schedule; a
+# once task's claim cleared it, so the lost run is made due again right away.
+SWEEP_SQL = text(
+    """
+    WITH expired AS (
+        SELECT id, claimed_by FROM tasks
+        WHERE running = TRUE AND lease_expires_at < :now
+        ORDER BY lease_expires_at
+        LIMIT :batch_size
+        FOR UPDATE SKIP LOCKED
+    ), released AS (
+        UPDATE tasks AS t
+        SET running = FALSE, claimed_by = NULL, lease_expires_at = NULL,
+            next_run_at = COALESCE(t.next_run_at, :now)
+        FROM expired
+        WHERE t.id = expired.id
+        RETURNING t.id, t.next_run_at, expired.claimed_by
+    ), closed AS (
+        UPDATE executions AS e
+        SET status = 'failed', finished_at = :now,
+            detail = 'lease expired; worker ' || COALESCE(released.claimed_by, 'unknown') || ' lost'
+        FROM released
+        WHERE e.task_id = released.id AND e.status = 'running'
+    )
+    SELECT id, next_run_at, claimed_by FROM released
+    """
+)
+
+
+def release_task(db: Session, task_id: int, next_run_at: datetime | None = None) -> datetime | None:
+    """Clear ``running`` and the lease on a task this replica claimed; commits.
+
+    Does nothing if the lease was swept and the task claimed again meanwhile.
+    Returns the task's resulting ``next_run_at``.
+    """
+    values = {"running": False, "claimed_by": None, "lease_expires_at": None}
+    if next_run_at is not None:
+        values["next_run_at"] = next_run_at
+    result = db.execute(
+        update(Task)
+        .where(Task.id == task_id, Task.claimed_by == REPLICA_ID)
+        .values(**values)
+        .returning(Task.next_run_at)
+    ).scalar()
+    db.commit()
+    return result
+
+
+def sweep_expired(db: Session, now: datetime) -> list:
+    """Release one batch of expired leases; returns the released rows.
+
+    An advisory transaction lock keeps replicas from sweeping at the same time,
+    and SKIP LOCKED keeps the sweep off rows a claim is touching.
+    """
+    if not db.execute(text("SELECT pg_try_advisory_xact_lock(:key)"), {"key": SWEEP_LOCK_KEY}).scalar():
+        db.rollback()
+        return []
+    rows = db.execute(SWEEP_SQL, {"now": now, "batch_size": settings.lease_sweep_batch_size}).all()
+    deadlines = [r.next_run_at for r in rows if r.next_run_at is not None]
+    if deadlines:
+        # wake every replica's scheduler for tasks that are due again
+        notify_schedule_change(db, min(deadlines))
+    db.commit()
+    return rows
+
+
+class LeaseKeeper:
+    """Renews this replica's leases and sweeps expired ones.
+
+    Every ``heartbeat_interval_seconds`` one UPDATE extends the lease of every
+    task running here. Every ``lease_sweep_interval_seconds`` expired leases
+    are released in batches, so a task claimed by a dead replica runs again
+    within roughly ``lease_seconds`` plus one sweep interval.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # task id -> number of runs in flight here (normally 1)
+        self._held: dict[int, int] = {}
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="leases", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=5)
+        self._thread = None
+
+    def track(self, task_id: int):
+        with self._lock:
+            self._held[task_id] = self._held.get(task_id, 0) + 1
+
+    def untrack(self, task_id: int):
+        with self._lock:
+            if self._held.get(task_id, 0) <= 1:
+                self._held.pop(task_id, None)
+            else:
+                self._held[task_id] -= 1
+
+    def heartbeat(self) -> int:
+        with self._lock:
+            ids = list(self._held)
+        if not ids:
+            return 0
+        with SessionLocal() as db:
+            renewed = db.execute(
+                text(
+                    """
+                    UPDATE tasks
+                    SET lease_expires_at = CAST(:now AS timestamp) + make_interval(secs => :lease)
+                    WHERE id = ANY(:ids) AND claimed_by = :replica AND running = TRUE
+                    """
+                ),
+                {"now": datetime.utcnow(), "lease": settings.lease_seconds, "ids": ids, "replica": REPLICA_ID},
+            ).rowcount
+            db.commit()
+        log.debug("heartbeat renewed=%d held=%d", renewed, len(ids))
+        return renewed
+
+    def sweep(self) -> int:
+        total = 0
+        with SessionLocal() as db:
+            while not self._stop.is_set():
+                rows = sweep_expired(db, datetime.utcnow())
+                for row in rows:
+                    log.warning("lease expired task_id=%s claimed_by=%s; released", row.id, row.claimed_by)
+                total += len(rows)
+                if len(rows) < settings.lease_sweep_batch_size:
+                    break
+        return total
+
+    def _run(self):
+        next_heartbeat = next_sweep = time.monotonic()
+        while not self._stop.is_set():
+            now = time.monotonic()
+            try:
+                if now >= next_heartbeat:
+                    next_heartbeat = now + settings.heartbeat_interval_seconds
+                    self.heartbeat()
+                if now >= next_sweep:
+                    next_sweep = now + settings.lease_sweep_interval_seconds
+                    self.sweep()
+            except Exception:
+                log.exception("Lease keeper error")
+            self._stop.wait(max(0.0, min(next_heartbeat, next_sweep) - time.monotonic()))
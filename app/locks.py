@@ -0,0 +1,7 @@
+# Postgres advisory lock keys. Advisory locks share one keyspace per database,
+# so every key the app takes is defined here and must not collide with keys
+# used by anything else in the same database.
+SWEEP_LOCK_KEY = 0x7472_7573
+LEADER_LOCK_KEY = 0x7472_7574
+MIGRATION_LOCK_KEY = 0x7472_7575
+INDEX_BUILD_LOCK_KEY = 0x7472_7576
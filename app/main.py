@@ -3,11 +3,16 @@ from fastapi import FastAPI
 from app.api import router
 from app.scheduler import scheduler
 from app.config import settings
-from app.db import engine, Base
+from app.db import engine, Base, close_api_engine, open_api_engine
+from app.metrics import HTTP_REQUEST_DURATION
+from app.migrations import run_migrations, start_index_build
+from app.response_cache import response_cache
+from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
 import time
-from sqlalchemy import text
+from sqlalchemy import exc as sa_exc, text
 from typing import Callable
 from fastapi import Request, Response
+from fastapi.responses import JSONResponse
 import json
 
 app = FastAPI(title="Trustle Task Scheduler")
@@ -57,6 +62,12 @@ async def on_startup():
         logging.info("DB readiness check result: %s", type(last_err).__name__)
     # create tables (idempotent)
     Base.metadata.create_all(bind=engine)
+    run_migrations(engine)
+    if settings.index_build_on_startup:
+        start_index_build(engine)
+    await open_api_engine()
+    if settings.response_cache_enable:
+        response_cache.start()
     if settings.scheduler_enable:
         scheduler.start()
 
@@ -64,15 +75,31 @@ async def on_startup():
 async def on_shutdown():
     if settings.scheduler_enable:
         scheduler.stop()
+    response_cache.stop()
+    await close_api_engine()
+
+@app.exception_handler(sa_exc.TimeoutError)
+async def pool_timeout_handler(request: Request, exc: sa_exc.TimeoutError):
+    # the API pool stayed exhausted for API_DB_POOL_TIMEOUT_SECONDS; shed load rather than queue
+    logging.getLogger("http").warning("db pool timeout path=%s", request.url.path)
+    return JSONResponse(status_code=503, content={"detail": "Database busy"}, headers={"Retry-After": "1"})
 
 @app.middleware("http")
 async def logging_middleware(request: Request, call_next: Callable[[Request], Response]):
     start = time.perf_counter()
+    response = None
     try:
         response = await call_next(request)
         return response
     finally:
         duration = (time.perf_counter() - start) * 1000
+        # route template, not the raw path, so ids don't become label values
+        route = request.scope.get("route")
+        HTTP_REQUEST_DURATION.labels(
+            request.method,
+            route.path if route else "unmatched",
+            getattr(response, "status_code", 500),
+        ).observe(duration / 1000)
         logging.getLogger("http").info(
             "method=%s path=%s status=%s duration_ms=%.2f client=%s",
             request.method,
@@ -85,3 +112,7 @@ async def logging_middleware(request: Request, call_next: Callable[[Request], Re
 @app.get("/healthz")
 async def healthz():
     return {"status": "ok"}
+
+@app.get("/metrics")
+async def metrics():
+    return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
@@ -0,0 +1,78 @@
+import time
+from datetime import datetime
+
+from prometheus_client import Counter, Gauge, Histogram
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+# Prometheus metrics for the scheduler and executor hot paths, served by
+# GET /metrics in app/main.py. Label values are bounded: task types come from
+# the registry, statuses from the execution lifecycle, routes from templates.
+
+# latency buckets in seconds; from sub-millisecond DB commits up to long tasks
+FAST_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+SLOW_BUCKETS = (0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0)
+
+TICK_DURATION = Histogram(
+    "trustle_scheduler_tick_duration_seconds", "Time spent in one scheduler tick (claim and dispatch)", buckets=FAST_BUCKETS
+)
+TICK_DUE = Histogram(
+    "trustle_scheduler_tick_due_tasks", "Due tasks claimed per scheduler tick", buckets=(0, 1, 5, 10, 25, 50, 100, 250, 500, 1000)
+)
+DISPATCH_LAG = Histogram(
+    "trustle_scheduler_dispatch_lag_seconds", "Time from a task's next_run_at to its dispatch", ["type"], buckets=SLOW_BUCKETS
+)
+QUEUE_DEPTH = Gauge(
+    "trustle_queue_depth", "Items waiting: scheduler deadlines, leader dispatch queue, write-behind events", ["queue"]
+)
+ACTIVE_WORKERS = Gauge("trustle_active_workers", "Executions in flight on this replica", ["type"])
+EXECUTION_DURATION = Histogram(
+    "trustle_execution_duration_seconds", "Task execution duration", ["type", "status"], buckets=SLOW_BUCKETS
+)
+EXECUTIONS = Counter("trustle_executions", "Finished executions", ["type", "status"])
+DB_COMMIT_DURATION = Histogram(
+    "trustle_db_commit_duration_seconds", "ORM session commit latency, including the final flush", buckets=FAST_BUCKETS
+)
+DB_POOL_WAIT = Histogram(
+    "trustle_db_pool_wait_seconds", "Time spent waiting to check a connection out of a pool", ["pool"], buckets=FAST_BUCKETS
+)
+DB_POOL_IN_USE = Gauge("trustle_db_pool_in_use", "Connections checked out of a pool", ["pool"])
+DB_POOL_TIMEOUTS = Counter("trustle_db_pool_timeouts", "Checkouts that gave up after the pool timeout", ["pool"])
+CRON_CACHE_LOOKUPS = Counter("trustle_cron_cache_lookups", "Parsed cron schedule cache lookups by result (hit, miss)", ["result"])
+CRON_CACHE_SIZE = Gauge("trustle_cron_cache_size", "Parsed cron expressions held in the cache")
+RESPONSE_CACHE = Counter(
+    "trustle_response_cache", "Cached listing lookups: hit, miss or not_modified (304)", ["endpoint", "result"]
+)
+HTTP_REQUEST_DURATION = Histogram(
+    "trustle_http_request_duration_seconds", "API request latency", ["method", "route", "status"], buckets=FAST_BUCKETS
+)
+
+
+def observe_execution(task_type: str, status: str, duration_seconds: float):
+    EXECUTION_DURATION.labels(task_type, status).observe(duration_seconds)
+    EXECUTIONS.labels(task_type, status).inc()
+
+
+def observe_dispatch_lag(rows: list[dict], now: datetime):
+    """Record how late each claimed row was; rows without ``due_at`` are skipped."""
+    for row in rows:
+        if row.get("due_at") is not None:
+            DISPATCH_LAG.labels(row["type"]).observe(max(0.0, (now - row["due_at"]).total_seconds()))
+
+
+# Session events cover sync sessions and the sync side of AsyncSession alike
+@event.listens_for(Session, "before_commit")
+def _commit_started(session: Session):
+    session.info["commit_started"] = time.perf_counter()
+
+
+@event.listens_for(Session, "after_commit")
+def _commit_finished(session: Session):
+    started = session.info.pop("commit_started", None)
+    if started is not None:
+        DB_COMMIT_DURATION.observe(time.perf_counter() - started)
+
+
+@event.listens_for(Session, "after_rollback")
+def _commit_abandoned(session: Session):
+    session.info.pop("commit_started", None)
@@ -0,0 +1,169 @@
+import logging
+import threading
+
+from sqlalchemy import text
+from sqlalchemy.engine import Engine
+
+from app.events import TASKS_CHANNEL
+from app.locks import INDEX_BUILD_LOCK_KEY, MIGRATION_LOCK_KEY
+
+log = logging.getLogger("migrations")
+
+# Idempotent DDL for databases created before a model change; create_all only
+# creates missing tables, not missing columns or indexes on existing ones.
+# Runs at every startup; index builds can take long and are kept apart, see build_indexes.
+MIGRATIONS: list[str] = [
+    "ALTER TABLE tasks ADD COLUMN IF NOT EXISTS retention_days INTEGER",
+    "ALTER TABLE tasks ADD COLUMN IF NOT EXISTS priority INTEGER NOT NULL DEFAULT 0",
+    "ALTER TABLE tasks ADD COLUMN IF NOT EXISTS jitter_seconds INTEGER",
+    "ALTER TABLE tasks ADD COLUMN IF NOT EXISTS misfire_policy VARCHAR(20)",
+    "ALTER TABLE tasks ADD COLUMN IF NOT EXISTS misfire_limit INTEGER",
+    "ALTER TABLE tasks ADD COLUMN IF NOT EXISTS claimed_by VARCHAR(255)",
+    "ALTER TABLE tasks ADD COLUMN IF NOT EXISTS lease_expires_at TIMESTAMP",
+    "ALTER TABLE executions ADD COLUMN IF NOT EXISTS timings JSON",
+    "ALTER TABLE executions ADD COLUMN IF NOT EXISTS profile TEXT",
+    # NOTIFY for every row change that alters a column TaskOut shows, whoever makes
+    # it (API, claims, finishes, lease sweeps); keep the column list in step with
+    # TaskOut. Row-level so statements that change nothing, like an empty claim or
+    # sweep, stay silent, and so do heartbeats, which only touch lease_expires_at.
+    # Notifications repeated within a transaction are folded into one by Postgres.
+    f"""
+    CREATE OR REPLACE FUNCTION trustle_notify_tasks_changed() RETURNS trigger AS $$
+    BEGIN
+        PERFORM pg_notify('{TASKS_CHANNEL}', '');
+        RETURN NULL;
+    END
+    $$ LANGUAGE plpgsql
+    """,
+    # statement-level predecessor that fired on zero-row updates
+    "DROP TRIGGER IF EXISTS tasks_changed ON tasks",
+    """
+    CREATE OR REPLACE TRIGGER tasks_rows_changed
+    AFTER INSERT OR DELETE ON tasks FOR EACH ROW EXECUTE FUNCTION trustle_notify_tasks_changed()
+    """,
+    """
+    CREATE OR REPLACE TRIGGER tasks_rows_updated
+    AFTER UPDATE ON tasks FOR EACH ROW
+    WHEN (
+        (OLD.name, OLD.type, OLD.schedule_type, OLD.interval_seconds, OLD.cron_expression, OLD.next_run_at,
+         CAST(OLD.params AS text), OLD.timeout_seconds, OLD.retention_days, OLD.priority, OLD.jitter_seconds,
+         OLD.misfire_policy, OLD.misfire_limit, OLD.running)
+        IS DISTINCT FROM
+        (NEW.name, NEW.type, NEW.schedule_type, NEW.interval_seconds, NEW.cron_expression, NEW.next_run_at,
+         CAST(NEW.params AS text), NEW.timeout_seconds, NEW.retention_days, NEW.priority, NEW.jitter_seconds,
+         NEW.misfire_policy, NEW.misfire_limit, NEW.running)
+    )
+    EXECUTE FUNCTION trustle_notify_tasks_changed()
+    """,
+    """
+    CREATE OR REPLACE TRIGGER tasks_truncated
+    AFTER TRUNCATE ON tasks FOR EACH STATEMENT EXECUTE FUNCTION trustle_notify_tasks_changed()
+    """,
+    # runs left stuck by versions without leases get swept once old replicas had time to finish them
+    """
+    UPDATE tasks SET lease_expires_at = timezone('utc', now()) + interval '10 minutes'
+    WHERE running = TRUE AND lease_expires_at IS NULL
+    """,
+    # counter values used to live in tasks.params["count"]
+    """
+    INSERT INTO task_counters (task_id, count)
+    SELECT id, CAST(params->>'count' AS bigint) FROM tasks
+    WHERE type = 'counter' AND params->>'count' ~ '^-?[0-9]+$'
+    ON CONFLICT (task_id) DO NOTHING
+    """,
+    """
+    UPDATE tasks SET params = CAST(CAST(params AS jsonb) - 'count' AS json)
+    WHERE type = 'counter' AND params->>'count' IS NOT NULL
+    """,
+    # global claim order, unused since claims select per type (ix_tasks_type_claim_order)
+    "DROP INDEX CONCURRENTLY IF EXISTS ix_tasks_claim_order",
+]
+
+
+# Indexes added after their table, by name. Built CONCURRENTLY so large tables
+# stay writable, which can take long enough that it must not hold up startup.
+INDEXES: dict[str, str] = {
+    "ix_executions_started_at_id": "ON executions (started_at, id)",
+    "ix_executions_task_id_started_at_id": "ON executions (task_id, started_at, id)",
+    "ix_executions_status_started_at_id": "ON executions (status, started_at, id)",
+    "ix_tasks_lease_expires_at": "ON tasks (lease_expires_at) WHERE running = TRUE",
+    "ix_tasks_type_claim_order": "ON tasks (type, priority DESC, next_run_at) WHERE running = FALSE",
+    "ix_task_queue_type_order": "ON task_queue (type, priority DESC, id)",
+}
+
+
+def run_migrations(engine: Engine) -> None:
+    """Apply MIGRATIONS; replicas starting together take turns."""
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        conn.execute(text("SELECT pg_advisory_lock(:key)"), {"key": MIGRATION_LOCK_KEY})
+        try:
+            for stmt in MIGRATIONS:
+                log.debug("migrate %s", stmt)
+                conn.execute(text(stmt))
+        finally:
+            conn.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": MIGRATION_LOCK_KEY})
+
+
+def build_indexes(engine: Engine) -> list[str]:
+    """Create missing INDEXES and rebuild invalid ones; returns the names built.
+
+    A failed or interrupted CREATE INDEX CONCURRENTLY leaves an INVALID index
+    that IF NOT EXISTS would skip forever, so validity is checked and such an
+    index is dropped and built again. Only one replica builds at a time; the
+    others return right away rather than wait for it.
+    """
+    built = []
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        if not conn.execute(text("SELECT pg_try_advisory_lock(:key)"), {"key": INDEX_BUILD_LOCK_KEY}).scalar():
+            log.info("index build already running elsewhere")
+            return built
+        try:
+            valid = dict(
+                conn.execute(
+                    text(
+                        """
+                        SELECT c.relname, i.indisvalid FROM pg_index i
+                        JOIN pg_class c ON c.oid = i.indexrelid
+                        WHERE c.relname = ANY(:names) AND pg_table_is_visible(c.oid)
+                        """
+                    ),
+                    {"names": list(INDEXES)},
+                ).all()
+            )
+            for name, definition in INDEXES.items():
+                if valid.get(name):
+                    continue
+                if name in valid:
+                    log.warning("rebuilding invalid index %s", name)
+                    conn.execute(text(f"DROP INDEX CONCURRENTLY IF EXISTS {name}"))
+                log.info("building index %s", name)
+                conn.execute(text(f"CREATE INDEX CONCURRENTLY {name} {definition}"))
+                built.append(name)
+        finally:
+            conn.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": INDEX_BUILD_LOCK_KEY})
+    return built
+
+
+def start_index_build(engine: Engine) -> threading.Thread:
+    """Run build_indexes in the background so a long build doesn't delay startup."""
+
+    def run():
+        try:
+            build_indexes(engine)
+        except Exception:
+            log.exception("index build failed; it is retried at the next start")
+
+    thread = threading.Thread(target=run, name="index-build", daemon=True)
+    thread.start()
+    return thread
+
+
+if __name__ == "__main__":
+    # one-off migration job, for deployments that set INDEX_BUILD_ON_STARTUP=false
+    import app.models  # noqa: F401  (registers the tables)
+    from app.db import Base, engine
+
+    logging.basicConfig(level=logging.INFO)
+    Base.metadata.create_all(bind=engine)
+    run_migrations(engine)
+    build_indexes(engine)
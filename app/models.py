@@ -1,14 +1,13 @@
 from datetime import datetime
 from enum import Enum
-from sqlalchemy import Column, Integer, String, DateTime, JSON, Boolean, Text, ForeignKey
+from sqlalchemy import text, Column, Integer, BigInteger, String, DateTime, JSON, Boolean, Text, ForeignKey, Index, Float
 from sqlalchemy.ext.mutable import MutableDict
 from sqlalchemy.orm import relationship, Mapped, mapped_column
 from app.db import Base
+from app.task_types import TASK_TYPES
 
-class TaskType(str, Enum):
-    SLEEP = "sleep"
-    COUNTER = "counter"
-    HTTP = "http"
+# one member per registered task type, e.g. TaskType.SLEEP == "sleep"
+TaskType = Enum("TaskType", {name.upper(): name for name in TASK_TYPES}, type=str)
 
 class ScheduleType(str, Enum):
     INTERVAL = "interval"
@@ -17,6 +16,14 @@ class ScheduleType(str, Enum):
 
 class Task(Base):
     __tablename__ = "tasks"
+    # serve the scheduler's per-type claim order over idle tasks and the lease sweep over running ones
+    __table_args__ = (
+        Index(
+            "ix_tasks_type_claim_order", "type", text("priority DESC"), "next_run_at",
+            postgresql_where=text("running = FALSE"),
+        ),
+        Index("ix_tasks_lease_expires_at", "lease_expires_at", postgresql_where=text("running = TRUE")),
+    )
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True, index=True)
     name: Mapped[str] = mapped_column(String(255), unique=True, nullable=False)
@@ -27,7 +34,20 @@ class Task(Base):
     next_run_at: Mapped[datetime | None] = mapped_column(DateTime, nullable=True, index=True)
     params: Mapped[dict | None] = mapped_column(MutableDict.as_mutable(JSON), nullable=True)
     timeout_seconds: Mapped[int | None] = mapped_column(Integer, nullable=True)
+    # overrides settings.execution_retention_days for this task's raw executions
+    retention_days: Mapped[int | None] = mapped_column(Integer, nullable=True)
+    # higher runs first when more tasks are due than there are free slots
+    priority: Mapped[int] = mapped_column(Integer, default=0, server_default="0", nullable=False)
+    # max random delay added to each interval reschedule; overrides settings.schedule_jitter_seconds
+    jitter_seconds: Mapped[int | None] = mapped_column(Integer, nullable=True)
+    # coalesce / skip / catch_up for runs overdue by more than misfire_grace_seconds; None uses the default
+    misfire_policy: Mapped[str | None] = mapped_column(String(20), nullable=True)
+    # max missed runs fired by catch_up
+    misfire_limit: Mapped[int | None] = mapped_column(Integer, nullable=True)
     running: Mapped[bool] = mapped_column(Boolean, default=False, nullable=False)
+    # replica running the task and when its claim lapses unless renewed by a heartbeat
+    claimed_by: Mapped[str | None] = mapped_column(String(255), nullable=True)
+    lease_expires_at: Mapped[datetime | None] = mapped_column(DateTime, nullable=True)
     created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
     updated_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
 
@@ -35,13 +55,56 @@ class Task(Base):
 
 class Execution(Base):
     __tablename__ = "executions"
+    # keyset pagination walks (started_at, id); the task_id index also serves FK cascades
+    __table_args__ = (
+        Index("ix_executions_started_at_id", "started_at", "id"),
+        Index("ix_executions_task_id_started_at_id", "task_id", "started_at", "id"),
+        Index("ix_executions_status_started_at_id", "status", "started_at", "id"),
+    )
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
-    task_id: Mapped[int] = mapped_column(ForeignKey("tasks.id", ondelete="CASCADE"), index=True)
+    task_id: Mapped[int] = mapped_column(ForeignKey("tasks.id", ondelete="CASCADE"))
     started_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
     finished_at: Mapped[datetime | None] = mapped_column(DateTime, nullable=True)
     status: Mapped[str] = mapped_column(String(50), default="running")
     detail: Mapped[str | None] = mapped_column(Text, nullable=True)
     result: Mapped[dict | None] = mapped_column(JSON, nullable=True)
+    # ms since claim for each phase, see app/profiling.py
+    timings: Mapped[dict | None] = mapped_column(JSON, nullable=True)
+    # cProfile report for sampled executions; deferred so listings don't load it
+    profile: Mapped[str | None] = mapped_column(Text, nullable=True, deferred=True)
 
     task = relationship("Task", back_populates="executions")
+
+class QueuedTask(Base):
+    """A claimed task waiting for a replica to run it (SCHEDULER_MODE=leader)."""
+    __tablename__ = "task_queue"
+    # serves the per-type dequeue order
+    __table_args__ = (Index("ix_task_queue_type_order", "type", text("priority DESC"), "id"),)
+
+    id: Mapped[int] = mapped_column(BigInteger, primary_key=True, autoincrement=True)
+    task_id: Mapped[int] = mapped_column(ForeignKey("tasks.id", ondelete="CASCADE"), nullable=False)
+    type: Mapped[str] = mapped_column(String(50), nullable=False)
+    priority: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+    enqueued_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, nullable=False)
+
+class TaskCounter(Base):
+    """Counter task state, kept out of ``Task.params`` so it can be bumped atomically."""
+    __tablename__ = "task_counters"
+
+    task_id: Mapped[int] = mapped_column(ForeignKey("tasks.id", ondelete="CASCADE"), primary_key=True)
+    count: Mapped[int] = mapped_column(BigInteger, default=0, nullable=False)
+
+class ExecutionRollup(Base):
+    """Hourly per-task aggregate of executions removed by the retention job."""
+    __tablename__ = "execution_rollups"
+
+    task_id: Mapped[int] = mapped_column(ForeignKey("tasks.id", ondelete="CASCADE"), primary_key=True)
+    hour: Mapped[datetime] = mapped_column(DateTime, primary_key=True)
+    count: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+    success_count: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+    failed_count: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+    timeout_count: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+    duration_sum: Mapped[float] = mapped_column(Float, default=0.0, nullable=False)
+    duration_min: Mapped[float | None] = mapped_column(Float, nullable=True)
+    duration_max: Mapped[float | None] = mapped_column(Float, nullable=True)
@@ -0,0 +1,86 @@
+import logging
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures import TimeoutError as FuturesTimeout
+from typing import Any
+
+from app.config import settings
+from app.profiling import SampledProfile
+from app.task_types import resolve
+
+log = logging.getLogger("process_pool")
+
+
+def _call(runner: str, task_id: int, params: dict[str, Any], profile: bool) -> tuple[dict[str, Any], str | None]:
+    # runs in the child; the runner is looked up there, not pickled
+    with SampledProfile(profile) as prof:
+        result = resolve(runner)(task_id, params)
+    return result, prof.report
+
+
+class ProcessPool:
+    """ProcessPoolExecutor for ``process``-backend task types.
+
+    Children are spawned rather than forked so they don't inherit the parent's
+    DB connections and threads. A child stuck past its task's hard timeout
+    can't be interrupted, so the pool is replaced; the old one finishes its
+    running jobs and exits, and new work gets fresh workers. ``close`` kills
+    whatever retired children are still stuck.
+    """
+
+    def __init__(self):
+        self._pool: ProcessPoolExecutor | None = None
+        # children of replaced pools, possibly still stuck on a timed-out task
+        self._retired: list[multiprocessing.Process] = []
+        self._lock = threading.Lock()
+
+    def _current(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._pool is None:
+                self._pool = ProcessPoolExecutor(
+                    max_workers=settings.process_pool_workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                )
+            return self._pool
+
+    def run(
+        self, runner: str, task_id: int, params: dict[str, Any], timeout: float | None = None, profile: bool = False
+    ) -> tuple[dict[str, Any], str | None]:
+        """Run ``runner(task_id, params)`` in a child; raises TimeoutError past ``timeout``.
+
+        Returns the result and, with ``profile``, the child's cProfile report.
+        """
+        pool = self._current()
+        fut = pool.submit(_call, runner, task_id, params, profile)
+        try:
+            return fut.result(timeout=timeout)
+        except FuturesTimeout:
+            if not fut.cancel():
+                self._retire(pool)
+            raise TimeoutError(f"task {task_id} still running after {timeout}s") from None
+
+    def _retire(self, pool: ProcessPoolExecutor):
+        with self._lock:
+            if self._pool is not pool:
+                return  # another timeout already replaced it
+            self._pool = None
+            # shutdown() drops the executor's process table, so keep it here;
+            # ProcessPoolExecutor has no public way to stop a running child
+            self._retired.extend(pool._processes.values())
+        log.warning("replacing process pool after a hard timeout")
+        pool.shutdown(wait=False)
+
+    def close(self):
+        with self._lock:
+            pool, self._pool = self._pool, None
+            retired, self._retired = self._retired, []
+        if pool is not None:
+            pool.shutdown(wait=True, cancel_futures=True)
+        for proc in retired:
+            if proc.is_alive():
+                log.warning("terminating stuck process pool worker pid=%s", proc.pid)
+                proc.terminate()
+
+
+process_pool = ProcessPool()
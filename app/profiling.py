@@ -0,0 +1,74 @@
+import cProfile
+import io
+import itertools
+import pstats
+import threading
+import time
+
+from app.config import settings
+
+# phases in the order an execution passes through them
+PHASES = ("claimed", "dequeued", "body_start", "body_end", "persisted")
+
+
+class PhaseTimer:
+    """Monotonic timestamps for one execution's phases.
+
+    ``claimed`` is set when the scheduler dispatches the task; the other
+    phases are marked by whichever engine runs it. Stored on the execution as
+    milliseconds since ``claimed``, so gaps between phases read directly as
+    executor queueing, the start-row insert, the task body and the final write.
+    """
+
+    def __init__(self):
+        self._marks: dict[str, float] = {"claimed": time.perf_counter()}
+
+    def mark(self, phase: str):
+        self._marks[phase] = time.perf_counter()
+
+    def as_dict(self) -> dict[str, float]:
+        base = self._marks["claimed"]
+        return {p: round((self._marks[p] - base) * 1000, 3) for p in PHASES if p in self._marks}
+
+
+_sample_counter = itertools.count(1)
+_sample_lock = threading.Lock()
+
+
+def should_profile() -> bool:
+    """True for 1 in ``PROFILE_SAMPLE_EVERY`` executions on this process; never when 0."""
+    every = settings.profile_sample_every
+    if every <= 0:
+        return False
+    with _sample_lock:
+        return next(_sample_counter) % every == 0
+
+
+def format_stats(profiler: cProfile.Profile) -> str:
+    out = io.StringIO()
+    pstats.Stats(profiler, stream=out).sort_stats("cumulative").print_stats(settings.profile_top_functions)
+    return out.getvalue()
+
+
+class SampledProfile:
+    """cProfile around one task body when ``enabled``; a no-op otherwise.
+
+    cProfile only sees the thread it runs on, which is the worker thread for
+    thread-backend types and the pool child for process-backend ones. The
+    stats report is in ``report`` after the block, even if the body raised.
+    """
+
+    def __init__(self, enabled: bool):
+        self.report: str | None = None
+        self._profiler = cProfile.Profile() if enabled else None
+
+    def __enter__(self) -> "SampledProfile":
+        if self._profiler:
+            self._profiler.enable()
+        return self
+
+    def __exit__(self, *exc) -> bool:
+        if self._profiler:
+            self._profiler.disable()
+            self.report = format_stats(self._profiler)
+        return False
@@ -0,0 +1,110 @@
+import heapq
+import math
+from bisect import bisect_left
+from collections import defaultdict
+from datetime import datetime, timedelta
+from operator import itemgetter
+from typing import Any, Iterable, Iterator
+
+from app.cron import cron_cache
+
+# Forward projection of task schedules over [start, end).
+#
+# ``tasks`` are rows with id, name, type, schedule_type, interval_seconds,
+# cron_expression and next_run_at. A task overdue at ``start`` is projected at
+# ``start``, as the scheduler fires it on its next tick. Interval tasks are
+# projected every ``interval_seconds`` from there; the real schedule drifts by
+# each run's duration and any jitter, since it reschedules from finish time.
+
+
+def first_run(task: Any, start: datetime) -> datetime:
+    return max(task.next_run_at, start)
+
+
+def occurrences(task: Any, start: datetime, end: datetime) -> Iterator[datetime]:
+    """A task's projected run times in [start, end), in order, generated lazily."""
+    run_at = first_run(task, start)
+    if run_at >= end:
+        return
+    yield run_at
+    if task.schedule_type == "interval" and task.interval_seconds:
+        step = timedelta(seconds=task.interval_seconds)
+        run_at += step
+        while run_at < end:
+            yield run_at
+            run_at += step
+    elif task.schedule_type == "cron" and task.cron_expression:
+        it = cron_cache.iterator(task.cron_expression, run_at)
+        while (run_at := it.get_next(datetime)) < end:
+            yield run_at
+
+
+def merged_occurrences(tasks: Iterable[Any], start: datetime, end: datetime) -> Iterator[tuple[datetime, Any]]:
+    """Every task's occurrences as ``(run_at, task)`` in time order.
+
+    A lazy k-way heap merge: the heap holds one pending occurrence per task,
+    so taking the first N costs O(tasks + N log tasks) whatever the window.
+    Ties keep the order of ``tasks``.
+    """
+    return heapq.merge(*(_tagged(task, start, end) for task in tasks), key=itemgetter(0))
+
+
+def _tagged(task: Any, start: datetime, end: datetime) -> Iterator[tuple[datetime, Any]]:
+    for run_at in occurrences(task, start, end):
+        yield run_at, task
+
+
+def bucket_counts(tasks: Iterable[Any], start: datetime, end: datetime, bucket_seconds: int) -> dict[str, list[int]]:
+    """Projected runs per ``bucket_seconds`` slice of [start, end), by task type.
+
+    Counted without enumerating runs one by one. Interval tasks cost at most
+    one step per bucket. Cron slots are expanded once per distinct
+    expression, and each slot counts the tasks sharing the expression whose
+    first run precedes it.
+    """
+    window = (end - start).total_seconds()
+    n_buckets = math.ceil(window / bucket_seconds)
+    counts: dict[str, list[int]] = defaultdict(lambda: [0] * n_buckets)
+    # per cron expression and type, the sorted offsets of tasks' first runs
+    cron_starts: dict[str, dict[str, list[float]]] = defaultdict(lambda: defaultdict(list))
+
+    for task in tasks:
+        first = (first_run(task, start) - start).total_seconds()
+        if first >= window:
+            continue
+        hist = counts[task.type]
+        hist[int(first // bucket_seconds)] += 1
+        if task.schedule_type == "interval" and task.interval_seconds:
+            _count_interval(hist, first, task.interval_seconds, window, bucket_seconds)
+        elif task.schedule_type == "cron" and task.cron_expression:
+            cron_starts[task.cron_expression][task.type].append(first)
+
+    for expression, by_type in cron_starts.items():
+        earliest = min(min(firsts) for firsts in by_type.values())
+        for firsts in by_type.values():
+            firsts.sort()
+        it = cron_cache.iterator(expression, start + timedelta(seconds=earliest))
+        while (slot := (it.get_next(datetime) - start).total_seconds()) < window:
+            b = int(slot // bucket_seconds)
+            for task_type, firsts in by_type.items():
+                # tasks whose first run came strictly before this slot
+                counts[task_type][b] += bisect_left(firsts, slot)
+    return dict(counts)
+
+
+def _count_interval(hist: list[int], first: float, interval: float, window: float, bucket_seconds: int):
+    """Add runs at ``first + k * interval`` (k >= 1) below ``window`` to ``hist``."""
+    if interval >= bucket_seconds:
+        # at most one run per bucket: step through the runs
+        run = first + interval
+        while run < window:
+            hist[int(run // bucket_seconds)] += 1
+            run += interval
+        return
+
+    def runs_before(t: float) -> int:
+        # runs with k >= 1 strictly before offset t
+        return max(0, math.ceil((t - first) / interval) - 1)
+
+    for b in range(int(first // bucket_seconds), len(hist)):
+        hist[b] += runs_before(min((b + 1) * bucket_seconds, window)) - runs_before(b * bucket_seconds)
@@ -0,0 +1,93 @@
+import hashlib
+import logging
+import threading
+import time
+from dataclasses import dataclass
+
+from app.config import settings
+from app.events import TASKS_CHANNEL, Listener
+
+log = logging.getLogger("response_cache")
+
+
+@dataclass(frozen=True)
+class CachedResponse:
+    version: int
+    body: bytes
+    etag: str
+    stored_at: float
+
+
+class ResponseCache:
+    """Per-process cache of serialized task listings.
+
+    Entries are valid for the ``version`` they were built under. The version
+    is bumped by this process's API writes right after they commit, and by
+    every ``TASKS_CHANNEL`` notification, which triggers send for any
+    row change that alters what the listings show, from any replica. The
+    listener also bumps on every (re)connect, since notifications sent while
+    it was disconnected are lost; ``RESPONSE_CACHE_MAX_AGE_SECONDS`` bounds
+    staleness while it is down.
+
+    ETags hash the body, so they match across replicas serving the same data.
+    """
+
+    def __init__(self):
+        self._version = 0
+        self._entries: dict[str, CachedResponse] = {}
+        self._lock = threading.Lock()
+        self._listener: Listener | None = None
+
+    @property
+    def version(self) -> int:
+        return self._version
+
+    def bump(self, _payload: str | None = None):
+        with self._lock:
+            self._version += 1
+            self._entries.clear()
+
+    def get(self, key: str) -> CachedResponse | None:
+        entry = self._entries.get(key)
+        if entry is None or entry.version != self._version:
+            return None
+        if time.monotonic() - entry.stored_at > settings.response_cache_max_age_seconds:
+            return None
+        return entry
+
+    def put(self, key: str, version: int, body: bytes) -> CachedResponse:
+        """Store ``body`` built from data read at ``version``.
+
+        Read the version before querying: a change committed during the query
+        bumps it, so the entry is never served.
+        """
+        entry = CachedResponse(version, body, f'"{hashlib.sha1(body).hexdigest()}"', time.monotonic())
+        with self._lock:
+            if version == self._version:
+                self._entries[key] = entry
+        return entry
+
+    def start(self):
+        if self._listener is not None:
+            return
+        self._listener = Listener()
+        self._listener.subscribe(TASKS_CHANNEL, self.bump)
+        self._listener.start()
+
+    def stop(self):
+        if self._listener is not None:
+            self._listener.stop()
+            self._listener = None
+        self.bump()
+
+
+def etag_matches(if_none_match: str | None, etag: str) -> bool:
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    # weak comparison, as If-None-Match requires
+    return any(tag.strip().removeprefix("W/") == etag for tag in if_none_match.split(","))
+
+
+response_cache = ResponseCache()
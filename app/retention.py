@@ -0,0 +1,110 @@
+import logging
+import threading
+from datetime import datetime
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.db import SessionLocal
+
+log = logging.getLogger("retention")
+
+# One statement per batch: pick expired finished rows (per-task retention_days,
+# else the global default), delete them, and fold them into hourly rollups.
+# SKIP LOCKED lets several replicas run the job without waiting on each other.
+PURGE_SQL = text(
+    """
+    WITH doomed AS (
+        SELECT e.id FROM executions e
+        JOIN tasks t ON t.id = e.task_id
+        WHERE e.status <> 'running'
+          AND e.started_at < CAST(:now AS timestamp)
+              - make_interval(days => COALESCE(t.retention_days, CAST(:global_days AS integer)))
+        LIMIT :batch_size
+        FOR UPDATE OF e SKIP LOCKED
+    ), deleted AS (
+        DELETE FROM executions e USING doomed
+        WHERE e.id = doomed.id
+        RETURNING e.task_id, e.started_at, e.finished_at, e.status
+    ), rolled AS (
+        INSERT INTO execution_rollups AS r (
+            task_id, hour, count, success_count, failed_count, timeout_count,
+            duration_sum, duration_min, duration_max
+        )
+        SELECT
+            task_id,
+            date_trunc('hour', started_at),
+            count(*),
+            count(*) FILTER (WHERE status = 'success'),
+            count(*) FILTER (WHERE status = 'failed'),
+            count(*) FILTER (WHERE status = 'timeout'),
+            COALESCE(sum(EXTRACT(EPOCH FROM finished_at - started_at)), 0),
+            min(EXTRACT(EPOCH FROM finished_at - started_at)),
+            max(EXTRACT(EPOCH FROM finished_at - started_at))
+        FROM deleted
+        GROUP BY 1, 2
+        ON CONFLICT (task_id, hour) DO UPDATE SET
+            count = r.count + EXCLUDED.count,
+            success_count = r.success_count + EXCLUDED.success_count,
+            failed_count = r.failed_count + EXCLUDED.failed_count,
+            timeout_count = r.timeout_count + EXCLUDED.timeout_count,
+            duration_sum = r.duration_sum + EXCLUDED.duration_sum,
+            duration_min = LEAST(r.duration_min, EXCLUDED.duration_min),
+            duration_max = GREATEST(r.duration_max, EXCLUDED.duration_max)
+        RETURNING 1
+    )
+    SELECT count(*) FROM deleted
+    """
+)
+
+
+def purge_batch(db: Session, now: datetime) -> int:
+    """Roll up and delete one batch of expired executions; returns rows removed."""
+    removed = db.execute(
+        PURGE_SQL,
+        {"now": now, "global_days": settings.execution_retention_days, "batch_size": settings.retention_batch_size},
+    ).scalar_one()
+    db.commit()
+    return removed
+
+
+class RetentionJob:
+    """Background thread that applies execution retention in bounded batches."""
+
+    def __init__(self):
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="retention", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=5)
+        self._thread = None
+
+    def run_once(self) -> int:
+        now = datetime.utcnow()
+        total = 0
+        with SessionLocal() as db:
+            while not self._stop.is_set():
+                removed = purge_batch(db, now)
+                total += removed
+                if removed < settings.retention_batch_size:
+                    break
+        if total:
+            log.info("retention removed=%d", total)
+        return total
+
+    def _run(self):
+        while not self._stop.wait(settings.retention_interval_seconds):
+            try:
+                self.run_once()
+            except Exception:
+                log.exception("Retention error")
@@ -0,0 +1,89 @@
+import random
+import zlib
+from datetime import datetime, timedelta
+
+from app.config import settings
+from app.cron import cron_cache
+
+
+def spread_offset(name: str, interval_seconds: int) -> timedelta:
+    """Stable offset in [0, interval) derived from the task name.
+
+    Tasks created together with the same interval land on different phases of
+    the interval window instead of all firing in the same tick.
+    """
+    millis = zlib.crc32(name.encode()) % (interval_seconds * 1000)
+    return timedelta(milliseconds=millis)
+
+
+def initial_interval_run(name: str, interval_seconds: int, jitter_seconds: int | None, now: datetime) -> datetime:
+    """First run of a new interval task: the hash spread, if enabled, plus up to ``jitter`` seconds."""
+    first = now + spread_offset(name, interval_seconds) if settings.schedule_spread == "hash" else now
+    jitter = jitter_for(jitter_seconds)
+    return first + timedelta(seconds=random.uniform(0, jitter)) if jitter else first
+
+
+def jitter_for(jitter_seconds: int | None) -> float:
+    """Upper bound of the random delay added to each interval reschedule."""
+    return settings.schedule_jitter_seconds if jitter_seconds is None else jitter_seconds
+
+
+def next_interval_run(interval_seconds: int, jitter_seconds: int | None, now: datetime) -> datetime:
+    """Next run of an interval task, ``interval`` plus up to ``jitter`` seconds from ``now``."""
+    jitter = jitter_for(jitter_seconds)
+    return now + timedelta(seconds=interval_seconds + (random.uniform(0, jitter) if jitter else 0))
+
+
+def misfire_policy_for(policy: str | None) -> str:
+    return policy or settings.default_misfire_policy
+
+
+def resolve_misfire(
+    policy: str,
+    limit: int | None,
+    schedule_type: str,
+    interval_seconds: int | None,
+    cron_expression: str | None,
+    due_at: datetime,
+    now: datetime,
+) -> tuple[bool, datetime | None]:
+    """Apply a ``skip`` or ``catch_up`` misfire policy to a claimed run.
+
+    Returns whether to fire now and the task's new ``next_run_at``.
+    ``skip`` drops every missed run and waits for the next regular slot.
+    ``catch_up`` keeps the task on its slot grid (``due_at`` plus whole
+    intervals, or the cron slots): it fires the most recent ``limit`` missed
+    slots back to back, one per claim since runs never overlap, then resumes.
+    """
+    n = max(limit or 1, 1)
+    if schedule_type == "interval":
+        interval = timedelta(seconds=interval_seconds)
+        missed = int((now - due_at) / interval) + 1
+        if policy == "skip":
+            return False, due_at + missed * interval
+        return True, due_at + (max(0, missed - n) + 1) * interval
+    upcoming = cron_cache.next_fire_time(cron_expression, now)
+    if policy == "skip":
+        return False, upcoming
+    # the last n slots at or after due_at, newest first
+    slots, it = [], cron_cache.iterator(cron_expression, now)
+    while len(slots) < n:
+        slot = it.get_prev(datetime)
+        if slot < due_at:
+            break
+        slots.append(slot)
+    # this run takes the oldest; the next one is due right after it
+    return True, slots[-2] if len(slots) > 1 else upcoming
+
+
+def next_run_after_finish(task, now: datetime) -> datetime | None:
+    """New ``next_run_at`` for an interval task whose run just finished.
+
+    None means keep the value set at claim time: the task isn't an interval
+    task, or it uses ``catch_up`` and stays on the slot grid set by the claim.
+    """
+    if task.schedule_type != "interval" or not task.interval_seconds:
+        return None
+    if misfire_policy_for(task.misfire_policy) == "catch_up":
+        return None
+    return next_interval_run(task.interval_seconds, task.jitter_seconds, now)
@@ -1,34 +1,160 @@
+import heapq
+from collections import Counter, defaultdict
 import threading
 import time
 from datetime import datetime, timedelta
 from concurrent.futures import ThreadPoolExecutor
-from sqlalchemy import select, update, and_, text
+from typing import Callable
+from sqlalchemy import func, insert, select, update, and_, text
 from sqlalchemy.orm import Session
 import logging
-from croniter import croniter
 
+from app.async_runner import AsyncRunner
+from app.counters import counter_accumulator
+from app.cron import cron_cache
 from app.db import SessionLocal
-from app.models import Task
-from app.tasks import execute_task
+from app.events import (
+    SCHEDULE_CHANNEL, WORK_CHANNEL, Listener, notify, notify_schedule_change, notify_schedule_changes, to_naive_utc,
+)
+from app.http_pool import http_pool
+from app.leader import LeaderElector
+from app.leases import QUEUED, REPLICA_ID, LeaseKeeper, release_task
+from app.metrics import ACTIVE_WORKERS, QUEUE_DEPTH, TICK_DUE, TICK_DURATION, observe_dispatch_lag, observe_execution
+from app.models import Execution, QueuedTask, Task, TaskType
+from app.process_pool import process_pool
+from app.retention import RetentionJob
+from app.schedule import misfire_policy_for, next_run_after_finish, resolve_misfire
+from app.task_types import TASK_TYPES, backend_for
+from app.tasks import execute_task, run_task
+from app.timeouts import RunContext, TaskTimeout, TimeoutWatchdog
+from app.writer import UNCHANGED, ExecutionWriter
 from app.config import settings
 
+
+class DeadlineHeap:
+    """Thread-safe min-heap of upcoming ``next_run_at`` values (naive UTC).
+
+    Entries are only hints: a stale one (task deleted, rescheduled, or fired by
+    another replica) costs one empty tick, never a missed run.
+    """
+
+    def __init__(self):
+        self._heap: list[datetime] = []
+        self._lock = threading.Lock()
+
+    def push(self, when: datetime) -> bool:
+        """Add a deadline; returns True if it is now the earliest one."""
+        with self._lock:
+            heapq.heappush(self._heap, when)
+            return self._heap[0] == when
+
+    def merge(self, deadlines: list[datetime]) -> None:
+        with self._lock:
+            self._heap = sorted(set(self._heap).union(deadlines))
+
+    def peek(self) -> datetime | None:
+        with self._lock:
+            return self._heap[0] if self._heap else None
+
+    def pop_due(self, now: datetime) -> int:
+        popped = 0
+        with self._lock:
+            while self._heap and self._heap[0] <= now:
+                heapq.heappop(self._heap)
+                popped += 1
+        return popped
+
+    def __len__(self) -> int:
+        return len(self._heap)
+
+
 class Scheduler:
     def __init__(self):
         self._stop = threading.Event()
+        self._wake = threading.Event()
         self._executor: ThreadPoolExecutor | None = None
+        # one thread per process-pool worker waits on its child's result
+        self._process_executor: ThreadPoolExecutor | None = None
         self._thread: threading.Thread | None = None
+        self._listener: Listener | None = None
+        self._async_runner: AsyncRunner | None = None
+        self._writer: ExecutionWriter | None = None
+        # claimed-but-unfinished executions per task type on this replica
+        self._inflight: Counter[str] = Counter()
+        # a Condition so stop() can wait for the thread engine to drain
+        self._inflight_lock = threading.Condition()
+        self._watchdog = TimeoutWatchdog(on_abandon=self._abandon)
+        # set when an abandoned task may still hold a pool thread
+        self._pool_tainted = False
+        # set when the last tick left due work behind for lack of free slots
+        self._saturated = False
+        self._retention = RetentionJob()
+        self._leases = LeaseKeeper()
+        self._deadlines = DeadlineHeap()
+        # set when the heap may be missing deadlines and must be reloaded from the DB
+        self._resync_requested = True
+        self._last_resync = 0.0
+        # next_run_at of the last row loaded by a truncated resync, if any
+        self._horizon: datetime | None = None
+        # token bucket limiting dispatches for scheduler_rampup_seconds after start
+        self._rampup_until = 0.0
+        self._rampup_tokens = 0.0
+        self._rampup_at = 0.0
+        # leader mode: dispatcher election, and next_run_at values of tasks that
+        # finished here, waiting to be forwarded to the leader
+        self._elector = LeaderElector()
+        self._outbox: list[datetime] = []
+        self._outbox_lock = threading.Lock()
         self._log = logging.getLogger("scheduler")
 
+    @property
+    def _event_driven(self) -> bool:
+        return settings.scheduler_wakeup_mode == "notify"
+
+    @property
+    def _leader_mode(self) -> bool:
+        return settings.scheduler_mode == "leader"
+
+    @property
+    def _follower(self) -> bool:
+        return self._leader_mode and not self._elector.is_leader
+
     def start(self):
         # If already running, do nothing
         if self._thread and self._thread.is_alive():
             self._log.info("Scheduler already running")
             return
-        self._log.info("Scheduler starting")
+        self._log.info(
+            "Scheduler starting wakeup_mode=%s mode=%s", settings.scheduler_wakeup_mode, settings.scheduler_mode
+        )
         self._stop.clear()
+        self._resync_requested = True
+        self._rampup_at = time.monotonic()
+        self._rampup_until = self._rampup_at + settings.scheduler_rampup_seconds
+        self._rampup_tokens = 0.0
         # Recreate executor if needed (it may have been shut down)
         if self._executor is None:
             self._executor = ThreadPoolExecutor(max_workers=settings.max_worker_threads)
+        if self._process_executor is None:
+            self._process_executor = ThreadPoolExecutor(max_workers=settings.process_pool_workers)
+        self._watchdog.start()
+        if settings.execution_write_behind and self._writer is None:
+            self._writer = ExecutionWriter(on_released=self._task_released)
+            self._writer.start()
+        uses_async = any(backend_for(t) == "async" for t in TASK_TYPES)
+        if uses_async and self._async_runner is None:
+            self._async_runner = AsyncRunner(on_finished=self._task_released, writer=self._writer)
+            self._async_runner.start()
+        if self._event_driven:
+            self._listener = Listener()
+            self._listener.subscribe(SCHEDULE_CHANNEL, self._on_schedule_notify)
+            if self._leader_mode:
+                self._listener.subscribe(WORK_CHANNEL, lambda _: self._wake.set())
+            self._listener.start()
+        self._retention.start()
+        self._leases.start()
+        if settings.counter_flush_interval_seconds > 0:
+            counter_accumulator.start()
         # Always create a fresh thread on start
         self._thread = threading.Thread(target=self._run, daemon=True)
         self._thread.start()
@@ -36,88 +162,571 @@ class Scheduler:
     def stop(self):
         self._log.info("Scheduler stopping")
         self._stop.set()
+        self._wake.set()
+        if self._listener:
+            self._listener.stop()
+            self._listener = None
+        self._retention.stop()
         if self._thread:
             self._thread.join(timeout=5)
+        self._elector.release()
         if self._executor:
-            self._executor.shutdown(wait=True)
+            # wait for thread-engine runs to finish or be abandoned; an abandoned
+            # thread may never return, so the pool itself isn't joined
+            with self._inflight_lock:
+                self._inflight_lock.wait_for(
+                    lambda: not any(n for t, n in self._inflight.items() if self._engine_for(t) != "async")
+                )
+            self._executor.shutdown(wait=not self._pool_tainted)
             self._executor = None
+            self._pool_tainted = False
+        if self._process_executor:
+            self._process_executor.shutdown(wait=True)
+            self._process_executor = None
+        process_pool.close()
+        self._watchdog.stop()
+        if self._async_runner:
+            self._async_runner.stop()
+            self._async_runner = None
+        # every run here has finished, so there is nothing left to heartbeat
+        self._leases.stop()
+        # after the engines: their last increments and finish events must still be flushed
+        counter_accumulator.stop()
+        if self._writer:
+            self._writer.stop()
+            self._writer = None
+        # drop keep-alive connections once no task can use them
+        http_pool.close()
         self._thread = None
         # Clear the stop flag so a future start() can proceed
         self._stop.clear()
 
+    def schedule_at(self, when: datetime | None):
+        """Make sure the loop wakes up no later than ``when``."""
+        when = to_naive_utc(when)
+        if when is not None and self._deadlines.push(when):
+            self._wake.set()
+
+    def _task_released(self, next_run_at: datetime | None):
+        """A task finished on this replica and is next due at ``next_run_at``."""
+        if not self._follower:
+            self.schedule_at(next_run_at)
+        elif next_run_at is not None:
+            # only the leader claims; it learns the deadline through NOTIFY
+            with self._outbox_lock:
+                self._outbox.append(next_run_at)
+            self._wake.set()
+
+    def _wake_now(self):
+        """Run the loop again right away."""
+        if not self._leader_mode:
+            self._deadlines.push(datetime.utcnow())
+        self._wake.set()
+
+    def _on_schedule_notify(self, payload: str | None):
+        if self._follower:
+            # includes the deadlines followers forward; a new leader resyncs anyway
+            return
+        if payload:
+            self.schedule_at(datetime.fromisoformat(payload))
+        else:
+            self._resync_requested = True
+            self._wake.set()
+
     def _run(self):
         while not self._stop.is_set():
+            # cleared before the step, so a wakeup that arrives during it is still seen by _wait
+            self._wake.clear()
             try:
-                self._tick()
+                claimed = self._leader_step() if self._leader_mode else self._due_step(self._tick)
             except Exception:
                 # avoid tight loop on unexpected errors
                 self._log.exception("Tick error")
-                time.sleep(settings.scheduler_poll_interval_seconds)
-            time.sleep(settings.scheduler_poll_interval_seconds)
+                self._resync_requested = True
+                self._stop.wait(settings.scheduler_poll_interval_seconds)
+                continue
+            # a full batch means more work is probably due; claim again right away
+            if claimed >= settings.scheduler_claim_batch_size:
+                if not self._leader_mode:
+                    self._deadlines.push(datetime.utcnow())
+                continue
+            self._wait()
+
+    def _due_step(self, tick: Callable[[], int]) -> int:
+        """Run ``tick`` if tasks may be due: every loop when polling, else when a deadline passed."""
+        if not self._event_driven:
+            return tick()
+        if self._needs_resync():
+            self._resync()
+        # pop before claiming: a deadline pushed after this point stays queued
+        if self._deadlines.pop_due(datetime.utcnow()):
+            return tick()
+        return 0
+
+    def _leader_step(self) -> int:
+        """Leader mode: the elected replica claims due tasks into task_queue and
+        every replica, the leader included, runs work from the queue."""
+        was_leader = self._elector.is_leader
+        enqueued = 0
+        if self._elector.poll():
+            if not was_leader:
+                self._resync_requested = True
+            enqueued = self._due_step(self._enqueue_due)
+            if enqueued >= settings.scheduler_claim_batch_size:
+                self._deadlines.push(datetime.utcnow())
+        else:
+            self._deadlines.pop_due(datetime.utcnow())
+            self._forward_released()
+        return max(enqueued, self._tick(self._dequeue))
+
+    def _forward_released(self):
+        with self._outbox_lock:
+            deadlines, self._outbox = self._outbox, []
+        if deadlines:
+            with SessionLocal() as db:
+                notify_schedule_changes(db, sorted(set(deadlines)))
+                db.commit()
 
-    def _tick(self):
+    def _wait(self):
+        if self._follower:
+            # only local wakeups (ramp-up) are in the heap; work arrives by NOTIFY
+            timeout = settings.leader_retry_seconds
+            if not self._event_driven:
+                timeout = min(timeout, settings.scheduler_poll_interval_seconds)
+            deadline = self._deadlines.peek()
+            if deadline is not None:
+                timeout = min(timeout, (deadline - datetime.utcnow()).total_seconds())
+            if timeout > 0:
+                self._wake.wait(timeout)
+            return
+        if not self._event_driven:
+            self._wake.wait(settings.scheduler_poll_interval_seconds)
+            return
+        timeout = settings.scheduler_resync_interval_seconds - (time.monotonic() - self._last_resync)
         now = datetime.utcnow()
+        for deadline in (self._deadlines.peek(), self._horizon):
+            if deadline is not None:
+                timeout = min(timeout, (deadline - now).total_seconds())
+        if self._leader_mode:
+            # keep confirming leadership
+            timeout = min(timeout, settings.leader_retry_seconds)
+        if timeout > 0:
+            self._wake.wait(timeout)
+
+    def _needs_resync(self) -> bool:
+        if self._resync_requested:
+            return True
+        if time.monotonic() - self._last_resync >= settings.scheduler_resync_interval_seconds:
+            return True
+        return self._horizon is not None and self._horizon <= datetime.utcnow()
+
+    def _resync(self):
+        """Reload the earliest pending deadlines; catches changes made by other replicas."""
+        self._resync_requested = False
+        limit = settings.scheduler_deadline_cache_size
         with SessionLocal() as db:
-            # lock due tasks, avoid overlap by checking running flag and setting it under lock
-            due_tasks = db.execute(
+            deadlines = db.execute(
                 text(
                     """
-                    SELECT * FROM tasks
-                    WHERE (next_run_at IS NOT NULL AND next_run_at <= :now)
-                      AND running = FALSE
-                    FOR UPDATE SKIP LOCKED
+                    SELECT next_run_at FROM tasks
+                    WHERE next_run_at IS NOT NULL AND running = FALSE
+                    ORDER BY next_run_at
+                    LIMIT :limit
                     """
-                ), {"now": now}
-            ).mappings().all()
-            self._log.debug("tick at=%s due_count=%d", now.isoformat(), len(due_tasks))
+                ),
+                {"limit": limit},
+            ).scalars().all()
+        self._deadlines.merge(deadlines)
+        self._horizon = deadlines[-1] if len(deadlines) >= limit else None
+        self._last_resync = time.monotonic()
+        self._log.debug("resync deadlines=%d horizon=%s", len(deadlines), self._horizon)
 
-            for row in due_tasks:
-                task = db.get(Task, row["id"])
-                if not task:
-                    continue
-                task.running = True
-                # compute next_run_at before releasing
-                if task.schedule_type == "interval" and task.interval_seconds:
-                    current_utc = datetime.utcnow()
-                    task.next_run_at = current_utc + timedelta(seconds=task.interval_seconds)
-                elif task.schedule_type == "cron" and task.cron_expression:
-                    try:
-                        itr = croniter(task.cron_expression, now)
-                        task.next_run_at = itr.get_next(datetime)
-                    except Exception:
-                        # invalid cron at runtime -> disable further runs
-                        self._log.error("Invalid cron for task %s; disabling future runs", task.id)
-                        task.next_run_at = None
+    def _capacity(self) -> list[tuple[dict[str, int], int]]:
+        """Free slots per execution engine: ({task_type: cap}, engine limit).
+
+        A type's cap is the smaller of its engine's free slots and its own
+        TASK_TYPE_CONCURRENCY headroom, so a replica never claims work it
+        cannot start right away and leaves it to replicas that can.
+        """
+        groups: dict[str, dict[str, int]] = {}
+        with self._inflight_lock:
+            free = {
+                "thread": settings.max_worker_threads - sum(
+                    n for t, n in self._inflight.items() if self._engine_for(t) == "thread"
+                ),
+                "process": settings.process_pool_workers - sum(
+                    n for t, n in self._inflight.items() if self._engine_for(t) == "process"
+                ),
+                "async": settings.async_max_concurrency - sum(
+                    n for t, n in self._inflight.items() if self._engine_for(t) == "async"
+                ),
+            }
+            for task_type in TaskType:
+                engine = self._engine_for(task_type.value)
+                cap = free[engine]
+                type_limit = settings.task_type_concurrency.get(task_type.value)
+                if type_limit is not None:
+                    cap = min(cap, type_limit - self._inflight[task_type.value])
+                if cap > 0:
+                    groups.setdefault(engine, {})[task_type.value] = cap
+        batch = settings.scheduler_claim_batch_size
+        return [(caps, min(free[engine], batch)) for engine, caps in groups.items()]
+
+    def _rampup_budget(self) -> int | None:
+        """Dispatches allowed right now while ramping up after start; None once unlimited."""
+        now = time.monotonic()
+        if now >= self._rampup_until:
+            return None
+        rate = settings.scheduler_rampup_rate
+        # at most one second's worth of burst
+        self._rampup_tokens = min(rate, self._rampup_tokens + (now - self._rampup_at) * rate)
+        self._rampup_at = now
+        return int(self._rampup_tokens)
+
+    def _engine_for(self, task_type: str) -> str:
+        return backend_for(task_type)
+
+    def _release_slot(self, task_id: int, task_type: str):
+        self._leases.untrack(task_id)
+        with self._inflight_lock:
+            self._inflight[task_type] -= 1
+            ACTIVE_WORKERS.labels(task_type).set(self._inflight[task_type])
+            self._inflight_lock.notify_all()
+        if self._saturated:
+            # due work may have been left unclaimed for lack of capacity
+            self._saturated = False
+            self._wake_now()
+
+    def _tick(self, claim: Callable[..., list[dict]] | None = None) -> int:
+        """Claim due work up to this replica's free capacity and dispatch it.
+
+        ``claim`` defaults to claiming due tasks directly; leader mode passes
+        ``_dequeue`` to take work from task_queue instead.
+        """
+        claim = claim or self._claim_due
+        started = time.perf_counter()
+        now = datetime.utcnow()
+        claimed = []
+        capacity = self._capacity()
+        # saturated when some type (or a whole engine) has no free slot at all
+        saturated = sum(len(caps) for caps, _ in capacity) < len(TaskType)
+        # set when a claim stopped at a cap or the limit, so due work may remain
+        left_behind = False
+        budget = self._rampup_budget()
+        with SessionLocal() as db:
+            for caps, limit in capacity:
+                if budget is not None:
+                    limit = min(limit, budget - len(claimed))
+                    if limit <= 0:
+                        break
+                rows = claim(db, now, limit, caps)
+                claimed += rows
+                by_type = Counter(r["type"] for r in rows)
+                full = len(rows) >= limit or any(by_type[t] >= cap for t, cap in caps.items())
+                saturated |= full
+                left_behind |= full and bool(rows)
+            if left_behind and self._event_driven:
+                # peers that ticked while this claim held its row locks skipped the rows;
+                # wake the idle ones now instead of at their next resync
+                if self._leader_mode:
+                    notify(db, WORK_CHANNEL)
                 else:
-                    task.next_run_at = None
-                db.add(task)
-                db.commit()
+                    notify_schedule_change(db, now)
+            db.commit()
+        self._saturated = saturated
+        if budget is not None:
+            self._rampup_tokens -= len(claimed)
+            if len(claimed) >= budget:
+                # ramp-up held work back; come back when the next token is available
+                self.schedule_at(now + timedelta(seconds=1 / settings.scheduler_rampup_rate))
+        self._log.debug("tick at=%s claimed=%d", now.isoformat(), len(claimed))
+        observe_dispatch_lag(claimed, now)
+        if self._pool_tainted:
+            # abandoned tasks still occupy threads in the old pool; give new work
+            # a fresh pool so their slots are really free. Idle old threads exit.
+            self._pool_tainted = False
+            old, self._executor = self._executor, ThreadPoolExecutor(max_workers=settings.max_worker_threads)
+            old.shutdown(wait=False)
+        for row in claimed:
+            self._log.info(
+                "dispatch task_id=%s type=%s schedule=%s next_run_at=%s",
+                row["id"],
+                row["type"],
+                row["schedule_type"],
+                row["next_run_at"].isoformat() if row["next_run_at"] else None,
+            )
+            if not self._leader_mode:
+                # in leader mode the leader tracks deadlines when it enqueues
+                self.schedule_at(row["next_run_at"])
+            with self._inflight_lock:
+                self._inflight[row["type"]] += 1
+                ACTIVE_WORKERS.labels(row["type"]).set(self._inflight[row["type"]])
+            self._leases.track(row["id"])
+            if self._engine_for(row["type"]) == "async":
+                fut = self._async_runner.submit(row["id"])
+                fut.add_done_callback(lambda _, row=row: self._release_slot(row["id"], row["type"]))
+            else:
+                ctx = RunContext(row["id"], row["type"])
+                executor = self._process_executor if self._engine_for(row["type"]) == "process" else self._executor
+                fut = executor.submit(self._run_task_safe, ctx)
+                # an abandoned run's slot was already released by _abandon
+                fut.add_done_callback(lambda _, ctx=ctx: ctx.abandoned or self._release_slot(ctx.task_id, ctx.task_type))
+        TICK_DUE.observe(len(claimed))
+        TICK_DURATION.observe(time.perf_counter() - started)
+        QUEUE_DEPTH.labels("deadlines").set(len(self._deadlines))
+        if self._writer:
+            QUEUE_DEPTH.labels("write_behind").set(self._writer.pending)
+        return len(claimed)
+
+    def _claim_due(
+        self,
+        db: Session,
+        now: datetime,
+        limit: int,
+        caps: dict[str, int],
+        claimed_by: str = REPLICA_ID,
+        lease_seconds: float | None = None,
+    ) -> list[dict]:
+        """Mark up to ``limit`` due tasks as running in one statement.
+
+        Each task type's candidates are picked separately, at most
+        ``caps[type]`` of them in priority order, so a backlog of a capped type
+        can't crowd the others out; the batch then keeps the best ``limit``. Interval and once schedules are advanced
+        in SQL; cron rows, and overdue rows whose misfire policy is ``skip`` or
+        ``catch_up``, get theirs in the follow-up batch update below, which
+        also releases skipped rows (they are not returned). Both run in the
+        caller's transaction, so the row locks are held until its commit.
+        """
+        rows = [
+            dict(r)
+            for r in db.execute(
+                text(
+                    """
+                    WITH candidates AS (
+                        SELECT c.id, c.priority, c.next_run_at
+                        FROM unnest(CAST(:types AS varchar[]), CAST(:caps AS integer[])) AS cap(type, cap)
+                        CROSS JOIN LATERAL (
+                            SELECT id, priority, next_run_at FROM tasks
+                            WHERE type = cap.type AND running = FALSE
+                              AND next_run_at IS NOT NULL AND next_run_at <= :now
+                            ORDER BY priority DESC, next_run_at
+                            LIMIT LEAST(cap.cap, :limit)
+                            FOR UPDATE SKIP LOCKED
+                        ) AS c
+                    ), due AS (
+                        SELECT id, next_run_at FROM candidates
+                        ORDER BY priority DESC, next_run_at
+                        LIMIT :limit
+                    )
+                    UPDATE tasks AS t
+                    SET running = TRUE,
+                        claimed_by = :replica,
+                        lease_expires_at = CAST(:now AS timestamp) + make_interval(secs => :lease),
+                        next_run_at = CASE
+                            WHEN t.schedule_type = 'interval' AND t.interval_seconds > 0
+                                THEN CAST(:now AS timestamp) + make_interval(
+                                    secs => t.interval_seconds + random() * COALESCE(t.jitter_seconds, :jitter)
+                                )
+                            WHEN t.schedule_type = 'cron' AND t.cron_expression IS NOT NULL
+                                THEN t.next_run_at
+                            ELSE NULL
+                        END
+                    FROM due
+                    WHERE t.id = due.id
+                    RETURNING t.id, t.type, t.priority, t.schedule_type, t.interval_seconds, t.cron_expression,
+                              t.misfire_policy, t.misfire_limit, t.next_run_at, due.next_run_at AS due_at
+                    """
+                ),
+                {
+                    "now": now,
+                    "limit": limit,
+                    "types": list(caps),
+                    "caps": list(caps.values()),
+                    "jitter": settings.schedule_jitter_seconds,
+                    "replica": claimed_by,
+                    "lease": lease_seconds or settings.lease_seconds,
+                },
+            ).mappings()
+        ]
+
+        # cron schedules and misfire policies are resolved here and written back in one batch
+        fixups, skipped = [], []
+        grace = timedelta(seconds=settings.misfire_grace_seconds)
+        by_expression = defaultdict(list)
+        for row in rows:
+            if row["schedule_type"] == "cron" and row["cron_expression"]:
+                by_expression[row["cron_expression"]].append(row)
+        invalid_cron = set()
+        for expression, group in by_expression.items():
+            try:
+                next_runs = cron_cache.next_fire_times(expression, [now] * len(group))
+            except Exception:
+                # invalid cron at runtime -> disable further runs
+                self._log.error("Invalid cron for tasks %s; disabling future runs", [r["id"] for r in group])
+                invalid_cron.add(expression)
+                next_runs = [None] * len(group)
+            for row, next_run in zip(group, next_runs):
+                row["next_run_at"] = next_run
+        for row in rows:
+            if row["schedule_type"] == "cron" and row["cron_expression"]:
+                fixups.append(row)
+                if row["cron_expression"] in invalid_cron:
+                    continue
+            elif row["schedule_type"] != "interval" or row["next_run_at"] is None:
+                continue
+            policy = misfire_policy_for(row["misfire_policy"])
+            # catch_up keeps the task on its slot grid, so it applies even to runs that are barely late
+            if policy == "coalesce" or (policy == "skip" and now - row["due_at"] <= grace):
+                continue
+            fire, row["next_run_at"] = resolve_misfire(
+                policy, row["misfire_limit"], row["schedule_type"], row["interval_seconds"],
+                row["cron_expression"], row["due_at"], now,
+            )
+            if row["schedule_type"] == "interval":
+                fixups.append(row)
+            if not fire:
+                skipped.append(row)
                 self._log.info(
-                    "dispatch task_id=%s type=%s schedule=%s next_run_at=%s",
-                    task.id,
-                    task.type,
-                    task.schedule_type,
-                    task.next_run_at.isoformat() if task.next_run_at else None,
+                    "misfire skip task_id=%s due_at=%s next_run_at=%s", row["id"], row["due_at"], row["next_run_at"]
+                )
+        if fixups:
+            skipped_ids = {r["id"] for r in skipped}
+            db.execute(
+                text(
+                    """
+                    UPDATE tasks AS t
+                    SET next_run_at = v.next_run_at, running = v.running,
+                        claimed_by = CASE WHEN v.running THEN t.claimed_by END,
+                        lease_expires_at = CASE WHEN v.running THEN t.lease_expires_at END
+                    FROM unnest(
+                        CAST(:ids AS integer[]), CAST(:next_runs AS timestamp[]), CAST(:running AS boolean[])
+                    ) AS v(id, next_run_at, running)
+                    WHERE t.id = v.id
+                    """
+                ),
+                {
+                    "ids": [r["id"] for r in fixups],
+                    "next_runs": [r["next_run_at"] for r in fixups],
+                    "running": [r["id"] not in skipped_ids for r in fixups],
+                },
+            )
+        for row in skipped:
+            rows.remove(row)
+            self.schedule_at(row["next_run_at"])
+        if skipped:
+            # skipped rows took claim slots; look for more due work right away
+            self._deadlines.push(now)
+        return rows
+
+    def _enqueue_due(self) -> int:
+        """Leader mode: claim due tasks into task_queue for any replica to run."""
+        now = datetime.utcnow()
+        with SessionLocal() as db:
+            depth = db.execute(select(func.count()).select_from(QueuedTask)).scalar_one()
+            room = min(settings.dispatch_queue_max_depth - depth, settings.scheduler_claim_batch_size)
+            if room <= 0:
+                # consumers are behind; look again shortly instead of piling up claims
+                self.schedule_at(now + timedelta(seconds=settings.scheduler_poll_interval_seconds))
+                return 0
+            rows = self._claim_due(
+                db, now, room, {t.value: room for t in TaskType},
+                claimed_by=QUEUED, lease_seconds=settings.dispatch_queue_lease_seconds,
+            )
+            if rows:
+                db.execute(
+                    insert(QueuedTask),
+                    [{"task_id": r["id"], "type": r["type"], "priority": r["priority"], "enqueued_at": now} for r in rows],
                 )
-                self._executor.submit(self._run_task_safe, task.id)
+                notify(db, WORK_CHANNEL)
+            db.commit()
+        observe_dispatch_lag(rows, now)
+        QUEUE_DEPTH.labels("dispatch").set(depth + len(rows))
+        for row in rows:
+            self.schedule_at(row["next_run_at"])
+        self._log.debug("enqueue at=%s queued=%d depth=%d", now.isoformat(), len(rows), depth + len(rows))
+        return len(rows)
 
-    def _run_task_safe(self, task_id: int):
+    def _dequeue(self, db: Session, now: datetime, limit: int, caps: dict[str, int]) -> list[dict]:
+        """Leader mode: take up to ``limit`` queued tasks, at most ``caps[type]`` per type.
+
+        As in ``_claim_due``, each type's rows are picked separately so a
+        queued backlog of one type can't hold back the others.
+
+        Queue rows are deleted and the tasks' leases handed to this replica in
+        one statement. Rows whose task was swept or re-claimed meanwhile are
+        just dropped.
+        """
+        return [
+            dict(r)
+            for r in db.execute(
+                text(
+                    """
+                    WITH candidates AS (
+                        SELECT c.id, c.priority
+                        FROM unnest(CAST(:types AS varchar[]), CAST(:caps AS integer[])) AS cap(type, cap)
+                        CROSS JOIN LATERAL (
+                            SELECT id, priority FROM task_queue
+                            WHERE type = cap.type
+                            ORDER BY priority DESC, id
+                            LIMIT LEAST(cap.cap, :limit)
+                            FOR UPDATE SKIP LOCKED
+                        ) AS c
+                    ), picked AS (
+                        SELECT id FROM candidates
+                        ORDER BY priority DESC, id
+                        LIMIT :limit
+                    ), taken AS (
+                        DELETE FROM task_queue AS q USING picked
+                        WHERE q.id = picked.id
+                        RETURNING q.task_id
+                    )
+                    UPDATE tasks AS t
+                    SET claimed_by = :replica,
+                        lease_expires_at = CAST(:now AS timestamp) + make_interval(secs => :lease)
+                    FROM taken
+                    WHERE t.id = taken.task_id AND t.running = TRUE AND t.claimed_by = :queued
+                    RETURNING t.id, t.type, t.schedule_type, t.next_run_at
+                    """
+                ),
+                {
+                    "now": now,
+                    "limit": limit,
+                    "types": list(caps),
+                    "caps": list(caps.values()),
+                    "replica": REPLICA_ID,
+                    "queued": QUEUED,
+                    "lease": settings.lease_seconds,
+                },
+            ).mappings()
+        ]
+
+    def _run_task_safe(self, ctx: RunContext):
+        ctx.phases.mark("dequeued")
+        if self._writer:
+            return self._run_task_buffered(ctx)
         with SessionLocal() as db:
-            task = db.get(Task, task_id)
+            task = db.get(Task, ctx.task_id)
             if not task:
                 return
+            timeout = task.timeout_seconds or settings.default_task_timeout_seconds
+            self._watchdog.watch(ctx, timeout)
+            exec_rec = None
             try:
                 start = time.perf_counter()
                 self._log.info("start task_id=%s type=%s", task.id, task.type)
-                exec_rec = execute_task(db, task)
-                # soft timeout marking: if duration exceeded configured timeout, mark as timeout
-                timeout = task.timeout_seconds or settings.default_task_timeout_seconds
+                exec_rec = execute_task(db, task, ctx)
+                if exec_rec is None:
+                    # abandoned: the watchdog has recorded the timeout and released the task
+                    self._log.warning("abandoned task_id=%s returned after %.3fs", task.id, time.perf_counter() - start)
+                    return
+                # soft timeout marking: a run that overran but finished within the grace period
                 duration = (exec_rec.finished_at - exec_rec.started_at).total_seconds() if exec_rec.finished_at else (time.perf_counter() - start)
                 if duration > timeout and exec_rec.status == "success":
                     exec_rec.status = "timeout"
                     exec_rec.detail = f"Exceeded timeout of {timeout}s"
                     db.add(exec_rec)
                     db.commit()
+                observe_execution(task.type, exec_rec.status, duration)
                 self._log.info(
                     "finish task_id=%s status=%s duration_s=%.3f",
                     task.id,
@@ -125,13 +734,92 @@ class Scheduler:
                     duration,
                 )
             finally:
-                # mark not running
-                task.running = False
-                # deterministically schedule the next interval run
-                if task.schedule_type == "interval" and task.interval_seconds:
-                    now_utc = datetime.utcnow()
-                    task.next_run_at = now_utc + timedelta(seconds=task.interval_seconds)
-                db.add(task)
-                db.commit()
+                if ctx.settle("worker"):
+                    # mark not running and deterministically schedule the next interval run;
+                    # the rollback discards anything a failed run left pending
+                    db.rollback()
+                    next_run_at = release_task(db, task.id, next_run_after_finish(task, datetime.utcnow()))
+                    # a deadline that passed while the task was running was skipped
+                    self._task_released(next_run_at)
+
+    def _run_task_buffered(self, ctx: RunContext):
+        """Write-behind variant: the session is only used to read the task, and
+        the execution row plus the running flag are written by the ExecutionWriter.
+        """
+        with SessionLocal() as db:
+            task = db.get(Task, ctx.task_id)
+            if not task:
+                return
+            timeout = task.timeout_seconds or settings.default_task_timeout_seconds
+            ctx.writer_key = self._writer.record_start(task.id, datetime.utcnow())
+            self._watchdog.watch(ctx, timeout)
+            status, detail, result = "failed", None, None
+            start = time.perf_counter()
+            try:
+                self._log.info("start task_id=%s type=%s", task.id, task.type)
+                ctx.phases.mark("body_start")
+                result = run_task(db, task, ctx)
+                status = "success"
+            except TaskTimeout as e:
+                self._log.warning("task timed out task_id=%s type=%s", task.id, task.type)
+                status, detail = "timeout", str(e)
+            except Exception as e:
+                self._log.exception("task execution error task_id=%s type=%s", task.id, task.type)
+                detail = str(e)
+            finally:
+                duration = time.perf_counter() - start
+                ctx.phases.mark("body_end")
+                if not ctx.settle("worker"):
+                    self._log.warning("abandoned task_id=%s returned after %.3fs", task.id, duration)
+                    return
+                if duration > timeout and status == "success":
+                    status = "timeout"
+                    detail = f"Exceeded timeout of {timeout}s"
+                observe_execution(task.type, status, duration)
+                next_run_at = next_run_after_finish(task, datetime.utcnow()) or UNCHANGED
+                self._writer.record_finish(
+                    ctx.writer_key, task.id, status, detail, result, datetime.utcnow(), next_run_at,
+                    phases=ctx.phases, profile=ctx.profile,
+                )
+                self._log.info("finish task_id=%s status=%s duration_s=%.3f", task.id, status, duration)
+
+    def _abandon(self, ctx: RunContext):
+        """Called by the watchdog for a run that ignored its cancel flag.
+
+        Records the timeout and clears ``running`` as the worker would have,
+        then frees the slot. The stuck thread keeps running; its late result is
+        discarded, and for a worker-pool run the next tick moves new work to a
+        fresh pool.
+        """
+        if not ctx.settle("watchdog"):
+            return
+        self._log.warning("abandoning task_id=%s after hard timeout of %ss", ctx.task_id, ctx.timeout)
+        finished_at = datetime.utcnow()
+        detail = f"Exceeded timeout of {ctx.timeout}s"
+        observe_execution(ctx.task_type, "timeout", ctx.timeout + time.monotonic() - ctx.deadline)
+        try:
+            with SessionLocal() as db:
+                task = db.get(Task, ctx.task_id)
+                next_run_at = next_run_after_finish(task, finished_at) if task else None
+                if self._writer and ctx.writer_key is not None:
+                    self._writer.record_finish(
+                        ctx.writer_key, ctx.task_id, "timeout", detail, None, finished_at, next_run_at or UNCHANGED,
+                        phases=ctx.phases,
+                    )
+                elif task:
+                    if ctx.execution_id is not None:
+                        ctx.phases.mark("persisted")
+                        db.execute(
+                            update(Execution)
+                            .where(Execution.id == ctx.execution_id, Execution.status == "running")
+                            .values(status="timeout", detail=detail, finished_at=finished_at, timings=ctx.phases.as_dict())
+                        )
+                    self._task_released(release_task(db, task.id, next_run_at))
+        finally:
+            if self._engine_for(ctx.task_type) == "thread":
+                # only a worker-pool run leaves a stuck thread in self._executor; a
+                # process-backend run's child is replaced by the process pool itself
+                self._pool_tainted = True
+            self._release_slot(ctx.task_id, ctx.task_type)
 
 scheduler = Scheduler()
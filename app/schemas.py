@@ -1,9 +1,11 @@
 from datetime import datetime
 from pydantic import BaseModel, Field
 from typing import Optional, Literal, Any
+from app.task_types import TASK_TYPES
 
-TaskType = Literal["sleep", "counter", "http"]
+TaskType = Literal[tuple(TASK_TYPES)]
 ScheduleType = Literal["interval", "once", "cron"]
+MisfirePolicy = Literal["coalesce", "skip", "catch_up"]
 
 class TaskCreate(BaseModel):
     name: str
@@ -14,6 +16,11 @@ class TaskCreate(BaseModel):
     cron_expression: Optional[str] = None
     params: Optional[dict] = None
     timeout_seconds: Optional[int] = Field(default=None, ge=1)
+    retention_days: Optional[int] = Field(default=None, ge=1)
+    priority: int = 0
+    jitter_seconds: Optional[int] = Field(default=None, ge=0)
+    misfire_policy: Optional[MisfirePolicy] = None
+    misfire_limit: Optional[int] = Field(default=None, ge=1)
 
 class TaskUpdate(BaseModel):
     schedule_type: Optional[ScheduleType] = None
@@ -22,6 +29,28 @@ class TaskUpdate(BaseModel):
     cron_expression: Optional[str] = None
     params: Optional[dict] = None
     timeout_seconds: Optional[int] = Field(default=None, ge=1)
+    retention_days: Optional[int] = Field(default=None, ge=1)
+    priority: Optional[int] = None
+    jitter_seconds: Optional[int] = Field(default=None, ge=0)
+    misfire_policy: Optional[MisfirePolicy] = None
+    misfire_limit: Optional[int] = Field(default=None, ge=1)
+
+class TaskBulkUpdate(TaskUpdate):
+    id: int
+
+class BulkDelete(BaseModel):
+    ids: list[int]
+
+class BulkItemResult(BaseModel):
+    index: int
+    id: Optional[int] = None
+    ok: bool
+    error: Optional[str] = None
+
+class BulkResult(BaseModel):
+    succeeded: int
+    failed: int
+    results: list[BulkItemResult]
 
 class TaskOut(BaseModel):
     id: int
@@ -33,6 +62,11 @@ class TaskOut(BaseModel):
     next_run_at: Optional[datetime]
     params: Optional[dict]
     timeout_seconds: Optional[int]
+    retention_days: Optional[int] = None
+    priority: int = 0
+    jitter_seconds: Optional[int] = None
+    misfire_policy: Optional[MisfirePolicy] = None
+    misfire_limit: Optional[int] = None
     running: bool
 
     class Config:
@@ -46,6 +80,45 @@ class ExecutionOut(BaseModel):
     status: str
     detail: Optional[str]
     result: Optional[dict]
+    timings: Optional[dict[str, float]] = None
 
     class Config:
         from_attributes = True
+
+class ExecutionRollupOut(BaseModel):
+    task_id: int
+    hour: datetime
+    count: int
+    success_count: int
+    failed_count: int
+    timeout_count: int
+    duration_sum: float
+    duration_min: Optional[float]
+    duration_max: Optional[float]
+
+    class Config:
+        from_attributes = True
+
+class ExecutionFilters(BaseModel):
+    status: Optional[str] = None
+    task_type: Optional[TaskType] = None
+    started_after: Optional[datetime] = None
+    started_before: Optional[datetime] = None
+
+class IntervalSpread(BaseModel):
+    interval_seconds: int
+    tasks: int
+    # due tasks per equal slice of the interval window, by next_run_at phase
+    buckets: list[int]
+    peak_to_mean: float
+    cv: float
+
+class ScheduleLoad(BaseModel):
+    start: datetime
+    end: datetime
+    bucket_seconds: int
+    # projected runs per bucket, by task type and over all types
+    by_type: dict[str, list[int]]
+    total: list[int]
+    peak: int
+    peak_at: Optional[datetime]
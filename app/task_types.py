@@ -0,0 +1,65 @@
+import importlib
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Callable
+
+from app.config import settings
+
+# Runners are referenced as "module:function" so this module stays importable
+# from app.models (TaskType is built from the registry) and from process-pool
+# children without pulling in the DB layer.
+
+
+@dataclass(frozen=True)
+class TaskTypeSpec:
+    """A task type: how to run it and on which execution backend.
+
+    ``backend`` is ``thread`` (``runner(db, task, ctx)`` on the worker pool),
+    ``process`` (``runner(task_id, params)`` in a ProcessPoolExecutor child;
+    only the id and params cross the process boundary and the returned dict
+    comes back pickled) or ``async`` (``runner(task)`` coroutine on the asyncio
+    engine). A thread type with an ``async_runner`` moves to the asyncio engine
+    when ``EXECUTION_ENGINE=asyncio``.
+    """
+
+    name: str
+    runner: str
+    backend: str = "thread"
+    async_runner: str | None = None
+
+
+TASK_TYPES: dict[str, TaskTypeSpec] = {}
+
+
+def register(spec: TaskTypeSpec) -> TaskTypeSpec:
+    if spec.backend not in ("thread", "process", "async"):
+        raise ValueError(f"unknown backend {spec.backend!r} for task type {spec.name!r}")
+    TASK_TYPES[spec.name] = spec
+    return spec
+
+
+register(TaskTypeSpec("sleep", "app.tasks:run_sleep_task", async_runner="app.tasks:run_sleep_task_async"))
+register(TaskTypeSpec("counter", "app.tasks:run_counter_task"))
+register(TaskTypeSpec("http", "app.tasks:run_http_task", async_runner="app.tasks:run_http_task_async"))
+register(TaskTypeSpec("noop", "app.tasks:run_noop_task", async_runner="app.tasks:run_noop_task_async"))
+register(TaskTypeSpec("hash", "app.cpu_tasks:run_hash_task", backend="process"))
+register(TaskTypeSpec("report", "app.cpu_tasks:run_report_task", backend="process"))
+
+
+@lru_cache(maxsize=None)
+def resolve(path: str) -> Callable:
+    module, _, attr = path.partition(":")
+    return getattr(importlib.import_module(module), attr)
+
+
+def backend_for(task_type: str) -> str:
+    """Where this replica runs ``task_type``: thread, process or async."""
+    spec = TASK_TYPES[task_type]
+    if spec.backend == "thread" and spec.async_runner and settings.execution_engine == "asyncio":
+        return "async"
+    return spec.backend
+
+
+def async_runner_for(task_type: str) -> Callable:
+    spec = TASK_TYPES[task_type]
+    return resolve(spec.async_runner or spec.runner)
@@ -1,71 +1,169 @@
+import asyncio
 import time
 from datetime import datetime
 from typing import Any
 import httpx
+from sqlalchemy import update
 from sqlalchemy.orm import Session
 from app.models import Task, Execution
 from app.config import settings
+from app.counters import counter_accumulator, increment_counter
+from app.http_pool import http_pool
+from app.process_pool import process_pool
+from app.profiling import SampledProfile
+from app.task_types import TASK_TYPES, resolve
+from app.timeouts import RunContext, TaskTimeout
 import logging
 
 log = logging.getLogger("tasks")
 
-def run_sleep_task(db: Session, task: Task) -> dict[str, Any]:
+def run_sleep_task(db: Session, task: Task, ctx: RunContext | None = None) -> dict[str, Any]:
     duration = int(task.params.get("duration", 2)) if task.params else 2
     start = time.perf_counter()
     log.debug("sleep_task start task_id=%s duration=%s", task.id, duration)
-    time.sleep(duration)
+    if ctx is None:
+        time.sleep(duration)
+    elif ctx.cancel.wait(duration):
+        raise ctx.timed_out()
     elapsed = time.perf_counter() - start
     log.info("sleep_task finish task_id=%s slept=%.3fs", task.id, elapsed)
     return {"slept_seconds": elapsed}
 
 
-def run_counter_task(db: Session, task: Task) -> dict[str, Any]:
-    # store counter in params and persist
-    count = int(task.params.get("count", 0)) if task.params else 0
-    count += 1
-    if task.params is None:
-        task.params = {}
-    task.params["count"] = count
-    db.add(task)
-    db.commit()
+def run_counter_task(db: Session, task: Task, ctx: RunContext | None = None) -> dict[str, Any]:
+    # counters live in task_counters; one upsert per run, or a buffered delta
+    if counter_accumulator.running:
+        count = counter_accumulator.increment(db, task.id)
+    else:
+        count = increment_counter(db, task.id)
     log.info("counter_task increment task_id=%s count=%s", task.id, count)
     return {"count": count}
 
 
-def run_http_task(db: Session, task: Task) -> dict[str, Any]:
+def run_http_task(db: Session, task: Task, ctx: RunContext | None = None) -> dict[str, Any]:
     url = (task.params or {}).get("url") or settings.http_task_url
     start = time.perf_counter()
     log.debug("http_task start task_id=%s url=%s", task.id, url)
-    with httpx.Client(timeout=10) as client:
-        resp = client.get(url)
-        elapsed = time.perf_counter() - start
-        log.info("http_task finish task_id=%s status=%s elapsed=%.3fs", task.id, resp.status_code, elapsed)
-        return {"status_code": resp.status_code, "elapsed_seconds": elapsed}
+    # the request may not outlive the execution's hard timeout
+    budget = ctx.remaining() if ctx else None
+    if budget is not None and budget <= 0:
+        raise ctx.timed_out()
+    try:
+        resp, pool_stats = http_pool.get(url, timeout=budget)
+    except httpx.TimeoutException as e:
+        if budget is not None and budget < settings.http_timeout_seconds:
+            raise ctx.timed_out() from e
+        raise
+    elapsed = time.perf_counter() - start
+    log.info("http_task finish task_id=%s status=%s elapsed=%.3fs", task.id, resp.status_code, elapsed)
+    return {"status_code": resp.status_code, "elapsed_seconds": elapsed, "pool": pool_stats}
+
+
+def run_noop_task(db: Session, task: Task, ctx: RunContext | None = None) -> dict[str, Any]:
+    # does nothing; benchmarks use it to measure pure scheduling overhead
+    return {}
+
+
+async def run_sleep_task_async(task: Task) -> dict[str, Any]:
+    duration = int(task.params.get("duration", 2)) if task.params else 2
+    start = time.perf_counter()
+    log.debug("sleep_task start task_id=%s duration=%s", task.id, duration)
+    await asyncio.sleep(duration)
+    elapsed = time.perf_counter() - start
+    log.info("sleep_task finish task_id=%s slept=%.3fs", task.id, elapsed)
+    return {"slept_seconds": elapsed}
+
 
+async def run_noop_task_async(task: Task) -> dict[str, Any]:
+    return {}
 
-def execute_task(db: Session, task: Task) -> Execution:
+
+async def run_http_task_async(task: Task) -> dict[str, Any]:
+    url = (task.params or {}).get("url") or settings.http_task_url
+    start = time.perf_counter()
+    log.debug("http_task start task_id=%s url=%s", task.id, url)
+    resp, pool_stats = await http_pool.get_async(url)
+    elapsed = time.perf_counter() - start
+    log.info("http_task finish task_id=%s status=%s elapsed=%.3fs", task.id, resp.status_code, elapsed)
+    return {"status_code": resp.status_code, "elapsed_seconds": elapsed, "pool": pool_stats}
+
+
+def run_task(db: Session, task: Task, ctx: RunContext | None = None) -> dict[str, Any]:
+    """Run a thread- or process-backend task via the task type registry.
+
+    A sampled run (``ctx.sampled``) leaves its cProfile report in ``ctx.profile``.
+    """
+    spec = TASK_TYPES.get(task.type)
+    if spec is None:
+        raise ValueError(f"Unknown task type {task.type}")
+    sampled = ctx is not None and ctx.sampled
+    if spec.backend == "process":
+        try:
+            result, report = process_pool.run(
+                spec.runner, task.id, dict(task.params or {}), ctx.remaining() if ctx else None, profile=sampled
+            )
+        except TimeoutError as e:
+            if ctx is None:
+                raise
+            raise ctx.timed_out() from e
+        if ctx is not None:
+            ctx.profile = report
+        return result
+    prof = SampledProfile(sampled)
+    try:
+        with prof:
+            return resolve(spec.runner)(db, task, ctx)
+    finally:
+        if ctx is not None:
+            ctx.profile = prof.report
+
+
+def execute_task(db: Session, task: Task, ctx: RunContext | None = None) -> Execution | None:
+    """Run ``task`` and record it as an Execution.
+
+    Returns None if the watchdog abandoned the run first; it has already
+    recorded the timeout, so nothing more is written here.
+    """
+    if ctx is not None and ctx.settled:
+        return None
     exec_rec = Execution(task_id=task.id, status="running", started_at=datetime.utcnow())
     db.add(exec_rec)
     db.commit()
     db.refresh(exec_rec)
+    if ctx is not None:
+        ctx.execution_id = exec_rec.id
+        if ctx.abandoned:
+            # the watchdog gave up while the row was being inserted and had no id to close
+            db.execute(
+                update(Execution)
+                .where(Execution.id == exec_rec.id, Execution.status == "running")
+                .values(status="timeout", detail=str(ctx.timed_out()), finished_at=datetime.utcnow())
+            )
+            db.commit()
+            return None
+        ctx.phases.mark("body_start")
     try:
-        if task.type == "sleep":
-            result = run_sleep_task(db, task)
-        elif task.type == "counter":
-            result = run_counter_task(db, task)
-        elif task.type == "http":
-            result = run_http_task(db, task)
-        else:
-            raise ValueError(f"Unknown task type {task.type}")
+        result = run_task(db, task, ctx)
         exec_rec.status = "success"
         exec_rec.result = result
-        exec_rec.finished_at = datetime.utcnow()
+    except TaskTimeout as e:
+        log.warning("task timed out task_id=%s type=%s", task.id, task.type)
+        exec_rec.status = "timeout"
+        exec_rec.detail = str(e)
     except Exception as e:
         log.exception("task execution error task_id=%s type=%s", task.id, task.type)
         exec_rec.status = "failed"
         exec_rec.detail = str(e)
-        exec_rec.finished_at = datetime.utcnow()
-    finally:
-        db.add(exec_rec)
-        db.commit()
+    if ctx is not None:
+        ctx.phases.mark("body_end")
+        if not ctx.settle("worker"):
+            db.rollback()
+            return None
+    exec_rec.finished_at = datetime.utcnow()
+    if ctx is not None:
+        ctx.phases.mark("persisted")
+        exec_rec.timings = ctx.phases.as_dict()
+        exec_rec.profile = ctx.profile
+    db.add(exec_rec)
+    db.commit()
     return exec_rec
@@ -0,0 +1,134 @@
+import heapq
+import itertools
+import logging
+import threading
+import time
+from typing import Callable
+
+from app.config import settings
+from app.profiling import PhaseTimer, should_profile
+
+log = logging.getLogger("timeouts")
+
+
+class TaskTimeout(Exception):
+    """Raised by a runner that stopped because its execution hit the hard timeout."""
+
+
+class RunContext:
+    """One dispatched thread-engine execution.
+
+    Carries its phase timings, the hard deadline, a cancel flag that
+    cooperative runners (sleep, http) watch, and who finishes the execution:
+    the worker when the task returns, or the watchdog when it abandons a task
+    that ignored the cancel.
+    """
+
+    def __init__(self, task_id: int, task_type: str):
+        self.task_id = task_id
+        self.task_type = task_type
+        self.cancel = threading.Event()
+        self.timeout: float | None = None
+        self.deadline: float | None = None
+        # set once the execution row exists so an abandon can close it
+        self.execution_id: int | None = None
+        self.writer_key: int | None = None
+        self.phases = PhaseTimer()
+        # decided at dispatch; the cProfile report of a sampled run lands in ``profile``
+        self.sampled = should_profile()
+        self.profile: str | None = None
+        self._owner: str | None = None
+        self._lock = threading.Lock()
+
+    def remaining(self) -> float | None:
+        return None if self.deadline is None else self.deadline - time.monotonic()
+
+    def timed_out(self) -> TaskTimeout:
+        return TaskTimeout(f"Exceeded timeout of {self.timeout}s")
+
+    def settle(self, owner: str) -> bool:
+        """Claim the right to record the outcome; only the first caller gets it."""
+        with self._lock:
+            if self._owner is None:
+                self._owner = owner
+            return self._owner == owner
+
+    @property
+    def settled(self) -> bool:
+        return self._owner is not None
+
+    @property
+    def abandoned(self) -> bool:
+        return self._owner == "watchdog"
+
+
+class TimeoutWatchdog:
+    """Enforces hard timeouts on thread-engine executions.
+
+    At the deadline the run's cancel flag is set, which stops cooperative
+    runners right away. A run that is still going ``hard_timeout_grace_seconds``
+    later is handed to ``on_abandon``, which records the timeout and frees the
+    slot; the stuck thread is left to finish on its own.
+    """
+
+    def __init__(self, on_abandon: Callable[[RunContext], None]):
+        self._on_abandon = on_abandon
+        self._heap: list[tuple[float, int, RunContext]] = []
+        self._seq = itertools.count()
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="timeout-watchdog", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+        if self._thread:
+            self._thread.join(timeout=5)
+        self._thread = None
+        with self._lock:
+            self._heap = []
+
+    def watch(self, ctx: RunContext, timeout: float):
+        ctx.timeout = timeout
+        ctx.deadline = time.monotonic() + timeout
+        self._push(ctx.deadline, ctx)
+
+    def _push(self, when: float, ctx: RunContext):
+        with self._lock:
+            heapq.heappush(self._heap, (when, next(self._seq), ctx))
+            earliest = self._heap[0][2] is ctx
+        if earliest:
+            self._wake.set()
+
+    def _run(self):
+        while not self._stop.is_set():
+            self._wake.clear()
+            now = time.monotonic()
+            expired = []
+            with self._lock:
+                while self._heap and self._heap[0][0] <= now:
+                    expired.append(heapq.heappop(self._heap)[2])
+                wait = self._heap[0][0] - now if self._heap else None
+            for ctx in expired:
+                if ctx.settled:
+                    continue
+                if not ctx.cancel.is_set():
+                    log.info("hard timeout task_id=%s timeout=%ss; cancelling", ctx.task_id, ctx.timeout)
+                    ctx.cancel.set()
+                    self._push(now + settings.hard_timeout_grace_seconds, ctx)
+                    continue
+                try:
+                    self._on_abandon(ctx)
+                except Exception:
+                    log.exception("abandon error task_id=%s", ctx.task_id)
+            if expired:
+                continue
+            self._wake.wait(wait)
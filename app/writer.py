@@ -0,0 +1,233 @@
+import itertools
+import json
+import logging
+import queue
+import threading
+import time
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, Callable
+
+from sqlalchemy import insert, text
+
+from app.config import settings
+from app.db import SessionLocal
+from app.leases import REPLICA_ID
+from app.models import Execution
+from app.profiling import PhaseTimer
+
+log = logging.getLogger("writer")
+
+# sentinel for next_run_at: leave the task's current value untouched
+UNCHANGED = object()
+
+
+@dataclass
+class _Start:
+    key: int
+    task_id: int
+    started_at: datetime
+
+
+@dataclass
+class _Finish:
+    key: int
+    task_id: int
+    status: str
+    detail: str | None
+    result: dict | None
+    finished_at: datetime
+    next_run_at: Any = UNCHANGED
+    phases: PhaseTimer | None = None
+    profile: str | None = None
+
+
+class ExecutionWriter:
+    """Write-behind buffer for execution start/finish events.
+
+    Events are queued in memory and flushed by one thread in a single
+    transaction per batch: multi-row INSERT for new executions (rows whose
+    start and finish land in the same batch are inserted already finished),
+    one UPDATE for late finishes and one UPDATE releasing the tasks'
+    ``running`` flags. A failed flush is retried with the same events, so a
+    task is never left marked running because of a transient DB error.
+    """
+
+    def __init__(self, on_released: Callable[[datetime | None], None]):
+        self._on_released = on_released
+        self._queue: queue.Queue = queue.Queue()
+        self._keys = itertools.count(1)
+        # execution ids for started rows flushed before their finish arrived
+        self._ids: dict[int, int] = {}
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="execution-writer", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Flush everything queued so far, then stop the writer thread."""
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=30)
+        self._thread = None
+
+    @property
+    def pending(self) -> int:
+        """Events queued and not yet picked up by the writer thread."""
+        return self._queue.qsize()
+
+    def record_start(self, task_id: int, started_at: datetime) -> int:
+        key = next(self._keys)
+        self._queue.put(_Start(key, task_id, started_at))
+        return key
+
+    def record_finish(
+        self,
+        key: int,
+        task_id: int,
+        status: str,
+        detail: str | None,
+        result: dict | None,
+        finished_at: datetime,
+        next_run_at: Any = UNCHANGED,
+        phases: PhaseTimer | None = None,
+        profile: str | None = None,
+    ):
+        """Queue a finish; ``phases`` gets its ``persisted`` mark when the batch is written."""
+        self._queue.put(_Finish(key, task_id, status, detail, result, finished_at, next_run_at, phases, profile))
+
+    def _run(self):
+        pending: list = []
+        while True:
+            # collect until the batch is full or the flush interval has passed
+            deadline = time.monotonic() + settings.write_behind_flush_interval_seconds
+            while len(pending) < settings.write_behind_batch_size:
+                try:
+                    pending.append(self._queue.get(timeout=max(0.0, deadline - time.monotonic())))
+                except queue.Empty:
+                    break
+            if pending:
+                try:
+                    self._flush(pending)
+                    pending = []
+                except Exception:
+                    log.exception("write-behind flush failed events=%d; retrying", len(pending))
+            if self._stop.is_set() and not pending and self._queue.empty():
+                return
+
+    def _flush(self, events: list):
+        starts = {e.key: e for e in events if isinstance(e, _Start)}
+        finishes = [e for e in events if isinstance(e, _Finish)]
+        finished_keys = {f.key for f in finishes}
+        timings = {}
+        for f in finishes:
+            if f.phases is not None:
+                f.phases.mark("persisted")
+                timings[f.key] = f.phases.as_dict()
+        inserts, insert_keys, late_finishes = [], [], []
+        for s in starts.values():
+            if s.key not in finished_keys:
+                inserts.append({"task_id": s.task_id, "started_at": s.started_at, "status": "running"})
+                insert_keys.append(s.key)
+        for f in finishes:
+            s = starts.get(f.key)
+            if s is not None:
+                inserts.append(
+                    {
+                        "task_id": f.task_id,
+                        "started_at": s.started_at,
+                        "finished_at": f.finished_at,
+                        "status": f.status,
+                        "detail": f.detail,
+                        "result": f.result,
+                        "timings": timings.get(f.key),
+                        "profile": f.profile,
+                    }
+                )
+                insert_keys.append(None)
+            elif f.key in self._ids:
+                late_finishes.append(f)
+
+        with SessionLocal() as db:
+            # tasks deleted mid-run would fail the whole batch on the FK; drop their
+            # events and KEY SHARE-lock the rest so they can't vanish before commit
+            task_ids = sorted({e.task_id for e in events})
+            live = set(
+                db.execute(
+                    text("SELECT id FROM tasks WHERE id = ANY(:ids) FOR KEY SHARE"), {"ids": task_ids}
+                ).scalars()
+            )
+            if len(live) < len(task_ids):
+                keep = [i for i, row in enumerate(inserts) if row["task_id"] in live]
+                inserts = [inserts[i] for i in keep]
+                insert_keys = [insert_keys[i] for i in keep]
+                late_finishes = [f for f in late_finishes if f.task_id in live]
+                finishes = [f for f in finishes if f.task_id in live]
+            new_ids = []
+            if inserts:
+                new_ids = db.execute(
+                    insert(Execution).returning(Execution.id, sort_by_parameter_order=True), inserts
+                ).scalars().all()
+            if late_finishes:
+                db.execute(
+                    text(
+                        """
+                        UPDATE executions AS e
+                        SET status = v.status, detail = v.detail,
+                            result = CAST(v.result AS json), finished_at = v.finished_at,
+                            timings = CAST(v.timings AS json), profile = v.profile
+                        FROM unnest(
+                            CAST(:ids AS integer[]), CAST(:statuses AS varchar[]), CAST(:details AS text[]),
+                            CAST(:results AS text[]), CAST(:finished AS timestamp[]),
+                            CAST(:timings AS text[]), CAST(:profiles AS text[])
+                        ) AS v(id, status, detail, result, finished_at, timings, profile)
+                        WHERE e.id = v.id
+                        """
+                    ),
+                    {
+                        "ids": [self._ids[f.key] for f in late_finishes],
+                        "statuses": [f.status for f in late_finishes],
+                        "details": [f.detail for f in late_finishes],
+                        "results": [json.dumps(f.result) if f.result is not None else None for f in late_finishes],
+                        "finished": [f.finished_at for f in late_finishes],
+                        "timings": [json.dumps(timings[f.key]) if f.key in timings else None for f in late_finishes],
+                        "profiles": [f.profile for f in late_finishes],
+                    },
+                )
+            released = []
+            if finishes:
+                released = db.execute(
+                    text(
+                        """
+                        UPDATE tasks AS t
+                        SET running = FALSE, claimed_by = NULL, lease_expires_at = NULL,
+                            next_run_at = CASE WHEN v.reschedule THEN v.next_run_at ELSE t.next_run_at END
+                        FROM unnest(
+                            CAST(:ids AS integer[]), CAST(:reschedule AS boolean[]), CAST(:next_runs AS timestamp[])
+                        ) AS v(id, reschedule, next_run_at)
+                        WHERE t.id = v.id AND t.claimed_by = :replica
+                        RETURNING t.next_run_at
+                        """
+                    ),
+                    {
+                        "ids": [f.task_id for f in finishes],
+                        "reschedule": [f.next_run_at is not UNCHANGED for f in finishes],
+                        "next_runs": [None if f.next_run_at is UNCHANGED else f.next_run_at for f in finishes],
+                        "replica": REPLICA_ID,
+                    },
+                ).scalars().all()
+            db.commit()
+
+        for key, exec_id in zip(insert_keys, new_ids):
+            if key is not None:
+                self._ids[key] = exec_id
+        for key in finished_keys:
+            self._ids.pop(key, None)
+        log.debug("flushed inserts=%d late_finishes=%d released=%d", len(inserts), len(late_finishes), len(finishes))
+        for next_run_at in released:
+            self._on_released(next_run_at)
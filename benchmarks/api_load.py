@@ -0,0 +1,266 @@
+"""API load test with latency budgets.
+
+Starts the app with uvicorn in a subprocess, scheduler included, against a
+seeded Postgres. Then drives a weighted mix of ``POST /tasks``, ``GET /tasks``,
+``GET /upcoming`` and ``GET /tasks/{id}/executions`` from ``--concurrency``
+async workers for ``--duration`` seconds. Reports requests per second and
+p50/p95/p99 latency per endpoint as JSON::
+
+    python -m benchmarks.api_load --tasks 2000 --executions 50000 --concurrency 16
+
+Results are checked against ``benchmarks/api_budgets.json``, which holds
+per-endpoint p95/p99 and error-rate limits (optionally ``min_rps``) for the
+profile it names, the default one. The run exits 1 if any budget is exceeded
+(``--no-budgets`` skips the check); after an intended change in performance,
+rerun with ``--no-budgets`` and update the file.
+``DATABASE_URL`` selects a local Postgres; otherwise Testcontainers starts one.
+Tables are wiped and reseeded.
+"""
+import asyncio
+import json
+import os
+import platform
+import random
+import socket
+import subprocess
+import sys
+import time
+import uuid
+from collections import defaultdict
+from datetime import datetime
+from pathlib import Path
+from typing import Optional
+
+import httpx
+import typer
+
+from benchmarks.common import git_commit, percentile, postgres, prepare_schema, write_report
+
+cli = typer.Typer(add_completion=False)
+
+DEFAULT_BUDGETS = Path(__file__).with_name("api_budgets.json")
+
+
+def _seed(tasks: int, executions: int, active_tasks: int):
+    """``tasks`` tasks, of which ``active_tasks`` are 1s interval noop tasks the
+    scheduler keeps firing; the rest are one-off tasks far in the future. Plus
+    ``executions`` finished executions spread round-robin over all tasks.
+    """
+    from sqlalchemy import text
+
+    from app.db import engine
+
+    with engine.begin() as conn:
+        conn.execute(text("TRUNCATE tasks RESTART IDENTITY CASCADE"))
+        conn.execute(
+            text(
+                """
+                INSERT INTO tasks (name, type, schedule_type, interval_seconds, next_run_at, params,
+                                   priority, running, created_at, updated_at)
+                SELECT 'load-' || g, 'noop',
+                       CASE WHEN g <= :active THEN 'interval' ELSE 'once' END,
+                       CASE WHEN g <= :active THEN 1 END,
+                       CASE WHEN g <= :active THEN timezone('utc', now())
+                            ELSE timestamp '2100-01-01' + g * interval '1 second' END,
+                       '{}', 0, FALSE, timezone('utc', now()), timezone('utc', now())
+                FROM generate_series(1, :tasks) AS g
+                """
+            ),
+            {"tasks": tasks, "active": active_tasks},
+        )
+        conn.execute(
+            text(
+                """
+                INSERT INTO executions (task_id, started_at, finished_at, status, result)
+                SELECT 1 + g % :tasks,
+                       timezone('utc', now()) - g * interval '1 second',
+                       timezone('utc', now()) - g * interval '1 second' + interval '5 milliseconds',
+                       'success', '{}'
+                FROM generate_series(1, :executions) AS g
+                """
+            ),
+            {"tasks": tasks, "executions": executions},
+        )
+        conn.execute(text("ANALYZE tasks"))
+        conn.execute(text("ANALYZE executions"))
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _start_app(port: int) -> subprocess.Popen:
+    env = {**os.environ, "SCHEDULER_ENABLE": "true"}
+    env.setdefault("LOG_LEVEL", "WARNING")
+    return subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning"],
+        env=env,
+    )
+
+
+def _wait_ready(base_url: str, proc: subprocess.Popen, timeout: float = 60.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError(f"app exited with code {proc.returncode}")
+        try:
+            if httpx.get(f"{base_url}/healthz", timeout=1.0).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError("app did not become ready")
+
+
+def _request(client: httpx.AsyncClient, endpoint: str, tasks: int):
+    if endpoint == "POST /tasks":
+        return client.post(
+            "/tasks",
+            json={
+                "name": f"load-new-{uuid.uuid4().hex}",
+                "type": "noop",
+                "schedule_type": "once",
+                "next_run_at": "2100-01-01T00:00:00",
+            },
+        )
+    if endpoint == "GET /tasks":
+        return client.get("/tasks")
+    if endpoint == "GET /upcoming":
+        return client.get("/upcoming")
+    return client.get(f"/tasks/{random.randint(1, tasks)}/executions")
+
+
+async def _drive(
+    base_url: str, mix: dict[str, float], concurrency: int, duration: float, warmup: float, tasks: int
+) -> dict[str, dict[str, list]]:
+    """Run the mix; returns per-endpoint latencies (s) and error count after warmup."""
+    stats: dict[str, dict] = defaultdict(lambda: {"latencies": [], "errors": 0})
+    endpoints, weights = list(mix), list(mix.values())
+    headers = {"x-api-key": os.environ["API_KEY"]} if os.environ.get("API_KEY") else {}
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    start = time.monotonic()
+    measure_from, stop_at = start + warmup, start + warmup + duration
+
+    async with httpx.AsyncClient(base_url=base_url, headers=headers, limits=limits, timeout=30.0) as client:
+
+        async def worker():
+            while time.monotonic() < stop_at:
+                now = time.monotonic()
+                endpoint = random.choices(endpoints, weights)[0]
+                began = time.perf_counter()
+                try:
+                    ok = (await _request(client, endpoint, tasks)).status_code < 400
+                except httpx.HTTPError:
+                    ok = False
+                if now < measure_from:
+                    continue
+                stats[endpoint]["latencies"].append(time.perf_counter() - began)
+                stats[endpoint]["errors"] += not ok
+
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return stats
+
+
+def _summarize(stats: dict[str, dict], duration: float) -> dict[str, dict]:
+    summary = {}
+    for endpoint, s in sorted(stats.items()):
+        latencies = s["latencies"]
+        ms = lambda q: round(percentile(latencies, q) * 1000, 2) if latencies else None  # noqa: E731
+        summary[endpoint] = {
+            "requests": len(latencies),
+            "errors": s["errors"],
+            "error_rate": round(s["errors"] / len(latencies), 4) if latencies else None,
+            "rps": round(len(latencies) / duration, 1),
+            "p50_ms": ms(0.50),
+            "p95_ms": ms(0.95),
+            "p99_ms": ms(0.99),
+        }
+    return summary
+
+
+def check_budgets(summary: dict[str, dict], budgets: dict[str, dict]) -> list[str]:
+    """Budget violations as readable lines; empty when everything is within budget."""
+    violations = []
+    for endpoint, limits in budgets.items():
+        result = summary.get(endpoint)
+        if result is None or not result["requests"]:
+            violations.append(f"{endpoint}: no requests measured")
+            continue
+        for key in ("p95_ms", "p99_ms"):
+            if key in limits and result[key] > limits[key]:
+                violations.append(f"{endpoint}: {key} {result[key]} > budget {limits[key]}")
+        if "max_error_rate" in limits and result["error_rate"] > limits["max_error_rate"]:
+            violations.append(f"{endpoint}: error_rate {result['error_rate']} > budget {limits['max_error_rate']}")
+        if "min_rps" in limits and result["rps"] < limits["min_rps"]:
+            violations.append(f"{endpoint}: rps {result['rps']} < budget {limits['min_rps']}")
+    return violations
+
+
+@cli.command()
+def main(
+    tasks: int = typer.Option(2000, help="Tasks in the table"),
+    executions: int = typer.Option(50000, help="Finished executions spread over the tasks"),
+    active_tasks: int = typer.Option(50, help="Tasks the scheduler fires every second during the run"),
+    concurrency: int = typer.Option(16, help="Concurrent client workers"),
+    duration: float = typer.Option(20.0, help="Measured seconds"),
+    warmup: float = typer.Option(3.0, help="Unmeasured seconds before the measurement"),
+    mix: str = typer.Option(
+        "POST /tasks=1,GET /tasks=1,GET /upcoming=2,GET /tasks/{id}/executions=6", help="Endpoint weights"
+    ),
+    database_url: Optional[str] = typer.Option(None, envvar="DATABASE_URL", help="Postgres URL; a Testcontainers Postgres is started if unset"),
+    budgets: Path = typer.Option(DEFAULT_BUDGETS, help="Latency budget file"),
+    no_budgets: bool = typer.Option(False, "--no-budgets", help="Report only; don't check budgets"),
+    output: Optional[str] = typer.Option(None, help="Write the JSON report here instead of stdout"),
+):
+    """Load-test the API with mixed traffic and check per-endpoint latency budgets."""
+    weights = {k: float(v) for k, v in (item.rsplit("=", 1) for item in mix.split(","))}
+    with postgres(database_url):
+        prepare_schema()
+        typer.echo(f"seeding {tasks} tasks and {executions} executions", err=True)
+        _seed(tasks, executions, active_tasks)
+        port = _free_port()
+        base_url = f"http://127.0.0.1:{port}"
+        proc = _start_app(port)
+        try:
+            _wait_ready(base_url, proc)
+            typer.echo(f"driving {concurrency} workers for {warmup}s warmup + {duration}s", err=True)
+            stats = asyncio.run(_drive(base_url, weights, concurrency, duration, warmup, tasks))
+        finally:
+            proc.terminate()
+            proc.wait(timeout=30)
+
+    summary = _summarize(stats, duration)
+    report = {
+        "benchmark": "api_load",
+        "commit": git_commit(),
+        "timestamp": datetime.utcnow().isoformat(),
+        "python": platform.python_version(),
+        "profile": {
+            "tasks": tasks,
+            "executions": executions,
+            "active_tasks": active_tasks,
+            "concurrency": concurrency,
+            "duration_seconds": duration,
+        },
+        "mix": weights,
+        "endpoints": summary,
+    }
+    violations = []
+    if not no_budgets:
+        limits = json.loads(budgets.read_text())
+        mismatched = {k: v for k, v in limits.get("profile", {}).items() if report["profile"].get(k) != v}
+        if mismatched:
+            typer.secho(f"budgets were set for a different profile: {mismatched}", fg=typer.colors.YELLOW, err=True)
+        violations = check_budgets(summary, limits["endpoints"])
+        report["budgets"] = {"file": str(budgets), "violations": violations}
+    write_report(report, output)
+    if violations:
+        for line in violations:
+            typer.secho(line, fg=typer.colors.RED, err=True)
+        raise typer.Exit(code=1)
+
+
+if __name__ == "__main__":
+    cli()
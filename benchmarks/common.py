@@ -0,0 +1,62 @@
+import contextlib
+import json
+import os
+import subprocess
+from typing import Iterator
+
+
+def percentile(values: list[float], q: float) -> float | None:
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+def git_commit() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+@contextlib.contextmanager
+def postgres(database_url: str | None) -> Iterator[str]:
+    """Yield ``database_url``, or a throwaway Testcontainers Postgres URL if unset.
+
+    Also exports it as ``DATABASE_URL``: app settings are read at import time,
+    so call this before importing anything from ``app``.
+    """
+    container = None
+    if not database_url:
+        from testcontainers.postgres import PostgresContainer
+
+        container = PostgresContainer("postgres:16-alpine").start()
+        database_url = container.get_connection_url().replace("postgresql+psycopg2", "postgresql")
+    os.environ["DATABASE_URL"] = database_url
+    try:
+        yield database_url
+    finally:
+        if container is not None:
+            container.stop()
+
+
+def prepare_schema():
+    """Create tables and run migrations, as app startup does."""
+    import app.models  # noqa: F401  registers the tables on Base
+    from app.db import Base, engine
+    from app.migrations import run_migrations
+
+    Base.metadata.create_all(bind=engine)
+    run_migrations(engine)
+
+
+def write_report(report: dict, output: str | None):
+    """Write a JSON report to ``output``, or to stdout when unset."""
+    text = json.dumps(report, indent=2)
+    if output:
+        with open(output, "w") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
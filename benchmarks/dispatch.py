@@ -0,0 +1,220 @@
+"""Scheduler dispatch benchmark.
+
+Seeds N ``noop`` tasks (interval, once and cron) into a Postgres database, all
+due within the first half of the window, runs a Scheduler for the window and
+reports, per size:
+
+- dispatch throughput (executions started per second),
+- firing lag: first execution ``started_at`` minus the seeded ``next_run_at``
+  (p50/p99/max, ms), which includes claim, executor queueing and the start
+  row insert, plus how many tasks never fired within the window,
+- SQL statements per dispatch, counted on every engine in the process,
+- tick count and mean tick duration (from the Prometheus histograms),
+- process memory (RSS at start and end, peak RSS).
+
+Results are written as JSON so runs on different commits can be diffed::
+
+    python -m benchmarks.dispatch --sizes 1000,10000 --window 10 --output bench.json
+
+Without ``--database-url`` (or ``DATABASE_URL``) a throwaway Postgres is
+started with Testcontainers. The database is wiped between sizes.
+"""
+import os
+import platform
+import random
+import resource
+import time
+from datetime import datetime, timedelta
+from typing import Any, Optional
+
+import typer
+
+from benchmarks.common import git_commit, percentile, postgres, prepare_schema, write_report
+
+cli = typer.Typer(add_completion=False)
+
+
+def _rss_mb() -> float | None:
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20
+    except OSError:
+        return None
+
+
+def _peak_rss_mb() -> float:
+    # ru_maxrss is KiB on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def _seed(size: int, window: float, mix: dict[str, float]) -> dict[int, datetime]:
+    """Insert ``size`` noop tasks due within the first half of the window from now.
+
+    Tasks are inserted far in the future and shifted into place by one UPDATE
+    once they are all in, so seeding time never counts as firing lag.
+    Returns each task's due time by id.
+    """
+    from sqlalchemy import text
+
+    from app.db import SessionLocal
+    from app.models import Task
+
+    rng = random.Random(size)
+    anchor = datetime(2100, 1, 1)
+    rows = []
+    for i in range(size):
+        kind = rng.choices(list(mix), weights=list(mix.values()))[0]
+        rows.append(
+            {
+                "name": f"bench-{i}",
+                "type": "noop",
+                "schedule_type": kind,
+                "next_run_at": anchor + timedelta(seconds=rng.uniform(0, window / 2)),
+                "interval_seconds": rng.randint(5, 60) if kind == "interval" else None,
+                "cron_expression": "* * * * *" if kind == "cron" else None,
+                "params": {},
+            }
+        )
+    with SessionLocal() as db:
+        for i in range(0, size, 5000):
+            db.execute(Task.__table__.insert(), rows[i : i + 5000])
+        shifted = db.execute(
+            text("UPDATE tasks SET next_run_at = next_run_at - CAST(:shift AS interval) RETURNING id, next_run_at"),
+            {"shift": anchor - (datetime.utcnow() + timedelta(seconds=1))},
+        ).all()
+        db.commit()
+    return dict(shifted)
+
+
+def _reset():
+    from sqlalchemy import text
+
+    from app.db import engine
+
+    with engine.begin() as conn:
+        # executions, counters, queue rows and rollups all cascade from tasks
+        conn.execute(text("TRUNCATE tasks RESTART IDENTITY CASCADE"))
+
+
+def _histogram(name: str) -> tuple[float, float]:
+    from prometheus_client import REGISTRY
+
+    return (
+        REGISTRY.get_sample_value(f"{name}_count") or 0.0,
+        REGISTRY.get_sample_value(f"{name}_sum") or 0.0,
+    )
+
+
+def run_size(size: int, window: float, mix: dict[str, float]) -> dict[str, Any]:
+    from sqlalchemy import event, select
+    from sqlalchemy.engine import Engine
+
+    from app.db import SessionLocal
+    from app.models import Execution
+    from app.scheduler import Scheduler
+
+    _reset()
+    seed_started = time.perf_counter()
+    due = _seed(size, window, mix)
+    seed_seconds = time.perf_counter() - seed_started
+    start = min(due.values())
+
+    statements = 0
+
+    def count_statement(*_):
+        nonlocal statements
+        statements += 1
+
+    ticks_before = _histogram("trustle_scheduler_tick_duration_seconds")
+    rss_start = _rss_mb()
+    scheduler = Scheduler()
+    event.listen(Engine, "before_cursor_execute", count_statement)
+    try:
+        scheduler.start()
+        time.sleep(max(0.0, (start - datetime.utcnow()).total_seconds()) + window)
+        scheduler.stop()
+    finally:
+        event.remove(Engine, "before_cursor_execute", count_statement)
+    rss_end = _rss_mb()
+    ticks_after = _histogram("trustle_scheduler_tick_duration_seconds")
+
+    with SessionLocal() as db:
+        started = db.execute(
+            select(Execution.task_id, Execution.started_at).order_by(Execution.task_id, Execution.started_at)
+        ).all()
+    first: dict[int, datetime] = {}
+    for task_id, started_at in started:
+        first.setdefault(task_id, started_at)
+    lags = [(started_at - due[task_id]).total_seconds() * 1000 for task_id, started_at in first.items()]
+    dispatched = len(started)
+    ticks = ticks_after[0] - ticks_before[0]
+    return {
+        "size": size,
+        "window_seconds": window,
+        "seed_seconds": round(seed_seconds, 3),
+        "dispatched": dispatched,
+        "tasks_fired": len(first),
+        # due within the window but never started; their lag isn't in lag_ms
+        "tasks_unfired": len(due) - len(first),
+        "throughput_per_second": round(dispatched / window, 1),
+        "lag_ms": {
+            "p50": percentile(lags, 0.50),
+            "p99": percentile(lags, 0.99),
+            "max": max(lags) if lags else None,
+        },
+        "queries": {"total": statements, "per_dispatch": round(statements / dispatched, 2) if dispatched else None},
+        "ticks": {
+            "count": int(ticks),
+            "mean_ms": round((ticks_after[1] - ticks_before[1]) / ticks * 1000, 3) if ticks else None,
+        },
+        "memory_mb": {
+            "rss_start": rss_start and round(rss_start, 1),
+            "rss_end": rss_end and round(rss_end, 1),
+            "peak_rss": round(_peak_rss_mb(), 1),
+        },
+    }
+
+
+@cli.command()
+def main(
+    sizes: str = typer.Option("1000,10000,100000", help="Comma-separated task counts to benchmark"),
+    window: float = typer.Option(10.0, help="Seconds the scheduler runs per size"),
+    database_url: Optional[str] = typer.Option(None, envvar="DATABASE_URL", help="Postgres URL; a Testcontainers Postgres is started if unset"),
+    mix: str = typer.Option("interval=0.6,once=0.3,cron=0.1", help="Schedule type weights"),
+    output: Optional[str] = typer.Option(None, help="Write the JSON report here instead of stdout"),
+):
+    """Benchmark scheduler dispatch at several task counts and report JSON."""
+    weights = {k: float(v) for k, v in (item.split("=") for item in mix.split(","))}
+    os.environ.setdefault("LOG_LEVEL", "WARNING")
+    with postgres(database_url):
+        import logging
+
+        from app.config import settings
+
+        logging.basicConfig(level=settings.log_level.upper())
+        prepare_schema()
+        results = []
+        for size in (int(s) for s in sizes.split(",")):
+            typer.echo(f"benchmarking {size} tasks for {window}s", err=True)
+            results.append(run_size(size, window, weights))
+        report = {
+            "benchmark": "dispatch",
+            "commit": git_commit(),
+            "timestamp": datetime.utcnow().isoformat(),
+            "python": platform.python_version(),
+            "settings": {
+                "execution_engine": settings.execution_engine,
+                "execution_write_behind": settings.execution_write_behind,
+                "scheduler_mode": settings.scheduler_mode,
+                "scheduler_wakeup_mode": settings.scheduler_wakeup_mode,
+                "scheduler_claim_batch_size": settings.scheduler_claim_batch_size,
+                "max_worker_threads": settings.max_worker_threads,
+            },
+            "mix": weights,
+            "results": results,
+        }
+        write_report(report, output)
+
+
+if __name__ == "__main__":
+    cli()
@@ -1,9 +1,14 @@
+import gzip
+import hashlib
+import json
 import os
 import time
-from datetime import datetime, timedelta
+from collections import Counter
+from datetime import datetime, timedelta, timezone
 
 import pytest
 from fastapi.testclient import TestClient
+from sqlalchemy import text
 from testcontainers.postgres import PostgresContainer
 
 
@@ -31,6 +36,31 @@ def client(pg_url):
         yield c
 
 
+@pytest.fixture()
+def quiet_client(pg_url, monkeypatch):
+    """A client whose own scheduler stays off, for tests that drive scheduler parts by hand."""
+    os.environ["DATABASE_URL"] = pg_url
+    from app.config import settings
+    from app.db import SessionLocal
+    from app.main import app  # noqa
+
+    monkeypatch.setattr(settings, "scheduler_enable", False)
+    with TestClient(app) as c:
+        # tasks left by earlier tests would be claimed by the schedulers started here
+        with SessionLocal() as db:
+            db.execute(text("DELETE FROM tasks"))
+            db.commit()
+        yield c
+
+
+@pytest.fixture()
+def db(quiet_client):
+    from app.db import SessionLocal
+
+    with SessionLocal() as session:
+        yield session
+
+
 def test_create_interval_sleep_task_and_execute(client):
     # schedule a sleep task to run every 1s
     payload = {
@@ -117,6 +147,38 @@ def test_once_http_task_runs_once(client):
     assert seen_success
 
 
+def test_http_tasks_share_pooled_client(client):
+    # two runs against the same host: the second finds the first's client (and usually its connection)
+    task_ids = []
+    for i in range(2):
+        r = client.post(
+            "/tasks",
+            json={"name": f"http-pooled-{i}", "type": "http", "schedule_type": "once", "next_run_at": (datetime.utcnow() + timedelta(seconds=i)).isoformat()},
+        )
+        assert r.status_code == 200, r.text
+        task_ids.append(r.json()["id"])
+
+    results = []
+    deadline = time.time() + 15
+    while time.time() < deadline and len(results) < 2:
+        results = [
+            e["result"]
+            for task_id in task_ids
+            for e in client.get(f"/tasks/{task_id}/executions").json()
+            if e["status"] == "success"
+        ]
+        time.sleep(0.3)
+    assert len(results) == 2
+    pools = [r["pool"] for r in results]
+    for pool in pools:
+        assert set(pool) == {"client_hit", "connection_reused", "hit_rate", "reuse_rate"}
+        assert 0 <= pool["hit_rate"] <= 1 and 0 <= pool["reuse_rate"] <= 1
+        # a reused connection always comes from a client that was already there
+        assert pool["client_hit"] or not pool["connection_reused"]
+    hits = [pool for pool in pools if pool["client_hit"]]
+    assert hits and all(pool["hit_rate"] > 0 for pool in hits)
+
+
 def test_delete_task(client):
     payload = {
         "name": "to-delete",
@@ -130,3 +192,666 @@ def test_delete_task(client):
     assert r.status_code == 200
     r = client.get(f"/tasks/{task['id']}")
     assert r.status_code == 404
+
+
+def test_task_listing_etag_revalidation(client):
+    # tasks left by earlier tests keep firing and changing the listing
+    ids = [t["id"] for t in client.get("/tasks").json()]
+    client.post("/tasks/bulk-delete", json={"ids": ids})
+    client.post("/tasks", json={"name": "etag-a", "type": "counter", "schedule_type": "cron", "cron_expression": "0 0 * * *"})
+    r = client.get("/tasks")
+    etag = r.headers["etag"]
+    r = client.get("/tasks", headers={"If-None-Match": etag})
+    assert r.status_code == 304
+    assert r.headers["etag"] == etag
+
+    client.post("/tasks", json={"name": "etag-b", "type": "counter", "schedule_type": "cron", "cron_expression": "0 0 * * *"})
+    r = client.get("/tasks", headers={"If-None-Match": etag})
+    assert r.status_code == 200
+    assert r.headers["etag"] != etag
+    assert {"etag-a", "etag-b"} <= {t["name"] for t in r.json()}
+
+
+def test_listing_cache_survives_empty_claims_and_sweeps(quiet_client, db):
+    from app.leases import sweep_expired
+    from app.response_cache import response_cache
+    from app.scheduler import Scheduler
+
+    quiet_client.post("/tasks", json={"name": "warm", "type": "counter", "schedule_type": "cron", "cron_expression": "0 0 * * *"})
+    time.sleep(0.5)  # let the insert's notification arrive
+    quiet_client.get("/tasks")
+    version = response_cache.version
+
+    # nothing is due and no lease has expired: these statements change no rows
+    sweep_expired(db, datetime.utcnow())
+    Scheduler()._tick()
+    time.sleep(1)
+    assert response_cache.version == version
+
+    # a change to a listed column still reaches the cache through the trigger
+    db.execute(text("UPDATE tasks SET priority = 5 WHERE name = 'warm'"))
+    db.commit()
+    deadline = time.time() + 5
+    while response_cache.version == version and time.time() < deadline:
+        time.sleep(0.1)
+    assert response_cache.version != version
+
+
+def test_execution_history_keyset_pagination(client):
+    payload = {
+        "name": "paged-counter",
+        "type": "counter",
+        "schedule_type": "interval",
+        "interval_seconds": 1,
+    }
+    r = client.post("/tasks", json=payload)
+    assert r.status_code == 200
+    task = r.json()
+
+    deadline = time.time() + 10
+    while time.time() < deadline:
+        if len(client.get(f"/tasks/{task['id']}/executions").json()) >= 3:
+            break
+        time.sleep(0.5)
+
+    # walk the history one row per page and make sure every page moves forward
+    seen = []
+    cursor = None
+    for _ in range(3):
+        params = {"limit": 1}
+        if cursor:
+            params["cursor"] = cursor
+        r = client.get(f"/tasks/{task['id']}/executions", params=params)
+        assert r.status_code == 200
+        page = r.json()
+        assert len(page) == 1
+        seen.append(page[0]["id"])
+        cursor = r.headers.get("x-next-cursor")
+        assert cursor
+    assert seen == sorted(set(seen))
+
+    r = client.get("/executions", params={"task_type": "counter", "status": "success", "limit": 2})
+    assert r.status_code == 200
+    assert all(e["status"] == "success" for e in r.json())
+
+    r = client.get("/executions", params={"cursor": "not-a-cursor"})
+    assert r.status_code == 400
+
+
+def test_bulk_create_update_delete(client):
+    items = [
+        {"name": "bulk-a", "type": "sleep", "schedule_type": "interval", "interval_seconds": 60},
+        {"name": "bulk-b", "type": "counter", "schedule_type": "cron", "cron_expression": "0 0 * * *"},
+        {"name": "bulk-bad-cron", "type": "counter", "schedule_type": "cron", "cron_expression": "nope"},
+        {"name": "bulk-a", "type": "sleep", "schedule_type": "interval", "interval_seconds": 60},
+        {"name": "bulk-bad-type", "type": "nope", "schedule_type": "interval", "interval_seconds": 60},
+    ]
+    r = client.post("/tasks/bulk", json=items)
+    assert r.status_code == 200, r.text
+    body = r.json()
+    assert body["succeeded"] == 2 and body["failed"] == 3
+    ok = [res for res in body["results"] if res["ok"]]
+    assert [res["index"] for res in ok] == [0, 1]
+    ids = [res["id"] for res in ok]
+
+    # creating the same names again fails per item instead of aborting the batch
+    r = client.post("/tasks/bulk", json=items[:2])
+    assert r.json()["failed"] == 2
+
+    r = client.patch("/tasks/bulk", json=[{"id": ids[0], "interval_seconds": 120}, {"id": 999999, "interval_seconds": 5}])
+    assert r.status_code == 200, r.text
+    assert [res["ok"] for res in r.json()["results"]] == [True, False]
+    assert client.get(f"/tasks/{ids[0]}").json()["interval_seconds"] == 120
+
+    r = client.post("/tasks/bulk-delete", json={"ids": ids + [999999]})
+    assert r.status_code == 200
+    assert r.json()["succeeded"] == 2
+    assert client.get(f"/tasks/{ids[1]}").status_code == 404
+
+
+def test_schedule_spread_report(client):
+    # far-future runs at four evenly spaced phases of a 1000s interval
+    base = (int(time.time()) // 1000 + 1000) * 1000
+    for i in range(4):
+        next_run_at = datetime.fromtimestamp(base + i * 250, tz=timezone.utc).isoformat()
+        r = client.post(
+            "/tasks",
+            json={
+                "name": f"spread-{i}",
+                "type": "sleep",
+                "schedule_type": "interval",
+                "interval_seconds": 1000,
+                "next_run_at": next_run_at,
+                "jitter_seconds": 5,
+            },
+        )
+        assert r.status_code == 200, r.text
+        assert r.json()["jitter_seconds"] == 5
+
+    r = client.get("/schedule/spread", params={"buckets": 4})
+    assert r.status_code == 200, r.text
+    report = next(s for s in r.json() if s["interval_seconds"] == 1000)
+    assert report["tasks"] == 4
+    assert report["buckets"] == [1, 1, 1, 1]
+    assert report["peak_to_mean"] == 1.0 and report["cv"] == 0.0
+
+
+def test_new_interval_tasks_get_initial_jitter(quiet_client):
+    before = datetime.utcnow()
+    first_runs = []
+    for i in range(5):
+        r = quiet_client.post(
+            "/tasks",
+            json={"name": f"jittered-{i}", "type": "noop", "schedule_type": "interval", "interval_seconds": 3600, "jitter_seconds": 60},
+        )
+        assert r.status_code == 200, r.text
+        first_runs.append(datetime.fromisoformat(r.json()["next_run_at"]))
+    after = datetime.utcnow()
+    assert all(before <= t <= after + timedelta(seconds=60) for t in first_runs)
+    # created in the same instant, but not all due in it
+    assert len(set(first_runs)) > 1
+
+
+def test_schedule_projection_and_load(client):
+    ids = [t["id"] for t in client.get("/tasks").json()]
+    client.post("/tasks/bulk-delete", json={"ids": ids})
+    client.post(
+        "/tasks",
+        json={"name": "proj-interval", "type": "sleep", "schedule_type": "interval", "interval_seconds": 600, "next_run_at": "2100-01-01T00:00:00"},
+    )
+    client.post(
+        "/tasks",
+        json={"name": "proj-cron", "type": "counter", "schedule_type": "cron", "cron_expression": "*/15 * * * *", "next_run_at": "2100-01-01T00:15:00"},
+    )
+    window = {"start": "2100-01-01T00:00:00", "minutes": 60}
+
+    r = client.get("/schedule/projection", params={**window, "limit": 5})
+    assert r.status_code == 200
+    runs = [json.loads(line) for line in r.text.splitlines()]
+    assert [(run["run_at"][11:16], run["name"]) for run in runs] == [
+        ("00:00", "proj-interval"),
+        ("00:10", "proj-interval"),
+        ("00:15", "proj-cron"),
+        ("00:20", "proj-interval"),
+        ("00:30", "proj-interval"),
+    ]
+
+    r = client.get("/schedule/load", params={**window, "bucket_seconds": 900})
+    assert r.status_code == 200
+    load = r.json()
+    assert load["by_type"] == {"sleep": [2, 1, 2, 1], "counter": [0, 1, 1, 1]}
+    assert load["total"] == [2, 2, 3, 2]
+    assert load["peak"] == 3 and load["peak_at"] == "2100-01-01T00:30:00"
+
+
+def test_misfire_skip_waits_for_next_slot(client):
+    overdue = (datetime.utcnow() - timedelta(minutes=10)).isoformat()
+    r = client.post(
+        "/tasks",
+        json={
+            "name": "misfire-skip",
+            "type": "sleep",
+            "schedule_type": "interval",
+            "interval_seconds": 240,
+            "next_run_at": overdue,
+            "params": {"duration": 0},
+            "misfire_policy": "skip",
+        },
+    )
+    assert r.status_code == 200, r.text
+    task_id = r.json()["id"]
+    time.sleep(1.5)
+
+    assert client.get(f"/tasks/{task_id}/executions").json() == []
+    task = client.get(f"/tasks/{task_id}").json()
+    assert not task["running"]
+    # 10 minutes late on a 4 minute grid: the next slot is 2 minutes out
+    next_run_at = datetime.fromisoformat(task["next_run_at"])
+    assert timedelta(minutes=1) < next_run_at - datetime.utcnow() <= timedelta(minutes=2)
+
+
+def test_hard_timeout_stops_long_task(client):
+    r = client.post(
+        "/tasks",
+        json={
+            "name": "hard-timeout",
+            "type": "sleep",
+            "schedule_type": "once",
+            "next_run_at": datetime.utcnow().isoformat(),
+            "params": {"duration": 30},
+            "timeout_seconds": 1,
+        },
+    )
+    assert r.status_code == 200, r.text
+    task_id = r.json()["id"]
+
+    executions = []
+    deadline = time.time() + 10
+    while time.time() < deadline:
+        executions = client.get(f"/tasks/{task_id}/executions").json()
+        if executions and executions[0]["status"] != "running":
+            break
+        time.sleep(0.2)
+    assert executions and executions[0]["status"] == "timeout"
+    assert not client.get(f"/tasks/{task_id}").json()["running"]
+
+
+def test_process_backend_hash_task(client):
+    r = client.post(
+        "/tasks",
+        json={
+            "name": "hash-once",
+            "type": "hash",
+            "schedule_type": "once",
+            "next_run_at": datetime.utcnow().isoformat(),
+            "params": {"algorithm": "sha256", "rounds": 1, "data": "abc"},
+        },
+    )
+    assert r.status_code == 200, r.text
+    task_id = r.json()["id"]
+
+    executions = []
+    deadline = time.time() + 30
+    while time.time() < deadline:
+        executions = client.get(f"/tasks/{task_id}/executions").json()
+        if executions and executions[0]["status"] != "running":
+            break
+        time.sleep(0.2)
+    assert executions and executions[0]["status"] == "success", executions
+    assert executions[0]["result"]["digest"] == hashlib.sha256(b"abc").hexdigest()
+    timings = executions[0]["timings"]
+    assert list(timings) == ["claimed", "dequeued", "body_start", "body_end", "persisted"]
+    assert timings["body_start"] <= timings["body_end"] <= timings["persisted"]
+    # profiling is off by default
+    assert client.get(f"/executions/{executions[0]['id']}/profile").status_code == 404
+
+
+def test_metrics_endpoint(client):
+    assert client.get("/tasks").status_code == 200
+    for name in ("metrics-cron-a", "metrics-cron-b"):
+        client.post("/tasks", json={"name": name, "type": "counter", "schedule_type": "cron", "cron_expression": "0 3 * * *"})
+    time.sleep(1.5)  # let the scheduler tick at least once
+
+    r = client.get("/metrics")
+    assert r.status_code == 200
+    assert r.headers["content-type"].startswith("text/plain")
+    body = r.text
+    assert "trustle_scheduler_tick_duration_seconds_count" in body
+    assert "trustle_db_commit_duration_seconds_count" in body
+    assert 'trustle_http_request_duration_seconds_count{method="GET",route="/tasks",status="200"}' in body
+    assert 'trustle_db_pool_wait_seconds_count{pool="api"}' in body
+    # the second task's expression was already parsed
+    assert 'trustle_cron_cache_lookups_total{result="hit"}' in body
+
+
+def test_async_engine_runs_without_overlap(quiet_client, monkeypatch):
+    from app.config import settings
+    from app.scheduler import Scheduler
+
+    monkeypatch.setattr(settings, "execution_engine", "asyncio")
+    r = quiet_client.post(
+        "/tasks",
+        json={"name": "async-sleep", "type": "sleep", "schedule_type": "interval", "interval_seconds": 1, "params": {"duration": 2}},
+    )
+    assert r.status_code == 200, r.text
+    task_id = r.json()["id"]
+
+    sched = Scheduler()
+    sched.start()
+    try:
+        assert sched._async_runner is not None
+        deadline = time.time() + 15
+        finished = []
+        while time.time() < deadline and len(finished) < 2:
+            finished = [e for e in quiet_client.get(f"/tasks/{task_id}/executions").json() if e["status"] != "running"]
+            time.sleep(0.3)
+    finally:
+        sched.stop()
+    assert len(finished) >= 2
+    assert all(e["status"] == "success" for e in finished)
+    assert all(e["result"]["slept_seconds"] >= 2 for e in finished)
+    # runs outlast the interval, yet each one starts after the previous has finished
+    runs = sorted(finished, key=lambda e: e["started_at"])
+    for prev, nxt in zip(runs, runs[1:]):
+        assert datetime.fromisoformat(nxt["started_at"]) >= datetime.fromisoformat(prev["finished_at"])
+
+
+def test_execution_export_formats(quiet_client, db):
+    from app.models import Execution, Task
+
+    task = Task(name="export-src", type="counter", schedule_type="once")
+    db.add(task)
+    db.flush()
+    base = datetime(2024, 1, 1)
+    db.add_all(
+        Execution(
+            task_id=task.id, status="success", started_at=base + timedelta(minutes=i),
+            finished_at=base + timedelta(minutes=i, seconds=1), result={"count": i}, timings={"claimed": 0.0},
+        )
+        for i in range(3)
+    )
+    db.commit()
+
+    r = quiet_client.get("/executions/export")
+    assert r.status_code == 200
+    assert r.headers["content-type"].startswith("application/x-ndjson")
+    rows = [json.loads(line) for line in r.text.splitlines()]
+    assert [row["result"] for row in rows] == [{"count": 0}, {"count": 1}, {"count": 2}]
+    assert rows[0]["started_at"] == "2024-01-01T00:00:00"
+    ndjson = r.content
+
+    r = quiet_client.get("/executions/export", params={"format": "csv"})
+    assert r.status_code == 200
+    lines = r.text.splitlines()
+    assert lines[0] == "id,task_id,started_at,finished_at,status,detail,result,timings"
+    assert len(lines) == 4
+    assert lines[1].endswith(',success,,"{""count"": 0}","{""claimed"": 0.0}"')
+
+    # nothing matches: still a header
+    r = quiet_client.get("/executions/export", params={"format": "csv", "status": "no-such-status"})
+    assert r.status_code == 200
+    assert r.text.splitlines() == ["id,task_id,started_at,finished_at,status,detail,result,timings"]
+
+    r = quiet_client.get("/executions/export", params={"gzip": True})
+    assert r.status_code == 200
+    assert r.headers["content-disposition"] == 'attachment; filename="executions.ndjson.gz"'
+    # TestClient doesn't undo the gzip container since it isn't a Content-Encoding
+    assert gzip.decompress(r.content) == ndjson
+
+
+def test_capped_backlog_does_not_starve_other_types(db):
+    from app.models import Task
+    from app.scheduler import Scheduler
+
+    due = datetime.utcnow() - timedelta(minutes=1)
+    # a high-priority http backlog far beyond the http cap, and a little sleep work
+    db.add_all(Task(name=f"backlog-http-{i}", type="http", schedule_type="once", next_run_at=due, priority=5) for i in range(20))
+    db.add_all(Task(name=f"backlog-sleep-{i}", type="sleep", schedule_type="once", next_run_at=due) for i in range(3))
+    db.commit()
+
+    rows = Scheduler()._claim_due(db, datetime.utcnow(), 8, {"http": 2, "sleep": 6})
+    db.rollback()
+    assert Counter(r["type"] for r in rows) == {"http": 2, "sleep": 3}
+
+
+def test_index_build_rebuilds_missing_and_invalid_indexes(db):
+    from app.db import engine
+    from app.locks import INDEX_BUILD_LOCK_KEY
+    from app.migrations import INDEXES, build_indexes
+
+    # wait out the build started with the app
+    db.execute(text("SELECT pg_advisory_lock(:key)"), {"key": INDEX_BUILD_LOCK_KEY})
+    db.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": INDEX_BUILD_LOCK_KEY})
+    db.execute(text("DROP INDEX ix_tasks_lease_expires_at"))
+    # what an interrupted CREATE INDEX CONCURRENTLY leaves behind
+    db.execute(text("UPDATE pg_index SET indisvalid = FALSE WHERE indexrelid = CAST('ix_task_queue_type_order' AS regclass)"))
+    db.commit()
+
+    assert sorted(build_indexes(engine)) == ["ix_task_queue_type_order", "ix_tasks_lease_expires_at"]
+    assert build_indexes(engine) == []
+    valid = dict(
+        db.execute(
+            text("SELECT c.relname, i.indisvalid FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid WHERE c.relname = ANY(:names)"),
+            {"names": list(INDEXES)},
+        ).all()
+    )
+    assert valid == {name: True for name in INDEXES}
+
+
+def test_retention_rolls_up_and_deletes_expired_finished_runs(db):
+    from app.models import Execution, ExecutionRollup, Task
+    from app.retention import RetentionJob
+
+    task = Task(name="retained", type="counter", schedule_type="once", retention_days=1)
+    db.add(task)
+    db.flush()
+    now = datetime.utcnow()
+    hour = (now - timedelta(days=3)).replace(minute=0, second=0, microsecond=0)
+    old = [
+        Execution(task_id=task.id, status=status, started_at=hour + timedelta(minutes=i), finished_at=hour + timedelta(minutes=i, seconds=secs))
+        for i, (status, secs) in enumerate([("success", 1), ("success", 3), ("failed", 2)])
+    ]
+    # past the cutoff but still running, and finished but recent: both kept
+    stuck = Execution(task_id=task.id, status="running", started_at=hour)
+    recent = Execution(task_id=task.id, status="success", started_at=now - timedelta(hours=1), finished_at=now - timedelta(hours=1))
+    db.add_all([*old, stuck, recent])
+    db.commit()
+
+    assert RetentionJob().run_once() == 3
+    remaining = db.execute(text("SELECT id FROM executions WHERE task_id = :id"), {"id": task.id}).scalars().all()
+    assert sorted(remaining) == sorted([stuck.id, recent.id])
+    rollup = db.get(ExecutionRollup, (task.id, hour))
+    assert (rollup.count, rollup.success_count, rollup.failed_count, rollup.timeout_count) == (3, 2, 1, 0)
+    assert (rollup.duration_sum, rollup.duration_min, rollup.duration_max) == (6.0, 1.0, 3.0)
+    assert RetentionJob().run_once() == 0
+
+
+def test_lease_sweep_releases_expired_runs_only(db):
+    from app.leases import REPLICA_ID, LeaseKeeper, sweep_expired
+    from app.models import Execution, Task
+
+    now = datetime.utcnow()
+    next_slot = now + timedelta(minutes=5)
+    # a once run and an interval run whose replica died, and a run still heartbeating here
+    lost_once = Task(name="lease-once", type="noop", schedule_type="once", running=True,
+                     claimed_by="dead-replica", lease_expires_at=now - timedelta(seconds=30))
+    lost_interval = Task(name="lease-interval", type="noop", schedule_type="interval", interval_seconds=300,
+                         next_run_at=next_slot, running=True, claimed_by="dead-replica",
+                         lease_expires_at=now - timedelta(seconds=30))
+    alive = Task(name="lease-alive", type="noop", schedule_type="once", running=True,
+                 claimed_by=REPLICA_ID, lease_expires_at=now + timedelta(seconds=1))
+    db.add_all([lost_once, lost_interval, alive])
+    db.flush()
+    db.add_all(Execution(task_id=t.id, status="running", started_at=now - timedelta(minutes=1)) for t in (lost_once, alive))
+    db.commit()
+
+    keeper = LeaseKeeper()
+    keeper.track(alive.id)
+    assert keeper.heartbeat() == 1
+
+    # later than the alive run's original lease, within its renewed one
+    swept_at = now + timedelta(seconds=5)
+    assert {r.id for r in sweep_expired(db, swept_at)} == {lost_once.id, lost_interval.id}
+    db.expire_all()
+    assert not lost_once.running and lost_once.claimed_by is None and lost_once.lease_expires_at is None
+    # the lost once run is due again; the interval task keeps the slot its claim gave it
+    assert lost_once.next_run_at == swept_at
+    assert not lost_interval.running and lost_interval.next_run_at == next_slot
+    [closed] = lost_once.executions
+    assert closed.status == "failed" and closed.finished_at == swept_at
+    assert closed.detail == "lease expired; worker dead-replica lost"
+    assert alive.running and alive.claimed_by == REPLICA_ID
+    assert [e.status for e in alive.executions] == ["running"]
+
+
+def test_write_behind_batches_and_releases_after_flush(db):
+    from app.leases import REPLICA_ID
+    from app.models import Execution, Task
+    from app.writer import UNCHANGED, ExecutionWriter
+
+    def claimed(name):
+        return Task(name=name, type="noop", schedule_type="once", running=True, claimed_by=REPLICA_ID,
+                    lease_expires_at=datetime.utcnow() + timedelta(minutes=1))
+
+    same, split, gone = claimed("wb-same-batch"), claimed("wb-split"), claimed("wb-deleted")
+    db.add_all([same, split, gone])
+    db.commit()
+    released = []
+    writer = ExecutionWriter(on_released=released.append)  # not started: batches are flushed by hand
+
+    def flush():
+        writer._flush([writer._queue.get_nowait() for _ in range(writer.pending)])
+
+    t0 = datetime.utcnow()
+    next_run = t0 + timedelta(hours=1)
+    key = writer.record_start(same.id, t0)
+    writer.record_finish(key, same.id, "success", None, {"n": 1}, t0 + timedelta(seconds=1), next_run)
+    split_key = writer.record_start(split.id, t0)
+    gone_key = writer.record_start(gone.id, t0)
+    writer.record_finish(gone_key, gone.id, "success", None, None, t0, UNCHANGED)
+    db.delete(gone)
+    db.commit()
+    # nothing is written, and nothing released, before the flush
+    assert db.execute(text("SELECT count(*) FROM executions")).scalar() == 0
+    db.expire_all()
+    assert same.running
+
+    flush()
+    db.expire_all()
+    # start and finish in one batch: one row, inserted finished
+    [row] = same.executions
+    assert (row.status, row.result, row.finished_at) == ("success", {"n": 1}, t0 + timedelta(seconds=1))
+    assert not same.running and same.claimed_by is None and same.next_run_at == next_run
+    assert released == [next_run]
+    # start flushed alone: inserted running, the task still held
+    [row] = split.executions
+    assert row.status == "running" and split.running
+    # the deleted task's events were dropped without failing the batch
+    assert db.execute(text("SELECT count(*) FROM executions")).scalar() == 2
+
+    writer.record_finish(split_key, split.id, "failed", "boom", None, t0 + timedelta(seconds=2), UNCHANGED)
+    flush()
+    db.expire_all()
+    [row] = split.executions
+    assert (row.status, row.detail, row.finished_at) == ("failed", "boom", t0 + timedelta(seconds=2))
+    assert not split.running
+    assert released == [next_run, None]
+
+
+def test_write_behind_stop_drains_queue(db, monkeypatch):
+    from app.config import settings
+    from app.leases import REPLICA_ID
+    from app.models import Task
+    from app.writer import UNCHANGED, ExecutionWriter
+
+    monkeypatch.setattr(settings, "write_behind_batch_size", 5)
+    tasks = [Task(name=f"wb-drain-{i}", type="noop", schedule_type="once", running=True, claimed_by=REPLICA_ID) for i in range(12)]
+    db.add_all(tasks)
+    db.commit()
+    writer = ExecutionWriter(on_released=lambda _: None)
+    writer.start()
+    now = datetime.utcnow()
+    for task in tasks:
+        writer.record_finish(writer.record_start(task.id, now), task.id, "success", None, None, now, UNCHANGED)
+    writer.stop()
+
+    assert writer.pending == 0
+    assert db.execute(text("SELECT count(*) FROM executions WHERE status = 'success'")).scalar() == 12
+    assert db.execute(text("SELECT count(*) FROM tasks WHERE running")).scalar() == 0
+
+
+def test_leader_enqueues_and_followers_dequeue_within_caps(db, monkeypatch):
+    from app.config import settings
+    from app.leases import QUEUED, REPLICA_ID, sweep_expired
+    from app.models import Task
+    from app.scheduler import Scheduler
+
+    monkeypatch.setattr(settings, "scheduler_mode", "leader")
+    due = datetime.utcnow() - timedelta(seconds=5)
+    tasks = [Task(name=f"queued-http-{i}", type="http", schedule_type="once", next_run_at=due, priority=5) for i in range(4)]
+    tasks += [Task(name=f"queued-sleep-{i}", type="sleep", schedule_type="once", next_run_at=due) for i in range(2)]
+    db.add_all(tasks)
+    db.commit()
+
+    assert Scheduler()._enqueue_due() == 6
+    assert db.execute(text("SELECT count(*) FROM task_queue")).scalar() == 6
+    assert db.execute(text("SELECT count(*) FROM tasks WHERE running AND claimed_by = :q"), {"q": QUEUED}).scalar() == 6
+
+    # the http backlog sits ahead in priority, yet sleep work is still taken up to its cap
+    follower = Scheduler()
+    rows = follower._dequeue(db, datetime.utcnow(), 4, {"http": 1, "sleep": 5})
+    db.commit()
+    assert Counter(r["type"] for r in rows) == {"http": 1, "sleep": 2}
+    db.expire_all()
+    assert {t.claimed_by for t in tasks if t.id in {r["id"] for r in rows}} == {REPLICA_ID}
+    assert db.execute(text("SELECT count(*) FROM task_queue")).scalar() == 3
+
+    # queue rows whose task was deleted or swept back to the schedule are dropped
+    queued = [t for t in tasks if t.claimed_by == QUEUED]
+    db.delete(queued[0])
+    db.execute(text("UPDATE tasks SET lease_expires_at = :past WHERE id = :id"), {"past": due, "id": queued[1].id})
+    db.commit()
+    assert [r.id for r in sweep_expired(db, datetime.utcnow())] == [queued[1].id]
+    rows = follower._dequeue(db, datetime.utcnow(), 10, {"http": 10})
+    db.commit()
+    assert [r["id"] for r in rows] == [queued[2].id]
+    assert db.execute(text("SELECT count(*) FROM task_queue")).scalar() == 0
+
+
+def test_leadership_moves_to_another_scheduler(quiet_client, monkeypatch):
+    from app.config import settings
+    from app.scheduler import Scheduler
+
+    monkeypatch.setattr(settings, "scheduler_mode", "leader")
+    monkeypatch.setattr(settings, "leader_retry_seconds", 0.2)
+
+    def wait_for(predicate, seconds=5):
+        deadline = time.time() + seconds
+        while not predicate() and time.time() < deadline:
+            time.sleep(0.05)
+        return predicate()
+
+    first, second = Scheduler(), Scheduler()
+    first.start()
+    try:
+        assert wait_for(lambda: first._elector.is_leader)
+        second.start()
+        time.sleep(0.6)
+        assert not second._elector.is_leader
+        first.stop()
+        assert wait_for(lambda: second._elector.is_leader)
+
+        # the new leader dispatches work
+        r = quiet_client.post("/tasks", json={"name": "after-failover", "type": "noop", "schedule_type": "once", "next_run_at": datetime.utcnow().isoformat()})
+        task_id = r.json()["id"]
+        assert wait_for(lambda: any(e["status"] == "success" for e in quiet_client.get(f"/tasks/{task_id}/executions").json()), 10)
+    finally:
+        first.stop()
+        second.stop()
+
+
+def test_notify_during_tick_wakes_next_tick(quiet_client, monkeypatch):
+    from app.config import settings
+    from app.db import SessionLocal
+    from app.events import SCHEDULE_CHANNEL, Listener, notify_schedule_change
+    from app.scheduler import Scheduler
+
+    monkeypatch.setattr(settings, "scheduler_mode", "replica")
+    monkeypatch.setattr(settings, "scheduler_wakeup_mode", "notify")
+    sched = Scheduler()
+    sched._resync_requested = False
+    listener = Listener()
+    listener.subscribe(SCHEDULE_CHANNEL, sched._on_schedule_notify)
+    listener.start()
+    # the listener requests a resync when it connects; let that pass first
+    deadline = time.time() + 5
+    while not sched._resync_requested and time.time() < deadline:
+        time.sleep(0.01)
+    sched._resync_requested = False
+    steps = []
+
+    def step(tick):
+        steps.append(time.monotonic())
+        if len(steps) == 1:
+            # a task delete or bulk change lands while this tick is running
+            with SessionLocal() as db:
+                notify_schedule_change(db)
+                db.commit()
+            deadline = time.time() + 5
+            while not sched._resync_requested and time.time() < deadline:
+                time.sleep(0.01)
+            assert sched._resync_requested
+        else:
+            sched._stop.set()
+            sched._wake.set()
+        return 0
+
+    sched._due_step = step
+    # nothing due and a fresh resync: without the wakeup the loop would sleep for the resync interval
+    sched._last_resync = time.monotonic()
+    try:
+        sched._run()
+    finally:
+        listener.stop()
+    assert len(steps) == 2
+    assert steps[1] - steps[0] < 2